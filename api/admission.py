@@ -0,0 +1,176 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+# Priority classes in order of precedence. Waiting requests of an earlier class are always
+# admitted before those of a later one.
+DEFAULT_CLASSES = {
+    "interactive": {"max_queue": 64, "deadline": 30.0},
+    "batch": {"max_queue": 256, "deadline": 300.0},
+}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, detail: str, retry_after: int):
+        """
+        Raised when a request is shed instead of queued.
+
+        Parameters:
+        - detail (str): Why the request was rejected.
+        - retry_after (int): Suggested seconds before the client retries.
+        """
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int = 8, classes: Optional[dict] = None, initial_service_time: float = 5.0):
+        """
+        Limit concurrent requests and queue the rest per priority class, shedding load early.
+
+        A request is rejected up front when its class queue is full or when the expected queue
+        wait already exceeds its deadline, and while queued it is rejected once the deadline passes.
+
+        Parameters:
+        - max_concurrency (int): The number of requests handled at the same time.
+        - classes (dict): Per-class `max_queue` and default `deadline` in seconds, in priority order.
+        - initial_service_time (float): Seconds per request assumed until real timings come in.
+        """
+        self.max_concurrency = max_concurrency
+        self.classes = classes or DEFAULT_CLASSES
+        self.in_flight = 0
+        self.service_time = initial_service_time
+        self._queues = {name: deque() for name in self.classes}
+        self._stats = {
+            name: {"admitted": 0, "rejected": 0, "timed_out": 0, "waits": deque(maxlen=500)}
+            for name in self.classes
+        }
+
+    def _waiting_ahead(self, priority: str) -> int:
+        ahead = 0
+        for name in self.classes:
+            ahead += len(self._queues[name])
+            if name == priority:
+                break
+        return ahead
+
+    def estimated_wait(self, priority: str) -> float:
+        """Estimate how long a new request of this class would queue, in seconds."""
+        free_slots = self.max_concurrency - self.in_flight
+        ahead = self._waiting_ahead(priority)
+        if free_slots > ahead:
+            return 0.0
+        # Every slot frees up once per service time on average.
+        return (ahead - free_slots + 1) * self.service_time / self.max_concurrency
+
+    def _reject(self, priority: str, detail: str, retry_after: float):
+        self._stats[priority]["rejected"] += 1
+        raise AdmissionRejected(detail, max(1, math.ceil(retry_after)))
+
+    async def acquire(self, priority: str, deadline: Optional[float] = None) -> float:
+        """
+        Wait for a slot.
+
+        Parameters:
+        - priority (str): The priority class of the request.
+        - deadline (float, optional): Seconds the request may wait. Defaults to the class deadline.
+
+        Returns:
+        - float: The seconds spent waiting.
+
+        Raises:
+        - ValueError: If the priority class is unknown.
+        - AdmissionRejected: If the request is shed.
+        """
+        if priority not in self.classes:
+            raise ValueError(f"Unknown priority '{priority}'. Choose one of: {', '.join(self.classes)}.")
+        deadline = deadline or self.classes[priority]["deadline"]
+        queue = self._queues[priority]
+        start = time.monotonic()
+
+        wait = self.estimated_wait(priority)
+        if wait == 0.0:
+            self.in_flight += 1
+            self._record_admission(priority, 0.0)
+            return 0.0
+        if len(queue) >= self.classes[priority]["max_queue"]:
+            self._reject(priority, f"The {priority} queue is full.", wait)
+        if wait > deadline:
+            self._reject(priority, f"Expected queue wait of {wait:.1f}s exceeds the {deadline:.1f}s deadline.", wait)
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=deadline)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # The slot was handed over just as the deadline passed, so give it back.
+                self.release()
+            else:
+                waiter.cancel()
+                queue.remove(waiter)
+            self._stats[priority]["timed_out"] += 1
+            self._reject(priority, f"Request waited longer than the {deadline:.1f}s deadline.", self.estimated_wait(priority))
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+                if waiter in queue:
+                    queue.remove(waiter)
+            raise
+        waited = time.monotonic() - start
+        self._record_admission(priority, waited)
+        return waited
+
+    def _record_admission(self, priority: str, waited: float):
+        self._stats[priority]["admitted"] += 1
+        self._stats[priority]["waits"].append(waited)
+
+    def release(self, service_time: Optional[float] = None):
+        """Free a slot, handing it straight to the highest-priority waiter, and fold in the request's duration."""
+        if service_time is not None:
+            self.service_time = 0.8 * self.service_time + 0.2 * service_time
+        for queue in self._queues.values():
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.done():
+                    # The slot passes to the waiter without in_flight dropping in between.
+                    waiter.set_result(None)
+                    return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def admit(self, priority: str, deadline: Optional[float] = None):
+        """Hold a slot for the duration of the block."""
+        await self.acquire(priority, deadline)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def metrics(self) -> dict:
+        """Queue depth, wait times and admission counts per class."""
+        classes = {}
+        for name, stats in self._stats.items():
+            waits = sorted(stats["waits"])
+            classes[name] = {
+                "queue_depth": len(self._queues[name]),
+                "admitted": stats["admitted"],
+                "rejected": stats["rejected"],
+                "timed_out": stats["timed_out"],
+                "wait_p50": waits[len(waits) // 2] if waits else 0.0,
+                "wait_p95": waits[min(len(waits) - 1, math.ceil(0.95 * len(waits)) - 1)] if waits else 0.0,
+                "estimated_wait": self.estimated_wait(name),
+            }
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "service_time": self.service_time,
+            "classes": classes,
+        }
@@ -0,0 +1,105 @@
+import io
+import wave
+from collections import deque
+from typing import List, Optional
+
+import numpy as np
+
+
+class SilenceSegmenter:
+    def __init__(self,
+                 sample_rate: int = 16000,
+                 frame_ms: int = 30,
+                 energy_threshold: float = 500.0,
+                 min_silence_ms: int = 600,
+                 min_speech_ms: int = 250,
+                 pre_roll_ms: int = 200,
+                 max_segment_seconds: float = 15.0):
+        """
+        Split a live stream of 16-bit mono PCM audio into speech segments at silence boundaries.
+
+        Parameters:
+        - sample_rate (int): Samples per second of the incoming audio.
+        - frame_ms (int): The frame length used for voice-activity detection.
+        - energy_threshold (float): RMS amplitude above which a frame counts as speech.
+        - min_silence_ms (int): How long the speaker has to pause before a segment is closed.
+        - min_speech_ms (int): Segments with less speech than this are dropped as noise.
+        - pre_roll_ms (int): Audio kept from before speech starts so word onsets are not clipped.
+        - max_segment_seconds (float): Long monologues are cut at this length to keep feedback flowing.
+        """
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.energy_threshold = energy_threshold
+        self.min_silence_ms = min_silence_ms
+        self.min_speech_ms = min_speech_ms
+        self.max_segment_ms = max_segment_seconds * 1000
+        self._frame_bytes = int(sample_rate * frame_ms / 1000) * 2
+        self._pending = b""
+        self._pre_roll = deque(maxlen=max(1, pre_roll_ms // frame_ms))
+        self._segment = []
+        self._speech_ms = 0
+        self._silence_ms = 0
+
+    def _is_speech(self, frame: bytes) -> bool:
+        samples = np.frombuffer(frame, dtype="<i2").astype(np.float32)
+        return float(np.sqrt(np.mean(samples * samples))) >= self.energy_threshold
+
+    def _close_segment(self) -> Optional[bytes]:
+        segment = b"".join(self._segment) if self._speech_ms >= self.min_speech_ms else None
+        self._segment = []
+        self._speech_ms = 0
+        self._silence_ms = 0
+        return segment
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """
+        Add recorded audio and return the PCM of every segment it completed.
+
+        Parameters:
+        - chunk (bytes): Raw little-endian 16-bit mono PCM of any length.
+
+        Returns:
+        - List[bytes]: Completed segments, oldest first. Usually empty or a single segment.
+        """
+        data = self._pending + chunk
+        usable = len(data) - len(data) % self._frame_bytes
+        self._pending = data[usable:]
+        segments = []
+        for start in range(0, usable, self._frame_bytes):
+            frame = data[start:start + self._frame_bytes]
+            speech = self._is_speech(frame)
+            if not self._segment:
+                if speech:
+                    self._segment.extend(self._pre_roll)
+                    self._pre_roll.clear()
+                else:
+                    self._pre_roll.append(frame)
+                    continue
+            self._segment.append(frame)
+            if speech:
+                self._speech_ms += self.frame_ms
+                self._silence_ms = 0
+            else:
+                self._silence_ms += self.frame_ms
+            if self._silence_ms >= self.min_silence_ms or len(self._segment) * self.frame_ms >= self.max_segment_ms:
+                segment = self._close_segment()
+                if segment:
+                    segments.append(segment)
+        return segments
+
+    def flush(self) -> Optional[bytes]:
+        """Close the segment in progress at the end of the stream and return it, if it holds speech."""
+        if self._segment:
+            self._segment.append(self._pending[:len(self._pending) - len(self._pending) % 2])
+        self._pending = b""
+        return self._close_segment()
+
+    def to_wav(self, pcm: bytes) -> bytes:
+        """Wrap raw PCM in a WAV container the transcription APIs accept."""
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(pcm)
+        return buffer.getvalue()
@@ -0,0 +1,71 @@
+import asyncio
+import time
+import uuid
+from typing import Optional
+
+
+class ChatSession:
+    def __init__(self, client, temperature: float = 0.7, max_tokens: int = 4000, max_history_messages: int = 20):
+        """
+        Server-side state of one multi-turn chat.
+
+        Parameters:
+        - client: The LLM wrapper answering this chat. It is created once and reused for every turn.
+        - temperature (float): The temperature for text generation.
+        - max_tokens (int): The maximum number of tokens to generate per turn.
+        - max_history_messages (int): How many earlier messages are sent along with each turn.
+        """
+        self.session_id = uuid.uuid4().hex
+        self.client = client
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.max_history_messages = max_history_messages
+        self.history = []
+        self.last_active = time.monotonic()
+        # One turn at a time per session, even if the client reconnects mid-turn.
+        self.lock = asyncio.Lock()
+
+    def add_turn(self, user_message: str, assistant_message: str) -> None:
+        """Append a completed turn and drop the oldest messages beyond the history limit."""
+        self.history.append({"role": "user", "content": user_message})
+        self.history.append({"role": "assistant", "content": assistant_message})
+        del self.history[:-self.max_history_messages]
+        self.last_active = time.monotonic()
+
+
+class ChatSessionStore:
+    def __init__(self, ttl_seconds: float = 3600, max_sessions: int = 1000):
+        """
+        In-memory registry of chat sessions so clients can reconnect to an ongoing conversation.
+
+        Parameters:
+        - ttl_seconds (float): Sessions idle for longer than this are dropped.
+        - max_sessions (int): The maximum number of sessions kept; the least recently active go first.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions = {}
+
+    def create(self, client, **settings) -> ChatSession:
+        """Register a new session for `client` and return it."""
+        self._prune()
+        session = ChatSession(client, **settings)
+        self._sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        """Return the live session with this id, or None if it is unknown or expired."""
+        self._prune()
+        session = self._sessions.get(session_id)
+        if session:
+            session.last_active = time.monotonic()
+        return session
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_active < cutoff]:
+            del self._sessions[session_id]
+        if len(self._sessions) >= self.max_sessions:
+            by_activity = sorted(self._sessions.values(), key=lambda s: s.last_active)
+            for session in by_activity[:len(self._sessions) - self.max_sessions + 1]:
+                del self._sessions[session.session_id]
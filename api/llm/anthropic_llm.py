@@ -1,9 +1,9 @@
 import os
-from anthropic import Anthropic, HUMAN_PROMPT, AI_PROMPT
+from anthropic import Anthropic, HUMAN_PROMPT, AI_PROMPT, NOT_GIVEN
 import base64
 
 class AnthropicWrapper:
-    def __init__(self, api_key=None, model="claude-3-5-sonnet-20240620", system_prompt=None):
+    def __init__(self, api_key=None, model="claude-3-5-sonnet-20240620", system_prompt=None, cache_system_prompt=True):
         """
         Initialize the AnthropicWrapper class.
 
@@ -11,10 +11,14 @@ class AnthropicWrapper:
         - api_key (str): Your Anthropic API key. If not provided, it will try to fetch from environment variables.
         - model (str): The default model to use for text generation. Defaults to "claude-3-sonnet-20240229".
         - system_prompt (str): An optional system-level prompt to set context.
+        - cache_system_prompt (bool): Mark the system prompt as a cacheable prefix so repeat calls read it from
+          Anthropic's prompt cache. Prompts below the model's minimum cacheable length are simply not cached.
         """
         self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
         self.model = model
         self.system_prompt = system_prompt
+        self.cache_system_prompt = cache_system_prompt
+        self.last_usage = {}
         if not self.api_key:
             raise ValueError("API key must be provided either as a parameter or set in the environment variables.")
         self.client = Anthropic(api_key=self.api_key)
@@ -28,8 +32,41 @@ class AnthropicWrapper:
     def system_prompt(self, value):
         """Sets the system prompt."""
         self._system_prompt = value
-    
-    def generate_text(self, prompt, max_tokens=4000, temperature=0.5, **kwargs):
+
+    def _system_blocks(self, system_prompt=None):
+        """
+        Build the `system` parameter for the Messages API.
+
+        The system prompt is sent as a single text block carrying an ephemeral `cache_control`
+        breakpoint, so the large, stable prompts from prompts.json are only processed in full
+        on the first call within the cache lifetime.
+        """
+        system_prompt = system_prompt or self.system_prompt
+        if not system_prompt:
+            return NOT_GIVEN
+        if not self.cache_system_prompt:
+            return system_prompt
+        return [
+            {
+                "type": "text",
+                "text": system_prompt,
+                "cache_control": {"type": "ephemeral"}
+            }
+        ]
+
+    def _record_usage(self, usage, target=None):
+        """Store the token usage of the last call, including prompt-cache reads and writes, and copy it into `target` if one is given."""
+        self.last_usage = {
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cached_input_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+            "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0
+        }
+        if target is not None:
+            target.update(self.last_usage)
+        return self.last_usage
+
+    def generate_text(self, prompt, max_tokens=4000, temperature=0.5, system_prompt=None, history=None, **kwargs):
         """
         Generate text using the specified model.
 
@@ -37,33 +74,72 @@ class AnthropicWrapper:
         - prompt (str): The prompt text to generate responses for.
         - max_tokens (int): The maximum number of tokens to generate.
         - temperature (float): The temperature for text generation.
+        - system_prompt (str): Overrides the wrapper's system prompt for this call only, so one
+          wrapper can be shared between callers without mutating it.
+        - history (list): Earlier turns as {"role": ..., "content": ...} dicts, oldest first.
         - kwargs: Additional keyword arguments for the Anthropic API call.
 
         Returns:
         - Generated text from the model, input tokens count, and output tokens count.
+          The cached token counts of the call are available afterwards in `last_usage`.
         """
-        messages = [{"role": "user", "content": prompt}]
-        
+        messages = list(history or []) + [{"role": "user", "content": prompt}]
+
         response = self.client.messages.create(
             model=self.model,
             messages=messages,
-            system=self.system_prompt,
+            system=self._system_blocks(system_prompt),
             max_tokens=max_tokens,
             temperature=temperature,
             **kwargs
         )
+        self._record_usage(response.usage)
 
         return (
             response.content[0].text,
             response.usage.input_tokens,
             response.usage.output_tokens
         )
+
+    def stream_text(self, prompt, max_tokens=4000, temperature=0.5, system_prompt=None, history=None, usage=None, **kwargs):
+        """
+        Stream generated text chunk by chunk.
+
+        Parameters:
+        - prompt (str): The prompt text to generate responses for.
+        - max_tokens (int): The maximum number of tokens to generate.
+        - temperature (float): The temperature for text generation.
+        - system_prompt (str): Overrides the wrapper's system prompt for this call only.
+        - history (list): Earlier turns as {"role": ..., "content": ...} dicts, oldest first.
+        - usage (dict): Filled with this call's token usage once the stream ends. `last_usage` is
+          shared by every caller of the wrapper, so concurrent callers should pass their own dict.
+        - kwargs: Additional keyword arguments for the Anthropic API call.
+
+        Yields:
+        - str: Text chunks as they arrive. Token usage is stored in `last_usage` once the stream ends.
+          Closing the generator early closes the upstream connection and stops generation.
+        """
+        messages = list(history or []) + [{"role": "user", "content": prompt}]
+
+        with self.client.messages.stream(
+            model=self.model,
+            messages=messages,
+            system=self._system_blocks(system_prompt),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **kwargs
+        ) as stream:
+            for text in stream.text_stream:
+                yield text
+            self._record_usage(stream.get_final_message().usage, usage)
     
 
     def image_to_text(self, 
                       image_path: str, 
                       prompt: str = "Describe this image in detail.",
-                      max_tokens: int = 1000) -> str:
+                      max_tokens: int = 1000,
+                      media_type: str = "image/jpeg",
+                      cancel_event=None) -> str:
         """
         Convert an image to text description using Claude.
 
@@ -71,33 +147,44 @@ class AnthropicWrapper:
         - image_path (str): Path to the image file.
         - prompt (str): The prompt to guide Claude's description. Default is "Describe this image in detail."
         - max_tokens (int): The maximum number of tokens to generate. Default is 1000.
+        - media_type (str): The MIME type of the image. Default is "image/jpeg".
+        - cancel_event (threading.Event, optional): When set, generation stops at the next chunk and the
+          upstream request is closed. The description generated so far is returned.
 
         Returns:
         - str: The generated text description of the image.
         """
         with open(image_path, "rb") as image_file:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=max_tokens,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/jpeg",
-                                    "data": image_file.read().decode("utf-8")
-                                }
-                            },
-                            {
-                                "type": "text",
-                                "text": prompt
+            image_data = base64.b64encode(image_file.read()).decode("utf-8")
+
+        chunks = []
+        # Streamed so a cancelled call stops generating instead of running to completion.
+        with self.client.messages.stream(
+            model=self.model,
+            max_tokens=max_tokens,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "image",
+                            "source": {
+                                "type": "base64",
+                                "media_type": media_type,
+                                "data": image_data
                             }
-                        ]
-                    }
-                ]
-            )
-        
-        return response.content[0].text
\ No newline at end of file
+                        },
+                        {
+                            "type": "text",
+                            "text": prompt
+                        }
+                    ]
+                }
+            ]
+        ) as stream:
+            for text in stream.text_stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                chunks.append(text)
+
+        return "".join(chunks)
@@ -15,9 +15,12 @@ class GroqWrapper:
         self.api_key = api_key or os.getenv("GROQ_API_KEY")
         self.model = model
         self.system_prompt = system_prompt
+        self.last_usage = {}
         if not self.api_key:
             raise ValueError("API key must be provided either as a parameter or set in the environment variables.")
         groq.api_key = self.api_key
+        # One client per wrapper so calls reuse its connection pool.
+        self.client = groq.Groq(api_key=self.api_key)
 
     @property
     def system_prompt(self):
@@ -28,8 +31,35 @@ class GroqWrapper:
     def system_prompt(self, value):
         """Sets the system prompt."""
         self._system_prompt = value
+
+    def _record_usage(self, usage, target=None):
+        """Store the token usage of the last call, including prompt tokens served from the prefix cache, and copy it into `target` if one is given."""
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.last_usage = {
+            "input_tokens": int(usage.prompt_tokens),
+            "output_tokens": int(usage.completion_tokens),
+            "cached_input_tokens": int(getattr(details, "cached_tokens", None) or 0)
+        }
+        if target is not None:
+            target.update(self.last_usage)
+        return self.last_usage
     
-    def generate_text(self, prompt, max_tokens=4000, temperature=0.7, **kwargs):
+    def _build_messages(self, prompt, system_prompt=None, history=None):
+        """
+        Build the chat message list for a call.
+
+        The stable system prompt always leads the list so repeat calls share a cacheable prefix,
+        followed by any earlier turns and finally the new user prompt.
+        """
+        system_prompt = system_prompt or self.system_prompt
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.extend(history or [])
+        messages.append({"role": "user", "content": prompt})
+        return messages
+    
+    def generate_text(self, prompt, max_tokens=4000, temperature=0.7, system_prompt=None, history=None, **kwargs):
         """
         Generate text using the specified model.
 
@@ -37,22 +67,60 @@ class GroqWrapper:
         - prompt (str): The prompt text to generate responses for.
         - max_tokens (int): The maximum number of tokens to generate.
         - temperature (float): The temperature for text generation.
+        - system_prompt (str): Overrides the wrapper's system prompt for this call only, so one
+          wrapper can be shared between callers without mutating it.
+        - history (list): Earlier turns as {"role": ..., "content": ...} dicts, oldest first.
         - kwargs: Additional keyword arguments for the OpenAI API call.
 
         Returns:
-        - Generated text from the model.
+        - Generated text from the model, input tokens count, and output tokens count.
+          The cached token count of the call is available afterwards in `last_usage`.
         """
-        client = groq.Groq()  # Initialize the OpenAI client
-        messages = []
-        if self.system_prompt:
-            messages.append({"role": "system", "content": self.system_prompt})
-        messages.append({"role": "user", "content": prompt})
-        response = client.chat.completions.create(
+        messages = self._build_messages(prompt, system_prompt, history)
+        response = self.client.chat.completions.create(
             model = self.model,
             messages=messages,
             max_tokens=max_tokens,
             temperature=temperature,
             **kwargs
         )
-        return response.choices[0].message.content, int(response.usage.prompt_tokens), int(response.usage.completion_tokens)
+        usage = self._record_usage(response.usage)
+        return response.choices[0].message.content, usage["input_tokens"], usage["output_tokens"]
+
+    def stream_text(self, prompt, max_tokens=4000, temperature=0.7, system_prompt=None, history=None, usage=None, **kwargs):
+        """
+        Stream generated text chunk by chunk.
 
+        Parameters:
+        - prompt (str): The prompt text to generate responses for.
+        - max_tokens (int): The maximum number of tokens to generate.
+        - temperature (float): The temperature for text generation.
+        - system_prompt (str): Overrides the wrapper's system prompt for this call only.
+        - history (list): Earlier turns as {"role": ..., "content": ...} dicts, oldest first.
+        - usage (dict): Filled with this call's token usage once the stream ends. `last_usage` is
+          shared by every caller of the wrapper, so concurrent callers should pass their own dict.
+        - kwargs: Additional keyword arguments for the API call.
+
+        Yields:
+        - str: Text chunks as they arrive. Token usage is stored in `last_usage` once the stream ends.
+          Closing the generator early closes the upstream connection and stops generation.
+        """
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._build_messages(prompt, system_prompt, history),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            **kwargs
+        )
+        try:
+            for chunk in response:
+                # Groq reports usage on the final chunk under x_groq.
+                x_groq = getattr(chunk, "x_groq", None)
+                if x_groq is not None and getattr(x_groq, "usage", None):
+                    self._record_usage(x_groq.usage, usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Closing the HTTP response makes the provider stop generating.
+            response.close()
@@ -15,9 +15,12 @@ class OpenAIWrapper:
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.model = model
         self.system_prompt = system_prompt
+        self.last_usage = {}
         if not self.api_key:
             raise ValueError("API key must be provided either as a parameter or set in the environment variables.")
         openai.api_key = self.api_key
+        # One client per wrapper so calls reuse its connection pool.
+        self.client = openai.OpenAI(api_key=self.api_key)
 
     @property
     def system_prompt(self):
@@ -28,8 +31,35 @@ class OpenAIWrapper:
     def system_prompt(self, value):
         """Sets the system prompt."""
         self._system_prompt = value
+
+    def _record_usage(self, usage, target=None):
+        """Store the token usage of the last call, including prompt tokens served from the prefix cache, and copy it into `target` if one is given."""
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.last_usage = {
+            "input_tokens": int(usage.prompt_tokens),
+            "output_tokens": int(usage.completion_tokens),
+            "cached_input_tokens": int(getattr(details, "cached_tokens", None) or 0)
+        }
+        if target is not None:
+            target.update(self.last_usage)
+        return self.last_usage
     
-    def generate_text(self, prompt, max_tokens=4000, temperature=0.7, **kwargs):
+    def _build_messages(self, prompt, system_prompt=None, history=None):
+        """
+        Build the chat message list for a call.
+
+        The stable system prompt always leads the list so repeat calls share a cacheable prefix,
+        followed by any earlier turns and finally the new user prompt.
+        """
+        system_prompt = system_prompt or self.system_prompt
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.extend(history or [])
+        messages.append({"role": "user", "content": prompt})
+        return messages
+    
+    def generate_text(self, prompt, max_tokens=4000, temperature=0.7, system_prompt=None, history=None, **kwargs):
         """
         Generate text using the specified model.
 
@@ -37,36 +67,79 @@ class OpenAIWrapper:
         - prompt (str): The prompt text to generate responses for.
         - max_tokens (int): The maximum number of tokens to generate.
         - temperature (float): The temperature for text generation.
+        - system_prompt (str): Overrides the wrapper's system prompt for this call only, so one
+          wrapper can be shared between callers without mutating it.
+        - history (list): Earlier turns as {"role": ..., "content": ...} dicts, oldest first.
         - kwargs: Additional keyword arguments for the OpenAI API call.
 
         Returns:
-        - Generated text from the model.
+        - Generated text from the model, input tokens count, and output tokens count.
+          The cached token count of the call is available afterwards in `last_usage`.
         """
-        client = openai.OpenAI()  # Initialize the OpenAI client
-        messages = []
-        if self.system_prompt:
-            messages.append({"role": "system", "content": self.system_prompt})
-        messages.append({"role": "user", "content": prompt})
-        response = client.chat.completions.create(
+        messages = self._build_messages(prompt, system_prompt, history)
+        response = self.client.chat.completions.create(
             model = self.model,
             messages=messages,
             max_tokens=max_tokens,
             temperature=temperature,
             **kwargs
         )
-        return response.choices[0].message.content, int(response.usage.prompt_tokens), int(response.usage.completion_tokens)
+        usage = self._record_usage(response.usage)
+        return response.choices[0].message.content, usage["input_tokens"], usage["output_tokens"]
+
+    def stream_text(self, prompt, max_tokens=4000, temperature=0.7, system_prompt=None, history=None, usage=None, **kwargs):
+        """
+        Stream generated text chunk by chunk.
+
+        Parameters:
+        - prompt (str): The prompt text to generate responses for.
+        - max_tokens (int): The maximum number of tokens to generate.
+        - temperature (float): The temperature for text generation.
+        - system_prompt (str): Overrides the wrapper's system prompt for this call only.
+        - history (list): Earlier turns as {"role": ..., "content": ...} dicts, oldest first.
+        - usage (dict): Filled with this call's token usage once the stream ends. `last_usage` is
+          shared by every caller of the wrapper, so concurrent callers should pass their own dict.
+        - kwargs: Additional keyword arguments for the API call.
+
+        Yields:
+        - str: Text chunks as they arrive. Token usage is stored in `last_usage` once the stream ends.
+          Closing the generator early closes the upstream connection and stops generation.
+        """
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._build_messages(prompt, system_prompt, history),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+            **kwargs
+        )
+        try:
+            for chunk in response:
+                if chunk.usage:
+                    self._record_usage(chunk.usage, usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Closing the HTTP response makes the provider stop generating.
+            response.close()
 
     def image_to_text(self, 
                       image_path: str, 
                       prompt: str = "Describe this image in detail.",
-                      max_tokens: int = 1000) -> str:
+                      max_tokens: int = 1000,
+                      media_type: str = "image/jpeg",
+                      cancel_event=None) -> str:
             """
-            Convert an image to text description using GPT-4 Vision.
+            Convert an image to text description using the wrapper's vision-capable model.
 
             Parameters:
             - image_path (str): Path to the image file.
             - prompt (str): The prompt to guide the model's description. Default is "Describe this image in detail."
             - max_tokens (int): The maximum number of tokens to generate. Default is 1000.
+            - media_type (str): The MIME type of the image. Default is "image/jpeg".
+            - cancel_event (threading.Event, optional): When set, generation stops at the next chunk and the
+              upstream request is closed. The description generated so far is returned.
 
             Returns:
             - str: The generated text description of the image.
@@ -74,8 +147,9 @@ class OpenAIWrapper:
             with open(image_path, "rb") as image_file:
                 base64_image = base64.b64encode(image_file.read()).decode('utf-8')
 
+            # Streamed so a cancelled call stops generating instead of running to completion.
             response = self.client.chat.completions.create(
-                model="gpt-4-vision-preview",
+                model=self.model,
                 messages=[
                     {
                         "role": "user",
@@ -84,13 +158,23 @@ class OpenAIWrapper:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
+                                    "url": f"data:{media_type};base64,{base64_image}"
                                 }
                             }
                         ]
                     }
                 ],
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                stream=True
             )
             
-            return response.choices[0].message.content
\ No newline at end of file
+            chunks = []
+            try:
+                for chunk in response:
+                    if cancel_event is not None and cancel_event.is_set():
+                        break
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        chunks.append(chunk.choices[0].delta.content)
+            finally:
+                response.close()
+            return "".join(chunks)
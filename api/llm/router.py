@@ -0,0 +1,339 @@
+import math
+import threading
+import time
+from collections import deque
+
+# Model classes features can ask for instead of a specific wrapper.
+FAST_DRAFT = "fast_draft"
+QUALITY_DRAFT = "quality_draft"
+QUALITY_CRITIQUE = "quality_critique"
+
+# Per-model prices in USD per million tokens and context window sizes.
+MODEL_CATALOG = {
+    ("anthropic", "claude-3-5-sonnet-20240620"): {"input_price": 3.00, "output_price": 15.00, "context_window": 200000},
+    ("openai", "gpt-4o"): {"input_price": 2.50, "output_price": 10.00, "context_window": 128000},
+    ("groq", "llama3-70b-8192"): {"input_price": 0.59, "output_price": 0.79, "context_window": 8192},
+}
+
+# Each class lists its candidate models in order of preference, the SLA a model has to meet
+# to stay eligible, and whether the cheapest or the fastest eligible model wins.
+MODEL_CLASSES = {
+    FAST_DRAFT: {
+        "candidates": [("groq", "llama3-70b-8192"), ("openai", "gpt-4o"), ("anthropic", "claude-3-5-sonnet-20240620")],
+        "max_p95_latency": 45.0,
+        "max_error_rate": 0.2,
+        "optimize": "latency",
+    },
+    QUALITY_DRAFT: {
+        "candidates": [("anthropic", "claude-3-5-sonnet-20240620"), ("openai", "gpt-4o")],
+        "max_p95_latency": 120.0,
+        "max_error_rate": 0.1,
+        "optimize": "latency",
+    },
+    QUALITY_CRITIQUE: {
+        "candidates": [("anthropic", "claude-3-5-sonnet-20240620"), ("openai", "gpt-4o")],
+        "max_p95_latency": 120.0,
+        "max_error_rate": 0.1,
+        "optimize": "cost",
+    },
+}
+
+
+class ModelStats:
+    def __init__(self, window_size=50, window_seconds=900):
+        """
+        Rolling latency, error-rate and cost statistics for one provider/model pair.
+
+        Parameters:
+        - window_size (int): The maximum number of recent calls kept.
+        - window_seconds (float): Calls older than this are dropped, so a model that was
+          routed away from after a bad spell becomes eligible again.
+        """
+        self.window_seconds = window_seconds
+        self._calls = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok, cost=0.0, cancelled=False):
+        """
+        Record the outcome of a single call.
+
+        Parameters:
+        - cancelled (bool): The caller stopped reading part-way. The call counts towards `calls` and
+          `cancelled`, but its cut-short latency and cost stay out of the averages.
+        """
+        with self._lock:
+            self._calls.append((time.monotonic(), latency, ok, cost, cancelled))
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            while self._calls and self._calls[0][0] < cutoff:
+                self._calls.popleft()
+            return list(self._calls)
+
+    def snapshot(self):
+        """
+        Summarise the calls in the window.
+
+        Returns:
+        - dict: calls, p95_latency and mean_latency in seconds (None without successful calls),
+          error_rate, mean_cost in USD per successful call (None without successful calls), and
+          the number of cancelled calls.
+        """
+        calls = self._recent()
+        latencies = sorted(latency for _, latency, ok, _, cancelled in calls if ok and not cancelled)
+        costs = [cost for _, _, ok, cost, cancelled in calls if ok and not cancelled]
+        errors = sum(1 for _, _, ok, _, _ in calls if not ok)
+        p95 = None
+        if latencies:
+            p95 = latencies[min(len(latencies) - 1, math.ceil(0.95 * len(latencies)) - 1)]
+        return {
+            "calls": len(calls),
+            "p95_latency": p95,
+            "mean_latency": sum(latencies) / len(latencies) if latencies else None,
+            "error_rate": errors / len(calls) if calls else 0.0,
+            "mean_cost": sum(costs) / len(costs) if costs else None,
+            "cancelled": sum(1 for *_, cancelled in calls if cancelled),
+        }
+
+
+class RoutedModel:
+    def __init__(self, router, model_class, system_prompt=None, prefer=None):
+        """
+        A wrapper-compatible handle that routes every call of one model class.
+
+        Parameters:
+        - router (ModelRouter): The router that picks the model for each call.
+        - model_class (str): The declared class, e.g. FAST_DRAFT or QUALITY_CRITIQUE.
+        - system_prompt (str): An optional system-level prompt to set context.
+        - prefer (tuple): An optional (provider, model) key tried first while it meets the class's SLA.
+        """
+        self.router = router
+        self.model_class = model_class
+        self.system_prompt = system_prompt
+        self.prefer = prefer
+        self.last_model = None
+        # Tokens used by every call made through this handle.
+        self.usage = {"input_tokens": 0, "output_tokens": 0}
+
+    @property
+    def system_prompt(self):
+        """Gets the system prompt."""
+        return self._system_prompt
+
+    @system_prompt.setter
+    def system_prompt(self, value):
+        """Sets the system prompt."""
+        self._system_prompt = value
+
+    def generate_text(self, prompt, max_tokens=4000, temperature=None, history=None, **kwargs):
+        """
+        Generate text with the model the router picks for this handle's class.
+
+        Parameters:
+        - history (list): Earlier turns as {"role": ..., "content": ...} dicts, oldest first.
+
+        Returns:
+        - Generated text from the model, input tokens count, and output tokens count.
+        """
+        text, input_tokens, output_tokens, self.last_model = self.router.generate_text(
+            self.model_class,
+            prompt,
+            system_prompt=self.system_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            prefer=self.prefer,
+            history=history,
+            **kwargs
+        )
+        self.usage["input_tokens"] += input_tokens
+        self.usage["output_tokens"] += output_tokens
+        return text, input_tokens, output_tokens
+
+    def stream_text(self, prompt, max_tokens=4000, temperature=None, history=None, **kwargs):
+        """
+        Stream text from the model the router picks for this handle's class.
+
+        Parameters:
+        - history (list): Earlier turns as {"role": ..., "content": ...} dicts, oldest first.
+
+        Yields:
+        - str: Text chunks as they arrive.
+        """
+        usage = {}
+        for key, chunk in self.router.stream_text(
+            self.model_class,
+            prompt,
+            system_prompt=self.system_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            prefer=self.prefer,
+            history=history,
+            usage=usage,
+            **kwargs
+        ):
+            self.last_model = key
+            yield chunk
+        self.usage["input_tokens"] += usage.get("input_tokens", 0)
+        self.usage["output_tokens"] += usage.get("output_tokens", 0)
+
+
+class ModelRouter:
+    def __init__(self, models, classes=None, catalog=None):
+        """
+        Route calls to the cheapest or fastest model that meets a model class's SLA.
+
+        Parameters:
+        - models (dict): Wrapper instances keyed by (provider, model). Wrappers must accept a
+          per-call `system_prompt` so they can be shared between handles.
+        - classes (dict): Model class declarations. Defaults to MODEL_CLASSES.
+        - catalog (dict): Price and context window per (provider, model). Defaults to MODEL_CATALOG.
+        """
+        self.models = models
+        self.classes = classes or MODEL_CLASSES
+        self.catalog = catalog or MODEL_CATALOG
+        self.stats = {key: ModelStats() for key in models}
+
+    def model(self, model_class, system_prompt=None, prefer=None):
+        """Return a handle that behaves like a wrapper but routes every call within `model_class`."""
+        if model_class not in self.classes:
+            raise ValueError(f"Unknown model class '{model_class}'. Choose one of: {', '.join(self.classes)}.")
+        return RoutedModel(self, model_class, system_prompt=system_prompt, prefer=prefer)
+
+    def estimate_cost(self, key, input_tokens, output_tokens):
+        """Estimate the USD cost of a call from the catalog prices."""
+        entry = self.catalog.get(key)
+        if not entry:
+            return 0.0
+        return (input_tokens * entry["input_price"] + output_tokens * entry["output_price"]) / 1_000_000
+
+    def _fits_context(self, key, prompt, system_prompt, max_tokens, history=None):
+        entry = self.catalog.get(key)
+        if not entry:
+            return True
+        # Roughly four characters per token is close enough to rule out models that cannot fit the call.
+        history_chars = sum(len(message["content"]) for message in history or [])
+        estimated_input = (len(prompt) + len(system_prompt or "") + history_chars) // 4
+        return estimated_input + max_tokens <= entry["context_window"]
+
+    def _sort_key(self, key, optimize):
+        if optimize == "cost":
+            # Per-token prices compare models fairly; observed cost per call depends on call size.
+            entry = self.catalog.get(key, {})
+            return entry.get("input_price", 0.0) + entry.get("output_price", 0.0)
+        # Models without latency samples sort first so they get measured.
+        return self.stats[key].snapshot()["p95_latency"] or 0.0
+
+    def rank(self, model_class, prompt="", system_prompt=None, max_tokens=4000, prefer=None, history=None):
+        """
+        Order the available candidates of a class for a call.
+
+        Models meeting the class's SLA come first, cheapest or fastest first depending on the
+        class's `optimize` setting. Models breaching the SLA follow as fallbacks, lowest error
+        rate first. Models that cannot fit the call in their context window are left out.
+        A `prefer`red model that meets the SLA moves to the front.
+
+        Returns:
+        - list: (provider, model) keys in the order they should be tried.
+        """
+        spec = self.classes[model_class]
+        candidates = [
+            key for key in spec["candidates"]
+            if key in self.models and self._fits_context(key, prompt, system_prompt, max_tokens, history)
+        ]
+        eligible, breaching = [], []
+        for key in candidates:
+            snapshot = self.stats[key].snapshot()
+            too_slow = snapshot["p95_latency"] is not None and snapshot["p95_latency"] > spec["max_p95_latency"]
+            too_flaky = snapshot["error_rate"] > spec["max_error_rate"]
+            (breaching if too_slow or too_flaky else eligible).append(key)
+        eligible.sort(key=lambda key: (key != prefer, self._sort_key(key, spec["optimize"])))
+        breaching.sort(key=lambda key: self.stats[key].snapshot()["error_rate"])
+        return eligible + breaching
+
+    def generate_text(self, model_class, prompt, system_prompt=None, max_tokens=4000, temperature=None, prefer=None, history=None, **kwargs):
+        """
+        Generate text with the best model for `model_class`, falling back to the next one on errors.
+
+        Returns:
+        - Generated text, input tokens count, output tokens count and the (provider, model) key used.
+
+        Raises:
+        - RuntimeError: If the class has no usable model.
+        - Exception: The last provider error if every candidate failed.
+        """
+        ranked = self.rank(model_class, prompt, system_prompt, max_tokens, prefer, history)
+        if not ranked:
+            raise RuntimeError(f"No configured model can serve the '{model_class}' class.")
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        if history:
+            kwargs["history"] = history
+        last_error = None
+        for key in ranked:
+            start = time.perf_counter()
+            try:
+                text, input_tokens, output_tokens = self.models[key].generate_text(
+                    prompt, max_tokens=max_tokens, system_prompt=system_prompt, **kwargs
+                )
+            except Exception as e:
+                self.stats[key].record(time.perf_counter() - start, ok=False)
+                last_error = e
+                continue
+            cost = self.estimate_cost(key, input_tokens, output_tokens)
+            self.stats[key].record(time.perf_counter() - start, ok=True, cost=cost)
+            return text, input_tokens, output_tokens, key
+        raise last_error
+
+    def stream_text(self, model_class, prompt, system_prompt=None, max_tokens=4000, temperature=None, prefer=None, history=None, usage=None, **kwargs):
+        """
+        Stream text from the best model for `model_class`.
+
+        A model that fails before sending its first chunk is recorded as an error and the next
+        candidate is tried; once text has been shown, errors are raised to the caller.
+
+        Parameters:
+        - usage (dict): Filled with the token usage of the call once the stream ends.
+
+        Yields:
+        - tuple: The (provider, model) key used and a text chunk.
+        """
+        ranked = self.rank(model_class, prompt, system_prompt, max_tokens, prefer, history)
+        if not ranked:
+            raise RuntimeError(f"No configured model can serve the '{model_class}' class.")
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        if history:
+            kwargs["history"] = history
+        last_error = None
+        for key in ranked:
+            wrapper = self.models[key]
+            start = time.perf_counter()
+            chunks = 0
+            # Per call: the wrapper's own last_usage is shared by every session using it.
+            call_usage = {}
+            try:
+                for chunk in wrapper.stream_text(prompt, max_tokens=max_tokens, system_prompt=system_prompt, usage=call_usage, **kwargs):
+                    chunks += 1
+                    yield key, chunk
+            except GeneratorExit:
+                # A stream stopped before its first chunk counts against the model: the caller gave
+                # up waiting. One stopped after text arrived is kept, but out of the latency figures.
+                self.stats[key].record(time.perf_counter() - start, ok=chunks > 0, cancelled=True)
+                raise
+            except Exception as e:
+                self.stats[key].record(time.perf_counter() - start, ok=False)
+                if chunks:
+                    raise
+                last_error = e
+                continue
+            cost = self.estimate_cost(key, call_usage.get("input_tokens", 0), call_usage.get("output_tokens", chunks))
+            self.stats[key].record(time.perf_counter() - start, ok=True, cost=cost)
+            if usage is not None:
+                usage.update(call_usage)
+            return
+        raise last_error
+
+    def report(self):
+        """Return the rolling statistics of every configured model, keyed by 'provider/model'."""
+        return {f"{provider}/{model}": stats.snapshot() for (provider, model), stats in self.stats.items()}
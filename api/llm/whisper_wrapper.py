@@ -16,6 +16,8 @@ class WhisperWrapper:
         if not self.api_key:
             raise ValueError("API key must be provided either as a parameter or set in the environment variables.")
         openai.api_key = self.api_key
+        # One client per wrapper so calls reuse its connection pool.
+        self.client = openai.OpenAI(api_key=self.api_key)
 
     def transcribe(self, 
                    audio_file: str, 
@@ -38,8 +40,6 @@ class WhisperWrapper:
         Returns:
         - Transcribed text or JSON object, depending on the response_format.
         """
-        client = openai.OpenAI()
-        
         with open(audio_file, "rb") as audio:
             params = {
                 "model": self.model,
@@ -55,7 +55,7 @@ class WhisperWrapper:
             if timestamp_granularities:
                 params["timestamp_granularities"] = timestamp_granularities
 
-            response = client.audio.transcriptions.create(**params)
+            response = self.client.audio.transcriptions.create(**params)
         
         if response_format == "json" or response_format == "verbose_json":
             return response.json()
@@ -1,4 +1,6 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, BackgroundTasks
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, BackgroundTasks, WebSocket, WebSocketDisconnect, Request
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import Optional, List
 import uvicorn
@@ -8,12 +10,78 @@ from llm.whisper_wrapper import WhisperWrapper
 from llm.groq_stt_wrapper import GroqSTTWrapper
 from llm.anthropic_llm import AnthropicWrapper
 from llm.replicate_wrapper import ReplicateWrapper
+from result_cache import ResultCache
+from chat_sessions import ChatSessionStore
+from audio_segmenter import SilenceSegmenter
+from admission import AdmissionController, AdmissionRejected
 #from dotenv import load_dotenv
 import os
+import json
+import asyncio
+import hashlib
+import itertools
+import logging
+import threading
 import tempfile
 
 #load_dotenv()
+logger = logging.getLogger(__name__)
 app = FastAPI()
+result_cache = ResultCache()
+chat_sessions = ChatSessionStore()
+admission = AdmissionController(max_concurrency=int(os.getenv("MAX_CONCURRENT_REQUESTS", 8)))
+
+# Provider-backed endpoints that go through admission control
+ADMISSION_PATHS = {"/generate-text", "/transcribe-audio", "/image-to-text", "/text-to-image"}
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """
+    Queue provider-backed requests per priority class and shed load early.
+
+    Clients choose the class with the X-Priority header ('interactive' by default, 'batch' for
+    scripts) and may shorten their deadline with X-Deadline-Seconds. Requests that would wait
+    past their deadline get a 503 with Retry-After.
+    """
+    if request.url.path not in ADMISSION_PATHS:
+        return await call_next(request)
+    priority = request.headers.get("X-Priority", "interactive").lower()
+    if priority not in admission.classes:
+        return JSONResponse(status_code=400, content={"detail": f"Invalid X-Priority. Choose one of: {', '.join(admission.classes)}."})
+    try:
+        deadline = float(request.headers.get("X-Deadline-Seconds", 0)) or None
+    except ValueError:
+        return JSONResponse(status_code=400, content={"detail": "X-Deadline-Seconds must be a number."})
+    try:
+        async with admission.admit(priority, deadline):
+            return await call_next(request)
+    except AdmissionRejected as e:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": e.detail},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+@app.get("/metrics/admission")
+async def admission_metrics():
+    """Queue depth, wait times and admission counts per priority class."""
+    return admission.metrics()
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+async def spool_upload(upload: UploadFile, suffix: str):
+    """
+    Copy an upload to a temporary file chunk by chunk, hashing it on the way.
+
+    Returns:
+    - Tuple of the temporary file path and the hex SHA-256 digest of the file bytes.
+    """
+    hasher = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+            temp_file.write(chunk)
+    return temp_file.name, hasher.hexdigest()
 
 class GenerateTextRequest(BaseModel):
     provider: str = Field(..., description="The text generation service provider, e.g., 'groq', 'anthropic' or 'openai'.")
@@ -25,10 +93,20 @@ class GenerateTextRequest(BaseModel):
     system_instructions: str = Field("You are working for PropertyGuru", description="Instructions that define the context or constraints under which the model operates. Typically used to create agents or give personality.")
 
 
+class ChatStartMessage(BaseModel):
+    provider: str = Field("openai", description="The text generation service provider, e.g., 'groq', 'anthropic' or 'openai'.")
+    model: str = Field("gpt-4o", description="The model identifier used for every turn of the chat.")
+    system_instructions: str = Field("You are working for PropertyGuru", description="Instructions that define the context or personality of the assistant for the whole chat.")
+    temperature: float = Field(0.7, description="Controls the randomness of the output.")
+    max_tokens: int = Field(4000, description="The maximum number of tokens to generate per turn.")
+    session_id: Optional[str] = Field(None, description="Resume an existing chat instead of starting a new one.")
+
+
 class GenerateTextResponse(BaseModel):
     generated_text: str = Field(..., description="The text generated by the AI model based on the input prompt.")
     input_token: int = Field(0, description="The number of tokens in the input prompt. Defaults to 0 if not provided.")
     output_token: int = Field(0, description="The number of tokens generated by the AI model as output.")
+    cached_input_token: int = Field(0, description="The number of input tokens served from the provider's prompt cache.")
     prompt_returned: Optional[str] = Field(None, description="The original prompt returned along with the output text, if requested.")
 
 class TranscribeAudioResponse(BaseModel):
@@ -51,31 +129,78 @@ class TextToImageStatusResponse(BaseModel):
     error: Optional[str] = Field(None, description="Error message, if any.")
 
 
+# Non-standard status used when the client closed the connection before the response was ready
+CLIENT_CLOSED_REQUEST = 499
+
+async def run_until_disconnect(request: Request, func, cancel_event: threading.Event, poll_interval: float = 0.5):
+    """
+    Run a blocking provider call in the thread pool while watching for the client to go away.
+
+    If the client disconnects, `cancel_event` is set so the call stops at its next streamed chunk
+    and closes the upstream request, freeing the worker. Callers check `cancel_event` afterwards.
+
+    Returns:
+    - Whatever `func` returns, which is partial output if the call was cancelled.
+    """
+    task = asyncio.ensure_future(run_in_threadpool(func))
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=poll_interval)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            cancel_event.set()
+            return await task
+
+def log_cancellation(endpoint: str, provider: str, model: str, generated_tokens: int, max_tokens: int):
+    """Log a call aborted because the client disconnected, with the output tokens it avoided paying for."""
+    logger.info(
+        "Cancelled %s call to %s/%s after the client disconnected: ~%d output tokens generated, up to %d tokens saved.",
+        endpoint, provider, model, generated_tokens, max(0, max_tokens - generated_tokens)
+    )
+
+def create_text_client(provider: str, model: str, system_instructions: str):
+    """Create the text generation wrapper for a provider, raising a 400 for unknown providers."""
+    if provider == "openai":
+        return OpenAIWrapper(model=model, system_prompt=system_instructions)
+    elif provider == "groq":
+        return GroqWrapper(model=model, system_prompt=system_instructions)
+    elif provider == "anthropic":
+        return AnthropicWrapper(model=model, system_prompt=system_instructions)
+    raise HTTPException(status_code=400, detail="Invalid provider. Choose 'openai', 'groq', or 'anthropic'.")
+
 @app.post("/generate-text", response_model=GenerateTextResponse)
-async def generate_text(request: GenerateTextRequest):
+async def generate_text(request: GenerateTextRequest, http_request: Request):
     try:
-        if request.provider == "openai":
-            client = OpenAIWrapper(model=request.model, system_prompt=request.system_instructions)
-            generated_text, input_tokens, output_tokens = client.generate_text(
-                prompt=request.prompt,
-                max_tokens=request.max_tokens,
-                temperature=request.temperature,
-            )
-        elif request.provider == "groq":
-            client = GroqWrapper(model=request.model, system_prompt=request.system_instructions)
-        elif request.provider == "anthropic":
-            client = AnthropicWrapper(model=request.model, system_prompt=request.system_instructions)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid provider. Choose 'openai', 'groq', or 'anthropic'.")
-            generated_text, input_tokens, output_tokens = client.generate_text(
+        client = create_text_client(request.provider, request.model, request.system_instructions)
+        cancel_event = threading.Event()
+
+        # Streamed upstream so a disconnect can stop generation part-way
+        def generate():
+            chunks = []
+            stream = client.stream_text(
                 prompt=request.prompt,
                 max_tokens=request.max_tokens,
                 temperature=request.temperature,
             )
+            try:
+                for chunk in stream:
+                    if cancel_event.is_set():
+                        break
+                    chunks.append(chunk)
+            finally:
+                stream.close()
+            return chunks
+
+        chunks = await run_until_disconnect(http_request, generate, cancel_event)
+        if cancel_event.is_set():
+            # Streamed chunks are roughly one token each
+            log_cancellation("/generate-text", request.provider, request.model, len(chunks), request.max_tokens)
+            return Response(status_code=CLIENT_CLOSED_REQUEST)
         result = GenerateTextResponse(
-            generated_text=generated_text,
-            input_token=input_tokens,
-            output_token=output_tokens
+            generated_text="".join(chunks),
+            input_token=client.last_usage.get("input_tokens", 0),
+            output_token=client.last_usage.get("output_tokens", 0),
+            cached_input_token=client.last_usage.get("cached_input_tokens", 0)
         )
         if request.return_prompt:
             result.prompt_returned = request.prompt
@@ -86,6 +211,69 @@ async def generate_text(request: GenerateTextRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
     
+@app.websocket("/ws/chat")
+async def chat(websocket: WebSocket):
+    """
+    Multi-turn chat over a WebSocket with tokens streamed back as they are generated.
+
+    The client opens with a "start" message carrying the ChatStartMessage fields (or a session_id
+    to resume) and then sends {"type": "message", "content": ...} per turn. Each turn is answered
+    with a stream of {"type": "token"} messages followed by one {"type": "done"} message with the
+    token usage. The conversation history is kept on the server. A turn that fails is answered
+    with one {"type": "error"} message and the session stays open for the next turn.
+    """
+    await websocket.accept()
+    try:
+        start = ChatStartMessage(**(await websocket.receive_json()))
+        session = chat_sessions.get(start.session_id) if start.session_id else None
+        if session is None:
+            client = create_text_client(start.provider, start.model, start.system_instructions)
+            session = chat_sessions.create(client, temperature=start.temperature, max_tokens=start.max_tokens)
+        await websocket.send_json({"type": "ready", "session_id": session.session_id})
+
+        while True:
+            try:
+                message = await websocket.receive_json()
+                if not isinstance(message, dict) or message.get("type") != "message" or not message.get("content"):
+                    await websocket.send_json({"type": "error", "detail": "Expected {\"type\": \"message\", \"content\": ...}."})
+                    continue
+                async with session.lock:
+                    chunks = []
+                    stream = session.client.stream_text(
+                        prompt=message["content"],
+                        max_tokens=session.max_tokens,
+                        temperature=session.temperature,
+                        history=session.history
+                    )
+                    try:
+                        async for chunk in iterate_in_threadpool(stream):
+                            chunks.append(chunk)
+                            await websocket.send_json({"type": "token", "content": chunk})
+                    finally:
+                        # Stops the upstream generation if the client went away mid-turn
+                        stream.close()
+                    session.add_turn(message["content"], "".join(chunks))
+                    usage = session.client.last_usage
+                    await websocket.send_json({
+                        "type": "done",
+                        "input_token": usage.get("input_tokens", 0),
+                        "output_token": usage.get("output_tokens", 0),
+                        "cached_input_token": usage.get("cached_input_tokens", 0)
+                    })
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                # A failed turn leaves the history as it was; the client can send its next message.
+                await websocket.send_json({"type": "error", "detail": f"Chat error: {str(e)}"})
+    except WebSocketDisconnect:
+        pass
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "detail": e.detail})
+        await websocket.close()
+    except Exception as e:
+        await websocket.send_json({"type": "error", "detail": f"Chat error: {str(e)}"})
+        await websocket.close()
+
 @app.post("/transcribe-audio", response_model=TranscribeAudioResponse)
 async def transcribe_audio(
     audio_file: UploadFile = File(...),
@@ -107,10 +295,8 @@ async def transcribe_audio(
         if file_extension not in supported_formats:
             raise HTTPException(status_code=400, detail=f"Unsupported file format. Supported formats are: {', '.join(supported_formats)}")
 
-        # Save the uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_extension}") as temp_audio:
-            temp_audio.write(audio_file.file.read())
-            temp_audio_path = temp_audio.name
+        # Save the uploaded file temporarily, hashing it as it is copied
+        temp_audio_path, audio_digest = await spool_upload(audio_file, f".{file_extension}")
 
         # Prepare common parameters
         common_params = {
@@ -120,6 +306,19 @@ async def transcribe_audio(
             "temperature": temperature
         }
 
+        # Identical recordings with identical parameters are served from the cache
+        cache_key = ResultCache.make_key(
+            audio_digest,
+            endpoint="transcribe-audio",
+            provider=provider,
+            timestamp_granularities=timestamp_granularities if provider == "openai" else None,
+            **common_params
+        )
+        cached_transcription = result_cache.get(cache_key)
+        if cached_transcription is not None:
+            os.unlink(temp_audio_path)
+            return TranscribeAudioResponse(transcription=cached_transcription)
+
         # Initialize the appropriate wrapper and transcribe based on the provider
         if provider == "openai":
             transcription_client = WhisperWrapper()
@@ -129,19 +328,121 @@ async def transcribe_audio(
             transcription_client = GroqSTTWrapper()
 
         # Transcribe the audio
-        transcription = transcription_client.transcribe(temp_audio_path, **common_params)
+        transcription = await run_in_threadpool(transcription_client.transcribe, temp_audio_path, **common_params)
 
         # Delete the temporary file
         os.unlink(temp_audio_path)
 
+        result_cache.set(cache_key, transcription)
         return TranscribeAudioResponse(transcription=transcription)
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Transcription error: {str(e)}")
 
+@app.websocket("/ws/transcribe")
+async def transcribe_stream(
+    websocket: WebSocket,
+    provider: str = Query("groq", description="The provider to use for transcription. Either 'openai' or 'groq'."),
+    language: Optional[str] = Query(None, description="The language of the input audio."),
+    sample_rate: int = Query(16000, description="The sample rate of the incoming 16-bit mono PCM audio."),
+    silence_ms: int = Query(600, description="How long a pause closes a segment, in milliseconds.")
+):
+    """
+    Incremental transcription of live audio.
+
+    The client sends raw 16-bit little-endian mono PCM as binary messages while recording.
+    Audio is cut into segments at pauses in speech and each finished segment is transcribed in
+    the background, answered with {"type": "partial", "segment": n, "text": ...}. Sending
+    {"type": "stop"} transcribes the remaining audio and ends with {"type": "final", "text": ...}.
+    Any other text message is answered with {"type": "error"} and recording continues.
+    """
+    await websocket.accept()
+    if provider not in ["openai", "groq"]:
+        await websocket.send_json({"type": "error", "detail": "Invalid provider. Choose either 'openai' or 'groq'."})
+        await websocket.close()
+        return
+
+    try:
+        transcription_client = WhisperWrapper() if provider == "openai" else GroqSTTWrapper()
+    except Exception as e:
+        # Raised when the provider's API key is not configured.
+        await websocket.send_json({"type": "error", "detail": f"Transcription error: {str(e)}"})
+        await websocket.close()
+        return
+    segmenter = SilenceSegmenter(sample_rate=sample_rate, min_silence_ms=silence_ms)
+    transcripts = {}
+    pending = set()
+    segment_numbers = itertools.count()
+    send_lock = asyncio.Lock()
+
+    async def send(payload):
+        async with send_lock:
+            await websocket.send_json(payload)
+
+    async def transcribe_segment(index, pcm):
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio:
+            temp_audio.write(segmenter.to_wav(pcm))
+            temp_audio_path = temp_audio.name
+        try:
+            # The latest finished text keeps spelling and style consistent across segments. Segments are
+            # transcribed concurrently, so this is the last earlier segment that is done, not always index - 1.
+            earlier = [i for i in transcripts if i < index and transcripts[i]]
+            previous = transcripts[max(earlier)] if earlier else None
+            result = await asyncio.to_thread(
+                transcription_client.transcribe,
+                temp_audio_path,
+                language=language,
+                prompt=previous[-200:] if previous else None,
+                response_format="json"
+            )
+            transcripts[index] = json.loads(result).get("text", "").strip()
+            await send({"type": "partial", "segment": index, "text": transcripts[index]})
+        except Exception as e:
+            transcripts[index] = ""
+            await send({"type": "error", "segment": index, "detail": f"Transcription error: {str(e)}"})
+        finally:
+            os.unlink(temp_audio_path)
+
+    def schedule(pcm):
+        task = asyncio.create_task(transcribe_segment(next(segment_numbers), pcm))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                for pcm in segmenter.feed(message["bytes"]):
+                    schedule(pcm)
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except json.JSONDecodeError:
+                    control = None
+                if not isinstance(control, dict) or control.get("type") != "stop":
+                    await send({"type": "error", "detail": "Expected {\"type\": \"stop\"}."})
+                    continue
+                remainder = segmenter.flush()
+                if remainder:
+                    schedule(remainder)
+                if pending:
+                    await asyncio.wait(set(pending))
+                final_text = " ".join(transcripts[i] for i in sorted(transcripts) if transcripts[i])
+                await send({"type": "final", "text": final_text})
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in set(pending):
+            task.cancel()
+
 @app.post("/image-to-text", response_model=ImageToTextResponse)
 async def image_to_text(
+    http_request: Request,
     image_file: UploadFile = File(...),
     provider: str = Form(..., description="The provider to use for image-to-text conversion. Either 'openai' or 'anthropic'."),
     prompt: str = Form("Describe this image in detail.", description="The prompt to guide the model's description."),
@@ -156,10 +457,21 @@ async def image_to_text(
         if not image_file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="Uploaded file is not an image.")
 
-        # Save the uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_image:
-            temp_image.write(image_file.file.read())
-            temp_image_path = temp_image.name
+        # Save the uploaded file temporarily, hashing it as it is copied
+        temp_image_path, image_digest = await spool_upload(image_file, ".jpg")
+
+        # Identical images with identical parameters are served from the cache
+        cache_key = ResultCache.make_key(
+            image_digest,
+            endpoint="image-to-text",
+            provider=provider,
+            prompt=prompt,
+            max_tokens=max_tokens
+        )
+        cached_description = result_cache.get(cache_key)
+        if cached_description is not None:
+            os.unlink(temp_image_path)
+            return ImageToTextResponse(description=cached_description)
 
         # Initialize the appropriate wrapper based on the provider
         if provider == "openai":
@@ -167,16 +479,29 @@ async def image_to_text(
         else:  # provider == "anthropic"
             client = AnthropicWrapper()
 
-        # Convert image to text
-        description = client.image_to_text(
-            image_path=temp_image_path,
-            prompt=prompt,
-            max_tokens=max_tokens
+        # Convert image to text, stopping early if the client disconnects
+        cancel_event = threading.Event()
+        description = await run_until_disconnect(
+            http_request,
+            lambda: client.image_to_text(
+                image_path=temp_image_path,
+                prompt=prompt,
+                max_tokens=max_tokens,
+                media_type=image_file.content_type,
+                cancel_event=cancel_event
+            ),
+            cancel_event
         )
 
         # Delete the temporary file
         os.unlink(temp_image_path)
 
+        if cancel_event.is_set():
+            # Roughly four characters per token
+            log_cancellation("/image-to-text", provider, client.model, len(description) // 4, max_tokens)
+            return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+        result_cache.set(cache_key, description)
         return ImageToTextResponse(description=description)
     except HTTPException as e:
         raise e
@@ -189,7 +514,8 @@ async def text_to_image(request: TextToImageRequest, background_tasks: Backgroun
         replicate_client = ReplicateWrapper()
         
         # Start the image generation task
-        prediction = replicate_client.text_to_image(
+        prediction = await run_in_threadpool(
+            replicate_client.text_to_image,
             prompt=request.prompt,
             aspect_ratio=request.aspect_ratio,
             model=request.model
@@ -204,7 +530,7 @@ async def text_to_image(request: TextToImageRequest, background_tasks: Backgroun
 async def get_text_to_image_status(task_id: str):
     try:
         replicate_client = ReplicateWrapper()
-        status = replicate_client.get_prediction_status(task_id)
+        status = await run_in_threadpool(replicate_client.get_prediction_status, task_id)
         
         response = TextToImageStatusResponse(status=status["status"])
         if status["status"] == "succeeded":
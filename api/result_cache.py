@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Optional
+
+
+class ResultCache:
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        Disk-backed cache for provider results keyed by content hash, with size-based LRU eviction.
+
+        Parameters:
+        - directory (str, optional): Where cache entries are stored. Defaults to the RESULT_CACHE_DIR
+          environment variable or a folder in the system temp directory.
+        - max_bytes (int, optional): The total size entries may take before the least recently used
+          ones are evicted. Defaults to RESULT_CACHE_MAX_BYTES or 512 MB.
+        """
+        self.directory = directory or os.getenv(
+            "RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pm-toolkit-result-cache")
+        )
+        self.max_bytes = max_bytes or int(os.getenv("RESULT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._size = sum(os.path.getsize(path) for path in self._entries())
+
+    @staticmethod
+    def make_key(content_digest: str, **params) -> str:
+        """
+        Build a cache key from the SHA-256 digest of the input bytes and the call parameters.
+
+        Parameters:
+        - content_digest (str): Hex SHA-256 digest of the uploaded file.
+        - params: Every parameter that changes the provider's output (provider, language, prompt, ...).
+
+        Returns:
+        - str: The hex SHA-256 digest identifying the result.
+        """
+        payload = json.dumps({"content": content_digest, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    yield os.path.join(root, name)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached result for `key`, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as entry:
+                value = json.load(entry)["value"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+        try:
+            # The modification time doubles as the last access time for LRU eviction.
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store `value` under `key`, evicting the least recently used entries if the cache is over size."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as entry:
+            json.dump({"value": value}, entry)
+        with self._lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(temp_path, path)
+            self._size += os.path.getsize(path) - previous
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        self._size = sum(size for _, size, _ in entries)
+        # Evict down to 90% of the limit so a full cache doesn't scan the directory on every write.
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
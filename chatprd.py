@@ -1,3 +1,4 @@
+import math
 import streamlit as st
 st.set_page_config(
     page_title="PM Toolkit",
@@ -13,32 +14,52 @@ from features.tracking import tracking_plan
 from features.gtm import gtm_planner
 from features.ab_test import abc_test_significance
 from features.test_duration import ab_test_duration_calculator
-from utils.models import build_models
-from utils.data_loading import load_prompts
-from storage.supabase_client import create_client
-import os
-from supabase import create_client, Client
+from utils.resources import get_prompts, get_model_router, get_supabase_client, get_auth_client, get_search_index, get_similarity_index, get_write_buffer
 from utils.authentication import auth_screen 
+from utils.critique_panel import build_critics
 
 #from dotenv import load_dotenv
 #load_dotenv()
 
-SUPABASE_URL = os.environ.get('SUPABASE_URL')
-SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-#res = supabase.auth.get_session()
 # Using Streamlit's session state to store temporary memory
 
+def show_storage_status(storage):
+    """
+    Show the storage circuit breaker and the write queue in the sidebar, with a warning while storage is down.
+
+    Args:
+        storage: The storage backend. Backends without a circuit breaker show nothing.
+    """
+    if not hasattr(storage, 'status'):
+        return
+    status = storage.status()
+    buffer = get_write_buffer()
+    if status['state'] != "closed":
+        st.sidebar.warning(
+            f"Storage is unavailable, next try in {math.ceil(status['retry_in'])}s. Saves are queued and written once it recovers."
+        )
+    with st.sidebar.expander("Storage status"):
+        st.caption(f"Circuit breaker: {status['state']}, {status['failures']} consecutive failures, {status['rejected']} calls rejected")
+        st.caption(f"Write queue: {buffer.pending()} waiting, {buffer.written} written, {buffer.unconfirmed} timed out, {buffer.dropped} dropped")
+        if hasattr(storage, 'hits'):
+            st.caption(f"Read cache: {storage.hits} hits, {storage.misses} misses")
+        if status['last_error'] or buffer.last_error:
+            st.caption(f"Last error: {status['last_error'] or buffer.last_error}")
+
 def main():
     """
     Main function that serves as the entry point of the program.
     
-    This function loads prompts, builds models, and presents a menu of options to the user based on their selection.
+    This function fetches the shared prompts, model router and Supabase client, and presents a menu of options to the user based on their selection.
     The user can choose to create a PRD, improve a PRD, brainstorm features, create a tracking plan, create a GTM plan, or view history.
     Each option calls a specific function to perform the corresponding task.
     """
-    prompts = load_prompts()
-    claude_llm, gpt4_llm = build_models()
+    prompts = get_prompts()
+    router = get_model_router()
+    supabase = get_supabase_client()
+    # Built up front so the indexes see every write from the start of the process.
+    get_search_index()
+    get_similarity_index()
     system_prompt_prd_experimental = prompts['system_prompt_prd_experimental']
     system_prompt_director = prompts['system_prompt_director']
     system_prompt_brainstorm = prompts['system_prompt_brainstorm']
@@ -48,13 +69,15 @@ def main():
     system_prompt_GTM = prompts['system_prompt_GTM']
     system_prompt_GTM_critique = prompts['system_prompt_GTM_critique']
     system_prompt_ab_test = prompts['system_prompt_ab_test']
+    panel_critics = build_critics(system_prompt_director, prompts.get('system_prompt_engineering_critic'), prompts.get('system_prompt_data_critic'))
     # Authenticate the user
     # authenticate()
     if 'history' not in st.session_state:
         st.session_state['history'] = []
-    auth_screen(supabase)
+    auth_screen(get_auth_client())
     # if st.session_state['authenticated']:
     if st.session_state['logged_in']:
+        show_storage_status(supabase)
         option = st.sidebar.radio(
             "# Select the Task 👉",
             key="task",
@@ -71,17 +94,17 @@ def main():
         )
         
         if option == "Create PRD":
-            create_prd(system_prompt_prd_experimental, system_prompt_director, claude_llm, gpt4_llm, supabase)
+            create_prd(system_prompt_prd_experimental, system_prompt_director, router, supabase, panel_critics)
         elif option == "Improve PRD":
-            improve_prd(system_prompt_prd_experimental, system_prompt_director, claude_llm, supabase)
+            improve_prd(system_prompt_prd_experimental, system_prompt_director, router, supabase, panel_critics)
         elif option == "Brainstorm Features":
-            brainstorm_features(system_prompt_brainstorm, gpt4_llm, supabase)
+            brainstorm_features(system_prompt_brainstorm, router, supabase)
         elif option == "Tracking Plan":
-            tracking_plan(system_prompt_tracking, user_prompt_tracking, system_prompt_directorDA, claude_llm, supabase)
+            tracking_plan(system_prompt_tracking, user_prompt_tracking, system_prompt_directorDA, router, supabase)
         elif option == "Create GTM Plan":
-            gtm_planner(system_prompt_GTM, system_prompt_GTM_critique, gpt4_llm, claude_llm)
+            gtm_planner(system_prompt_GTM, system_prompt_GTM_critique, router)
         elif option == "A/B Test Significance":
-            abc_test_significance(claude_llm, system_prompt_ab_test)
+            abc_test_significance(router, system_prompt_ab_test)
         elif option == "A/B Test Duration Calculator":
             ab_test_duration_calculator()
         elif option == "View History":
@@ -3,6 +3,7 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 import plotly.graph_objects as go
+from api.llm.router import QUALITY_DRAFT
 
 def calculate_significance(control, variation):
     """
@@ -37,7 +38,7 @@ def plot_results(results_df):
     fig.update_layout(title='Conversion Rates by Variant', yaxis_title='Conversion Rate')
     return fig
 
-def abc_test_significance(quality_llm, system_prompt_ab_test):
+def abc_test_significance(router, system_prompt_ab_test):
     st.subheader("A/B/C Test Significance Checker")
     
     # Initialize session state for variants if it doesn't exist
@@ -143,8 +144,7 @@ def abc_test_significance(quality_llm, system_prompt_ab_test):
         outlined in the experiment details.
         """
         
+        quality_llm = router.model(QUALITY_DRAFT)
         quality_llm.system_prompt = system_prompt_ab_test
         st.markdown("### AI Interpretation")
-        with st.spinner("Generating AI interpretation... This may take a few moments."):
-            interpretation, _, _ = quality_llm.generate_text(interpretation_prompt)
-        st.markdown(interpretation)
\ No newline at end of file
+        st.write_stream(quality_llm.stream_text(prompt=interpretation_prompt))
\ No newline at end of file
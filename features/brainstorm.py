@@ -1,27 +1,36 @@
 import streamlit as st
-from storage.supabase_client import create_record
 from utils.data_loading import create_data_brainstorm
+from utils.resources import get_write_buffer
+from utils.chat_memory import ConversationMemory, SUMMARY_SYSTEM_PROMPT
+from api.llm.router import FAST_DRAFT
 import os
+from storage.backends import table_name
 
-brainstorm_table = os.environ.get('SUPABASE_BRAINTORM_TABLE')
+brainstorm_table = table_name('SUPABASE_BRAINTORM_TABLE')
 
-def brainstorm_features(system_prompt_brainstorm,llm_model,supabase):
+def brainstorm_features(system_prompt_brainstorm, router, supabase):
     """
     This function allows the user to interact with an AI model to brainstorm ideas on a given topic.
     Parameters:
     system_prompt_brainstorm (str): A predefined system prompt for generating a response.
-    llm_model (llm.OpenAI): An initialized LLM model.
+    router (ModelRouter): The model router; chat replies use the fast draft class.
+    supabase: The Supabase client. Messages are saved through the shared write-behind buffer.
     Returns:
     None
     Usage:
     ```python
-    brainstorm_features(system_prompt_brainstorm, llm_model)
+    brainstorm_features(system_prompt_brainstorm, router, supabase)
     ```
     The function initializes a chat history if it doesn't already exist. It then displays chat messages from the history on app rerun. The function reacts to user input by displaying the user message in a chat message container, adding the user message to the chat history, and generating an assistant response using the provided LLM model. The assistant response is then displayed in a chat message container and added to the chat history.
+    Earlier turns are sent as real chat messages: the latest ones verbatim and the rest as a rolling summary
+    that is updated in the background, so each turn's input stays bounded however long the session gets.
     """
     # Initialize chat history
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "brainstorm_memory" not in st.session_state:
+        st.session_state.brainstorm_memory = ConversationMemory()
+    memory = st.session_state.brainstorm_memory
 
     # Display chat messages from history on app rerun
     for message in st.session_state.messages:
@@ -32,26 +41,16 @@ def brainstorm_features(system_prompt_brainstorm,llm_model,supabase):
     if prompt := st.chat_input("What  would you like to brainstorm on today?"):
         # Display user message in chat message container
         st.chat_message("user").markdown(prompt)
+        history = memory.history(st.session_state.messages)
         # Add user message to chat history
         st.session_state.messages.append({"role": "user", "content": prompt})
-        data = create_data_brainstorm(st.session_state['user']['email'], prompt, True)
-        try:
-            create_record(brainstorm_table, data, supabase)
-        except Exception as e:
-            st.error(f"Failed to save brainstorm message from user to database. Error: {str(e)}")
-        context = st.session_state.messages[-6:]
-        llm_model.system_prompt = system_prompt_brainstorm
-        response, input_tokens, output_tokens = llm_model.generate_text(
-            prompt = f"User input: {prompt}, Previous Context: {context}"
-        )
-        # Display assistant response in chat message container
+        get_write_buffer().add(brainstorm_table, create_data_brainstorm(st.session_state['user']['email'], prompt, True))
+        llm_model = router.model(FAST_DRAFT, system_prompt=system_prompt_brainstorm)
+        # Stream the assistant response into its chat message container
         with st.chat_message("assistant"):
-            st.markdown(response)
+            response = st.write_stream(llm_model.stream_text(prompt=prompt, history=history))
         # Add assistant response to chat history
         st.session_state.messages.append({"role": "assistant", "content": response})
-        data = create_data_brainstorm(st.session_state['user']['email'], response, False)
-        try:
-            create_record(brainstorm_table, data, supabase)
-        except Exception as e:
-            st.error(f"Failed to save brainstorm message to database. Error: {str(e)}")
+        memory.refresh(router.model(FAST_DRAFT, system_prompt=SUMMARY_SYSTEM_PROMPT), st.session_state.messages)
+        get_write_buffer().add(brainstorm_table, create_data_brainstorm(st.session_state['user']['email'], response, False))
     pass    
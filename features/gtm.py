@@ -1,17 +1,90 @@
 import streamlit as st
 from storage.supabase_client import create_record, read_records
 from utils.data_loading import create_data_prd
+from utils.streaming import StreamlitProgress
+from utils.background import session_id, watch_job
+from utils.resources import get_job_runner
+from utils.pipeline import Stage, PipelineMetrics, run_pipeline
+from api.llm.router import FAST_DRAFT, QUALITY_CRITIQUE
 import os
 
-def gtm_planner(system_prompt_GTM, system_prompt_GTM_critique, fast_llm_model, llm_model):
+def run_gtm_plan(progress, router, system_prompt_GTM, system_prompt_GTM_critique, prd_text, other_details):
+    """
+    Generate a GTM plan from a PRD with a fast draft, a critique and a final revision.
+
+    Touches no session state, so it runs the same on the page and in a background worker.
+
+    Args:
+        progress: Where stages are reported, on the page or on a background run.
+        router: The model router used to pick the model for each call.
+        system_prompt_GTM (str): The system prompt for generating the GTM plan.
+        system_prompt_GTM_critique (str): The system prompt for critiquing the GTM plan.
+        prd_text (str): The PRD the plan is for.
+        other_details (str): Additional details from the user.
+
+    Returns:
+        dict: The final 'document', the 'history' entries and the per-stage 'metrics' of the run.
+    """
+    user_prompt = f"Generate the Go To Market Plan for: \n ## Product Requirements Document \n {prd_text} \n ## Other Details \n {other_details} \n RESPOND in Markdown Only."
+    metrics = PipelineMetrics()
+    context = run_pipeline(progress, router, [
+        Stage(
+            "draft", FAST_DRAFT, user_prompt,
+            system_prompt=system_prompt_GTM, temperature=0.4,
+            label="Generating Plan...", done_label="Draft GTM plan"
+        ),
+        Stage(
+            "critique", QUALITY_CRITIQUE,
+            lambda context: f"Critique the Go To Market Plan: {context['draft']}. \n It was written for this PRD: \n {prd_text} \n ## Other Details \n {other_details} \n Only respond in Markdown format. BE DETAILED.",
+            system_prompt=system_prompt_GTM_critique, temperature=0.3,
+            after=["draft"],
+            label="Reviewing the plan...", done_label="Review"
+        ),
+        Stage(
+            "plan", FAST_DRAFT,
+            lambda context: f"Given the Feedback from your manager:{context['critique']} \n Improve upon your draft Go To Market Plan {context['draft']}. \n RESPOND in Markdown Only.",
+            system_prompt=system_prompt_GTM, temperature=0.4,
+            after=["critique"],
+            final=True
+        ),
+    ], metrics=metrics)
+    progress.note(metrics.summary())
+    history = [{'role': 'user', 'content': context[name]} for name in ("draft", "critique", "plan")]
+    return {'document': context["plan"], 'history': history, 'metrics': metrics.stages}
+
+def offer_gtm_plan(response):
+    """Offer a finished GTM plan for download."""
+    st.download_button(
+        label="Download GTM Plan as Markdown",
+        data=response,
+        file_name="gtm_plan.md",
+        mime="text/markdown"
+    )
+
+def show_background_gtm(result, first_view):
+    """
+    Show the GTM plan of a finished background run.
+
+    Args:
+        result (dict): The result returned by `run_gtm_plan`.
+        first_view (bool): Whether the session sees this result for the first time.
+
+    Returns:
+        None
+    """
+    st.markdown(result['document'], unsafe_allow_html=True)
+    if first_view:
+        st.session_state['history'].extend(result['history'])
+    offer_gtm_plan(result['document'])
+
+def gtm_planner(system_prompt_GTM, system_prompt_GTM_critique, router):
     """
     Generate GTM (Go-To-Market) Plan.
 
     Args:
         system_prompt_GTM (str): The system prompt for generating the initial GTM plan.
         system_prompt_GTM_critique (str): The system prompt for critiquing the GTM plan.
-        fast_llm_model: The fast language model used for generating text.
-        llm_model: The language model used for generating text.
+        router: The model router used to pick the model for each call.
 
     Returns:
         None
@@ -19,28 +92,29 @@ def gtm_planner(system_prompt_GTM, system_prompt_GTM_critique, fast_llm_model, l
     st.subheader("Generate GTM Plan")
     prd_text = st.text_area("#### Enter your PRD here", placeholder="Paste your PRD here to generate GTM plan", height=400)
     other_details = st.text_area("#### Addition Details", placeholder="Share any details that will be helpful with GTM planning", height=200)
+    run_in_background = st.toggle("Run in background", help="Keep generating while you use other pages. The plan waits for you here.")
     tracking_button = st.button("Generate GTM Plan", type="primary")
 
     if tracking_button:
         if not prd_text:
             st.warning("Please enter all the details")
+            return
+        options = {
+            'router': router,
+            'system_prompt_GTM': system_prompt_GTM,
+            'system_prompt_GTM_critique': system_prompt_GTM_critique,
+            'prd_text': prd_text,
+            'other_details': other_details,
+        }
+        if run_in_background:
+            get_job_runner().submit(session_id(), 'gtm_plan', run_gtm_plan, **options)
         else:
-            with st.spinner('Generating Plan...'):
-                try:
-                    user_prompt = f"Generate the Go To Market Plan for: \n ## Product Requirements Document \n {prd_text} \n ## Other Details \n {other_details} \n RESPOND in Markdown Only."
-                    fast_llm_model.system_prompt = system_prompt_GTM
-                    response, input_tokens, output_tokens = fast_llm_model.generate_text(
-                        prompt=user_prompt, temperature=0.4
-                    )
-                    st.markdown(response, unsafe_allow_html=True)
-                    st.session_state['history'].append({'role': 'user', 'content': response})
-                    # Download button for the plan
-                    st.download_button(
-                        label="Download GTM Plan as Markdown",
-                        data=response,
-                        file_name="gtm_plan.md",
-                        mime="text/markdown"
-                    )
-                except Exception as e:
-                    st.error(f"Failed to generate GTM plan. Please try again later. Error: {str(e)}")
-    pass
\ No newline at end of file
+            try:
+                result = run_gtm_plan(StreamlitProgress(), **options)
+                st.session_state['history'].extend(result['history'])
+                # Download button for the plan
+                offer_gtm_plan(result['document'])
+            except Exception as e:
+                st.error(f"Failed to generate GTM plan. Please try again later. Error: {str(e)}")
+            return
+    watch_job(get_job_runner(), 'gtm_plan', show_background_gtm)
@@ -1,20 +1,332 @@
 import streamlit as st
-from storage.supabase_client import create_record, read_records
+from storage.supabase_client import read_records
 from utils.data_loading import create_data_prd
+from utils.streaming import StreamlitProgress, patch_stage
+from utils.convergence import VERDICT_INSTRUCTIONS, critique_approves
+from utils.prd_sections import outline_prompt, parse_outline, format_outline, section_stages, merge_sections
+from utils.pipeline import Stage, PipelineMetrics, run_pipeline, run_critique_rounds
+from utils.critique_panel import panel_stages
+from utils.background import session_id, watch_job
+from utils.checkpoints import run_checkpoint
+from utils.resources import get_job_runner, get_checkpoint_store, get_write_buffer, get_similarity_index
+from api.llm.router import FAST_DRAFT, QUALITY_DRAFT, QUALITY_CRITIQUE
 import os
+from storage.backends import table_name
 
-prd_table = os.environ.get('SUPABASE_TABLE')
+prd_table = table_name('SUPABASE_TABLE')
 
-def create_prd(system_prompt_prd, system_prompt_director, llm_model, fast_llm_model, supabase):
+RELATED_WORK_COUNT = 3
+RELATED_WORK_CHARS = 4000
+
+def generate_prd_by_sections(progress, system_prompt_prd, system_prompt_director, router, product_name, product_description,
+                             metrics=None, checkpoint=None):
+    """
+    Generate a PRD section by section, with every section drafted, critiqued and revised concurrently.
+
+    A quick outline call plans the sections first, so wall-clock time is bounded by the slowest
+    section rather than by the sum of all calls.
+
+    Args:
+        progress: Where stages are reported, on the page or on a background run.
+        system_prompt_prd (str): The system prompt for generating the PRD.
+        system_prompt_director (str): The system prompt for critiquing the PRD.
+        router: The model router.
+        product_name (str): The name of the product.
+        product_description (str): The description of the product.
+        metrics (PipelineMetrics): Collects per-stage latency and tokens.
+        checkpoint (tuple): (CheckpointStore, run_id), or None.
+
+    Returns:
+        tuple: The merged PRD in Markdown, or an empty string if no outline could be produced,
+        and the section critiques as history entries.
+    """
+    outline = run_pipeline(progress, router, [
+        Stage(
+            "outline", FAST_DRAFT, outline_prompt(product_name, product_description),
+            system_prompt=system_prompt_prd, temperature=0.2,
+            label="Planning PRD sections...", done_label="Outline"
+        )
+    ], metrics=metrics, checkpoint=checkpoint)
+    sections = parse_outline(outline["outline"])
+    if not sections:
+        return "", []
+    progress.note(f"Outline: {len(sections)} sections")
+    progress.show(format_outline(sections))
+
+    context = run_pipeline(
+        progress, router,
+        section_stages(sections, product_name, product_description, system_prompt_prd, system_prompt_director),
+        metrics=metrics, checkpoint=checkpoint
+    )
+    history = [{'role': 'user', 'content': context[f"section{index}.critique"]} for index in range(len(sections))]
+    return merge_sections(product_name, sections, context), history
+
+def run_create_prd(progress, router, system_prompt_prd, system_prompt_director, product_name, product_description,
+                   section_parallel=False, patch_revisions=False, critique_panel=False, panel_critics=None, max_rounds=2,
+                   related_work="", checkpoint=None):
+    """
+    Draft a new PRD and refine it through critique rounds.
+
+    Touches no session state, so it runs the same on the page and in a background worker.
+
+    Args:
+        progress: Where stages are reported, on the page or on a background run.
+        router: The model router; drafts, critiques and quick revisions each ask it for their model class.
+        system_prompt_prd (str): The system prompt for generating the PRD.
+        system_prompt_director (str): The system prompt for critiquing the PRD.
+        product_name (str): The name of the product.
+        product_description (str): The description of the product.
+        section_parallel (bool): Write the sections concurrently from an outline instead.
+        patch_revisions (bool): Revise with targeted edits instead of full rewrites.
+        critique_panel (bool): Review with the critique panel instead of the director alone.
+        panel_critics (list of dict): Reviewers for the critique panel.
+        max_rounds (int): The most critique rounds to run.
+        related_work (str): Past PRDs and tracking plans the user picked as context for the draft.
+        checkpoint (tuple): (CheckpointStore, run_id) to reuse completed stages, or None.
+
+    Returns:
+        dict: The final 'document' (empty if the section outline failed), the 'history' entries
+        and the per-stage 'metrics' of the run.
+    """
+    metrics = PipelineMetrics()
+    draft_context = f" \n Related past work from this team, reuse what still applies: \n{related_work}" if related_work else ""
+    if section_parallel:
+        draft_prd, history = generate_prd_by_sections(
+            progress, system_prompt_prd, system_prompt_director, router, product_name, product_description + draft_context,
+            metrics=metrics, checkpoint=checkpoint
+        )
+        if draft_prd:
+            progress.show(draft_prd)
+            history.append({'role': 'user', 'content': draft_prd})
+        progress.note(metrics.summary())
+        return {'document': draft_prd, 'history': history, 'metrics': metrics.stages}
+
+    context = run_pipeline(progress, router, [
+        Stage(
+            "draft", QUALITY_DRAFT,
+            f"Generate a PRD for a product named {product_name} with the following description: {product_description}.{draft_context} Only respond with the PRD and in Markdown format. BE DETAILED. If you think user is not asking for PRD return nothing.",
+            system_prompt=system_prompt_prd,
+            label="PRD generation in progress...",
+            done_label="Draft PRD"
+        )
+    ], metrics=metrics, checkpoint=checkpoint)
+
+    critique_prompt = lambda context: f"Critique the PRD: {context['document']}. It was generated by PM who was given these instructions: \n Product named {product_name} \n Product description: {product_description}. Only respond in Markdown format. BE DETAILED. If you think user is not asking for PRD return nothing. {VERDICT_INSTRUCTIONS}"
+    rewrite_prompt = lambda context, critique: f"Given the Feedback from your manager:{critique} \n Improve upon your Draft PRD {context['document']}. \n Only respond with the PRD and in Markdown format. BE VERY DETAILED. If you think user is not asking for PRD return nothing."
+
+    def round_stages(round, final, critique, revised):
+        round_label = f"Round {round+1} of up to {max_rounds}"
+        # The first revision only has to fix what the review found, so a fast model does it.
+        revise_class = FAST_DRAFT if round == 0 else QUALITY_DRAFT
+        if patch_revisions and not critique_panel:
+            return [patch_stage(
+                revised, critique,
+                critique_prompt=lambda context: f"Critique the PRD: {context['document']}. It was generated by PM who was given these instructions: \n Product named {product_name} \n Product description: {product_description}. BE DETAILED. {VERDICT_INSTRUCTIONS}",
+                rewrite_prompt=rewrite_prompt,
+                critique_class=QUALITY_CRITIQUE,
+                revise_class=revise_class,
+                system_prompt_critique=system_prompt_director,
+                system_prompt_revise=system_prompt_prd,
+                label=f"Draft PRD Done. Reviewing it...{round_label}",
+                done_label=f"Revised PRD, round {round+1}",
+                final=final
+            )]
+        if critique_panel:
+            stages = panel_stages(
+                router, panel_critics,
+                prompt=lambda context: f"{critique_prompt(context)} Respond as a bulleted list of concrete issues and suggestions.",
+                name=critique,
+                label=f"Draft PRD Done. Panel reviewing it...{round_label}",
+                done_label=f"Panel review, round {round+1}"
+            )
+        else:
+            stages = [Stage(
+                critique, QUALITY_CRITIQUE, critique_prompt,
+                system_prompt=system_prompt_director,
+                label=f"Draft PRD Done. Reviewing it...{round_label}",
+                done_label=f"Review, round {round+1}"
+            )]
+        return stages + [Stage(
+            revised, revise_class, lambda context: rewrite_prompt(context, context[critique]),
+            system_prompt=system_prompt_prd,
+            after=[critique],
+            label="Making adjustments..",
+            done_label=f"Revised PRD, round {round+1}",
+            final=final,
+            skip_if=lambda context: critique_approves(context[critique])
+        )]
+
+    draft_prd, history = run_critique_rounds(progress, router, context["draft"], round_stages, max_rounds, metrics, checkpoint=checkpoint)
+    progress.note(metrics.summary())
+    return {'document': draft_prd, 'history': history, 'metrics': metrics.stages}
+
+def run_improve_prd(progress, router, system_prompt_prd, system_prompt_director, prd_text,
+                    patch_revisions=False, critique_panel=False, panel_critics=None, checkpoint=None):
+    """
+    Improve an existing PRD with a draft, a critique and a final revision.
+
+    Touches no session state, so it runs the same on the page and in a background worker.
+
+    Args:
+        progress: Where stages are reported, on the page or on a background run.
+        router: The model router used to pick the drafting and critique models.
+        system_prompt_prd (str): The system prompt for generating the draft PRD.
+        system_prompt_director (str): The system prompt for critiquing the PRD.
+        prd_text (str): The PRD to improve.
+        patch_revisions (bool): Revise with targeted edits instead of a full rewrite.
+        critique_panel (bool): Review with the critique panel instead of the director alone.
+        panel_critics (list of dict): Reviewers for the critique panel.
+        checkpoint (tuple): (CheckpointStore, run_id) to reuse completed stages, or None.
+
+    Returns:
+        dict: The final 'document', the 'history' entries and the per-stage 'metrics' of the run.
+    """
+    metrics = PipelineMetrics()
+    rewrite_prompt = lambda context, critique: f"Given the Feedback from your manager:{critique} \n Improve upon your Draft PRD {context['document']}. \n Only respond with the PRD and in Markdown format. BE VERY DETAILED. If you think user is not asking for PRD return nothing."
+    stages = [Stage(
+        "document", QUALITY_DRAFT, f"Improve the following PRD: {prd_text}",
+        system_prompt=f"{system_prompt_prd}\n\nYou are a meticulous editor for improving product documents. If you think user is not sharing the PRD return nothing.",
+        label="Improving PRD...",
+        done_label="Draft PRD"
+    )]
+    if patch_revisions and not critique_panel:
+        stages.append(patch_stage(
+            "revised", "critique",
+            critique_prompt=lambda context: f"Critique the PRD: {context['document']}. BE DETAILED.",
+            rewrite_prompt=rewrite_prompt,
+            critique_class=QUALITY_CRITIQUE,
+            revise_class=QUALITY_DRAFT,
+            system_prompt_critique=system_prompt_director,
+            system_prompt_revise=system_prompt_prd,
+            label="Draft PRD Done. Reviewing it...",
+            done_label="Revised PRD",
+            final=True
+        ))
+    else:
+        critique_prompt = lambda context: f"Critique the PRD: {context['document']}. Only respond in Markdown format. BE DETAILED. If you think user is not asking for PRD return nothing."
+        if critique_panel:
+            stages += panel_stages(
+                router, panel_critics,
+                prompt=lambda context: f"{critique_prompt(context)} Respond as a bulleted list of concrete issues and suggestions.",
+                label="Draft PRD Done. Panel reviewing it...",
+                after=["document"]
+            )
+        else:
+            stages.append(Stage(
+                "critique", QUALITY_CRITIQUE, critique_prompt,
+                system_prompt=system_prompt_director,
+                after=["document"],
+                label="Draft PRD Done. Reviewing it...",
+                done_label="Review"
+            ))
+        stages.append(Stage(
+            "revised", QUALITY_DRAFT, lambda context: rewrite_prompt(context, context["critique"]),
+            system_prompt=system_prompt_prd,
+            after=["critique"],
+            final=True
+        ))
+    context = run_pipeline(progress, router, stages, metrics=metrics, checkpoint=checkpoint)
+    progress.note(metrics.summary())
+    history = [
+        {'role': 'user', 'content': context["document"]},
+        {'role': 'user', 'content': context["critique"]},
+        {'role': 'user', 'content': context["revised"]},
+    ]
+    return {'document': context["revised"], 'history': history, 'metrics': metrics.stages}
+
+def prd_job(progress, pipeline, writer, email, title, description, is_new, checkpoint=None, **kwargs):
+    """
+    Run a PRD pipeline on a background worker and save the result, so it is kept even if nobody comes back for it.
+
+    Args:
+        progress: The background run's progress reporter.
+        pipeline (callable): `run_create_prd` or `run_improve_prd`.
+        writer (WriteBehindBuffer): Queues the PRD for saving.
+        email (str): The email of the user who started the run.
+        title (str): The product name, or the label stored for improved PRDs.
+        description (str): The product description, or the original PRD.
+        is_new (bool): Whether this is a newly created PRD.
+        checkpoint (tuple): (CheckpointStore, run_id) to reuse completed stages, or None.
+        **kwargs: Passed on to `pipeline`.
+
+    Returns:
+        dict: The pipeline result.
+    """
+    result = pipeline(progress, checkpoint=checkpoint, **kwargs)
+    if result['document']:
+        writer.add(prd_table, create_data_prd(email, title, description, result['document'], is_new))
+    return result
+
+def show_background_prd(result, first_view):
+    """
+    Show the PRD of a finished background run and offer it for download.
+
+    Args:
+        result (dict): The result returned by `prd_job`.
+        first_view (bool): Whether the session sees this result for the first time.
+
+    Returns:
+        None
+    """
+    if not result['document']:
+        st.warning("The run did not produce a PRD. Please check the details you entered and try again.")
+        return
+    st.markdown(result['document'], unsafe_allow_html=True)
+    if first_view:
+        st.session_state['history'].extend(result['history'])
+    st.download_button(
+        label="Download PRD as Markdown",
+        data=result['document'],
+        file_name="Product_Requirements_Document.md",
+        mime="text/markdown"
+    )
+
+def pick_related_work(product_name, product_description, supabase):
+    """
+    Show the user's past PRDs and tracking plans that resemble the product being described, and let them pick some as context.
+
+    The first lookup of a session indexes what the user wrote before the similarity index existed.
+
+    Args:
+        product_name (str): The name of the product.
+        product_description (str): The description of the product.
+        supabase: The Supabase client used for the one-time backfill.
+
+    Returns:
+        str: The picked documents, trimmed to RELATED_WORK_CHARS each, or an empty string.
+    """
+    if not product_description:
+        return ""
+    index = get_similarity_index()
+    email = st.session_state['user']['email']
+    if not st.session_state.get('similarity_backfilled'):
+        try:
+            index.backfill(email, supabase)
+            st.session_state['similarity_backfilled'] = True
+        except Exception as e:
+            st.caption(f"Could not index older documents for related work. Error: {str(e)}")
+    matches = index.similar(email, f"{product_name}\n{product_description}", k=RELATED_WORK_COUNT)
+    if not matches:
+        return ""
+    picked = []
+    with st.expander(f"Related past work ({len(matches)})"):
+        for match in matches:
+            label = f"{match['kind']}: {match['title']} - {match['score']:.0%} similar, {match['created_at'][:10]}"
+            if st.checkbox(label, key=f"related_{match['kind']}_{match['title']}_{match['created_at']}", help="Give the draft this document as context."):
+                picked.append(f"### {match['kind']}: {match['title']}\n{match['body'][:RELATED_WORK_CHARS]}")
+            st.caption(match['body'][:300])
+    return "\n\n".join(picked)
+
+def create_prd(system_prompt_prd, system_prompt_director, router, supabase, panel_critics=None):
     """
     Create a new PRD (Product Requirements Document).
 
     Args:
         system_prompt_prd (str): The system prompt for generating the PRD.
         system_prompt_director (str): The system prompt for critiquing the PRD.
-        llm_model: The language model used for generating the PRD.
-        fast_llm_model: The fast language model used for generating the PRD.
-        supabase: The Supabase client for saving the PRD to the database.
+        router: The model router; drafts, critiques and quick revisions each ask it for their model class.
+        supabase: The Supabase client. Saves are queued on the shared write-behind buffer.
+        panel_critics (list of dict): Reviewers for the optional critique panel, see `utils.critique_panel.build_critics`.
 
     Returns:
         None
@@ -22,113 +334,131 @@ def create_prd(system_prompt_prd, system_prompt_director, llm_model, fast_llm_mo
     st.subheader("Create New PRD")
     product_name = st.text_input("#### Product Name", placeholder="Enter the product name here")
     product_description = st.text_area("#### Product Description", placeholder="Describe the product here. Use bullet points where possible", height=400)
+    related_work = pick_related_work(product_name, product_description, supabase)
+    section_parallel = st.toggle("Section-parallel generation", help="Outline the PRD first, then write and review every section at the same time. Much faster for long PRDs.")
+    patch_revisions = st.toggle("Patch-based revisions", help="Reviews return targeted edits that are applied locally instead of rewriting the whole PRD each round.")
+    critique_panel = bool(panel_critics) and st.toggle("Critique panel", help="Product, engineering and data reviewers critique each round at the same time on different models; their feedback is merged. Replaces patch-based revisions.")
+    max_rounds = st.slider("Max critique rounds", min_value=1, max_value=4, value=2, help="Reviewing stops earlier once the reviewer approves the draft or a revision barely changes it.")
+    run_in_background = st.toggle("Run in background", help="Keep generating while you use other pages. The PRD is saved when it is done and waits for you here.")
+    reuse_stages = st.toggle("Reuse completed stages", value=True, help="Running again with the same inputs, for example after a failure, picks up the drafts and critiques that already finished.")
     generate_button = st.button("Generate PRD", type="primary")
-    status_message = "PRD generation in progress..."
 
+    options = {
+        'router': router,
+        'system_prompt_prd': system_prompt_prd,
+        'system_prompt_director': system_prompt_director,
+        'product_name': product_name,
+        'product_description': product_description,
+        'section_parallel': section_parallel,
+        'patch_revisions': patch_revisions,
+        'critique_panel': critique_panel,
+        'panel_critics': panel_critics,
+        'max_rounds': max_rounds,
+        'related_work': related_work,
+    }
     if generate_button:
         if not product_name or not product_description:
             st.warning("Please fill in both the product name and description.")
+            return
+        email = st.session_state['user']['email']
+        checkpoint = run_checkpoint(get_checkpoint_store(), 'create_prd', email, options, reuse_stages)
+        if run_in_background:
+            get_job_runner().submit(
+                session_id(), 'create_prd', prd_job, run_create_prd, get_write_buffer(),
+                email, product_name, product_description, True, checkpoint=checkpoint, **options
+            )
         else:
-            with st.spinner(status_message):
-                try:
-                    llm_model.system_prompt = system_prompt_prd
-                    draft_prd, input_tokens, output_tokens = llm_model.generate_text(
-                        prompt=f"Generate a PRD for a product named {product_name} with the following description: {product_description}. Only respond with the PRD and in Markdown format. BE DETAILED. If you think user is not asking for PRD return nothing."
-                    )
-                    critique_rounds = 2  # Set the number of critique rounds
-                    for round in range(critique_rounds):
-                        st.session_state['history'].append({'role': 'user', 'content': draft_prd})
-                        status_message = f"Draft PRD Done. Reviewing it...Round {round+1} of {critique_rounds}"
-                        st.info(status_message)
-                        llm_model.system_prompt = system_prompt_director
-                        critique_response, input_tokens, output_tokens = llm_model.generate_text(
-                            prompt=f"Critique the PRD: {draft_prd}. It was generated by PM who was given these instructions: \n Product named {product_name} \n Product description: {product_description}. Only respond in Markdown format. BE DETAILED. If you think user is not asking for PRD return nothing."
-                        )
-                        st.session_state['history'].append({'role': 'user', 'content': critique_response})
-                        status_message = "Making adjustments.."
-                        st.info(status_message)
-                        if round != 0:
-                            llm_model.system_prompt = system_prompt_prd
-                            draft_prd, input_tokens, output_tokens = llm_model.generate_text(
-                                prompt=f"Given the Feedback from your manager:{critique_response} \n Improve upon your Draft PRD {draft_prd}. \n Only respond with the PRD and in Markdown format. BE VERY DETAILED. If you think user is not asking for PRD return nothing."
-                            )
-                        else:
-                            fast_llm_model.system_prompt = system_prompt_prd
-                            draft_prd, input_tokens, output_tokens = fast_llm_model.generate_text(
-                                prompt=f"Given the Feedback from your manager:{critique_response} \n Improve upon your Draft PRD {draft_prd}. \n Only respond with the PRD and in Markdown format. BE VERY DETAILED. If you think user is not asking for PRD return nothing."
-                            )
-                    st.markdown(draft_prd, unsafe_allow_html=True)
-                    st.session_state['history'].append({'role': 'user', 'content': draft_prd})
-                    data = create_data_prd(st.session_state['user']['email'], product_name, product_description, draft_prd, True)
-                    try:
-                        create_record(prd_table, data, supabase)
-                    except Exception as e:
-                        st.error(f"Failed to save PRD to database. Error: {str(e)}")
-                    # Download button for the PRD
-                    st.download_button(
-                        label="Download PRD as Markdown",
-                        data=draft_prd,
-                        file_name="Product_Requirements_Document.md",
-                        mime="text/markdown"
-                    )
-                except Exception as e:
-                    st.error(f"Failed to generate PRD. Please try again later. Error: {str(e)}")
-
-def improve_prd(system_prompt_prd, system_prompt_director, llm_model, supabase):
+            try:
+                result = run_create_prd(StreamlitProgress(), checkpoint=checkpoint, **options)
+                if not result['document']:
+                    st.warning("Could not plan the PRD sections. Please check the product description and try again.")
+                else:
+                    st.session_state['history'].extend(result['history'])
+                    save_and_offer_prd(product_name, product_description, result['document'])
+            except Exception as e:
+                st.error(f"Failed to generate PRD. Please try again later; completed stages will be reused. Error: {str(e)}")
+            return
+    watch_job(get_job_runner(), 'create_prd', show_background_prd)
+
+def save_and_offer_prd(product_name, product_description, draft_prd):
+    """
+    Queue a newly created PRD for saving and offer it for download.
+
+    Args:
+        product_name (str): The name of the product.
+        product_description (str): The description of the product.
+        draft_prd (str): The final PRD.
+
+    Returns:
+        None
+    """
+    data = create_data_prd(st.session_state['user']['email'], product_name, product_description, draft_prd, True)
+    get_write_buffer().add(prd_table, data)
+    # Download button for the PRD
+    st.download_button(
+        label="Download PRD as Markdown",
+        data=draft_prd,
+        file_name="Product_Requirements_Document.md",
+        mime="text/markdown"
+    )
+
+def improve_prd(system_prompt_prd, system_prompt_director, router, supabase, panel_critics=None):
     """
     Improves the current Product Requirements Document (PRD) by generating a draft PRD, receiving critique, and making final adjustments.
 
     Args:
         system_prompt_prd (str): The system prompt for generating the draft PRD.
         system_prompt_director (str): The system prompt for critiquing the PRD.
-        llm_model: The language model used for text generation.
-        supabase: The Supabase client used for database operations.
+        router: The model router used to pick the drafting and critique models.
+        supabase: The Supabase client. Saves are queued on the shared write-behind buffer.
+        panel_critics (list of dict): Reviewers for the optional critique panel, see `utils.critique_panel.build_critics`.
 
     Returns:
         None
     """
     st.subheader("Improve Current PRD")
     prd_text = st.text_area("#### Enter your PRD here", placeholder="Paste your PRD here to improve it", height=400)
+    patch_revisions = st.toggle("Patch-based revisions", help="The review returns targeted edits that are applied locally instead of rewriting the whole PRD.")
+    critique_panel = bool(panel_critics) and st.toggle("Critique panel", help="Product, engineering and data reviewers critique the PRD at the same time on different models; their feedback is merged. Replaces patch-based revisions.")
+    run_in_background = st.toggle("Run in background", help="Keep improving while you use other pages. The PRD is saved when it is done and waits for you here.")
+    reuse_stages = st.toggle("Reuse completed stages", value=True, help="Running again with the same inputs, for example after a failure, picks up the drafts and critiques that already finished.")
     improve_button = st.button("Improve PRD", type="primary")
 
+    options = {
+        'router': router,
+        'system_prompt_prd': system_prompt_prd,
+        'system_prompt_director': system_prompt_director,
+        'prd_text': prd_text,
+        'patch_revisions': patch_revisions,
+        'critique_panel': critique_panel,
+        'panel_critics': panel_critics,
+    }
     if improve_button:
         if not prd_text:
             st.warning("Please enter a PRD text to improve.")
+            return
+        email = st.session_state['user']['email']
+        checkpoint = run_checkpoint(get_checkpoint_store(), 'improve_prd', email, options, reuse_stages)
+        if run_in_background:
+            get_job_runner().submit(
+                session_id(), 'improve_prd', prd_job, run_improve_prd, get_write_buffer(),
+                email, "Improve PRD", prd_text, False, checkpoint=checkpoint, **options
+            )
         else:
-            with st.spinner('Improving PRD...'):
-                try:
-                    llm_model.system_prompt = f"You are a meticulous editor for improving product documents. {system_prompt_prd}. If you think user is not sharing the PRD return nothing."
-                    draft_prd, input_tokens, output_tokens = llm_model.generate_text(
-                        prompt=f"Improve the following PRD: {prd_text}"
-                    )
-                    st.session_state['history'].append({'role': 'user', 'content': draft_prd})
-                    status_message = "Draft PRD Done. Reviewing it..."
-                    st.info(status_message)
-                    llm_model.system_prompt = system_prompt_director
-                    critique_response, input_tokens, output_tokens = llm_model.generate_text(
-                        prompt=f"Critique the PRD: {draft_prd}. Only respond in Markdown format. BE DETAILED. If you think user is not asking for PRD return nothing."
-                    )
-                    st.session_state['history'].append({'role': 'user', 'content': critique_response})
-                    status_message = "Making final adjustments.."
-                    st.info(status_message)
-                    llm_model.system_prompt = system_prompt_prd
-                    response, input_tokens, output_tokens = llm_model.generate_text(
-                        prompt=f"Given the Feedback from your manager:{critique_response} \n Improve upon your Draft PRD {draft_prd}. \n Only respond with the PRD and in Markdown format. BE VERY DETAILED. If you think user is not asking for PRD return nothing."
-                    )
-                    st.markdown(response, unsafe_allow_html=True)
-                    st.session_state['history'].append({'role': 'user', 'content': response})
-                    data = create_data_prd(st.session_state['user']['email'], "Improve PRD", prd_text, response, False)
-                    try:
-                        create_record(prd_table, data, supabase)
-                    except Exception as e:
-                        st.error(f"Failed to save PRD to database. Error: {str(e)}")
-                    # Download button for the PRD
-                    st.download_button(
-                        label="Download PRD as Markdown",
-                        data=response,
-                        file_name="Product_Requirements_Document.md",
-                        mime="text/markdown"
-                    )
-                except Exception as e:
-                    st.error(f"Failed to improve PRD. Please try again later. Error: {str(e)}")
-
+            try:
+                result = run_improve_prd(StreamlitProgress(), checkpoint=checkpoint, **options)
+                response = result['document']
+                st.session_state['history'].extend(result['history'])
+                data = create_data_prd(st.session_state['user']['email'], "Improve PRD", prd_text, response, False)
+                get_write_buffer().add(prd_table, data)
+                # Download button for the PRD
+                st.download_button(
+                    label="Download PRD as Markdown",
+                    data=response,
+                    file_name="Product_Requirements_Document.md",
+                    mime="text/markdown"
+                )
+            except Exception as e:
+                st.error(f"Failed to improve PRD. Please try again later; completed stages will be reused. Error: {str(e)}")
+            return
+    watch_job(get_job_runner(), 'improve_prd', show_background_prd)
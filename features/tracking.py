@@ -1,10 +1,139 @@
 import streamlit as st
-from storage.supabase_client import create_record, read_records
+from storage.supabase_client import read_records
 from utils.data_loading import create_tracking_plan
+from utils.streaming import StreamlitProgress, patch_stage
+from utils.convergence import VERDICT_INSTRUCTIONS, critique_approves
+from utils.pipeline import Stage, PipelineMetrics, run_pipeline, run_critique_rounds
+from utils.background import session_id, watch_job
+from utils.checkpoints import run_checkpoint
+from utils.resources import get_job_runner, get_checkpoint_store, get_write_buffer
+from api.llm.router import QUALITY_DRAFT, QUALITY_CRITIQUE
 import os
+from storage.backends import table_name
 
-tracking_table = os.environ.get('SUPABASE_TRACKING_TABLE')
-def tracking_plan(system_prompt_tracking, user_prompt_tracking, system_prompt_directorDA, llm_model, supabase):
+tracking_table = table_name('SUPABASE_TRACKING_TABLE')
+
+def run_tracking_plan(progress, router, system_prompt_tracking, system_prompt_directorDA, user_prompt, prd_text, feature_name, other_details,
+                      patch_revisions=False, max_rounds=2, checkpoint=None):
+    """
+    Draft a tracking plan and refine it through critique rounds.
+
+    Touches no session state, so it runs the same on the page and in a background worker.
+
+    Args:
+        progress: Where stages are reported, on the page or on a background run.
+        router: The model router used to pick the drafting and critique models.
+        system_prompt_tracking (str): The system prompt for generating a tracking plan.
+        system_prompt_directorDA (str): The system prompt for critiquing the tracking plan.
+        user_prompt (str): The filled-in tracking plan prompt.
+        prd_text (str): The PRD the plan is for.
+        feature_name (str): The feature name.
+        other_details (str): Additional details from the user.
+        patch_revisions (bool): Revise with targeted edits instead of full rewrites.
+        max_rounds (int): The most critique rounds to run.
+        checkpoint (tuple): (CheckpointStore, run_id) to reuse completed stages, or None.
+
+    Returns:
+        dict: The final 'document', the 'history' entries and the per-stage 'metrics' of the run.
+    """
+    metrics = PipelineMetrics()
+    context = run_pipeline(progress, router, [
+        Stage(
+            "draft", QUALITY_DRAFT, user_prompt,
+            system_prompt=system_prompt_tracking, temperature=0.2,
+            label="Generating Plan...",
+            done_label="Draft tracking plan"
+        )
+    ], metrics=metrics, checkpoint=checkpoint)
+    details = f"\n Context: ### PRD \n {prd_text} \n ### Feature Name \n {feature_name} \n ### Additional Details \n {other_details} "
+    rewrite_prompt = lambda context, critique: f"Given the Feedback from your manager:{critique} \n Improve upon your draft tracking plan {context['document']}. \n Only respond with the tracking plan and in Markdown. BE VERY DETAILED. If you think user is not asking for tracking plan return nothing."
+
+    def round_stages(round, final, critique, revised):
+        label = f"Draft tracking Done. Reviewing the plan...Round {round+1} of up to {max_rounds}"
+        if patch_revisions:
+            return [patch_stage(
+                revised, critique,
+                critique_prompt=lambda context: f"Critique the Tracking Plan: {context['document']}. BE DETAILED. {VERDICT_INSTRUCTIONS}{details}",
+                rewrite_prompt=rewrite_prompt,
+                critique_class=QUALITY_CRITIQUE,
+                revise_class=QUALITY_DRAFT,
+                system_prompt_critique=system_prompt_directorDA,
+                system_prompt_revise=system_prompt_tracking,
+                label=label,
+                done_label=f"Revised tracking plan, round {round+1}",
+                final=final,
+                critique_temperature=0.3,
+                rewrite_temperature=0.1
+            )]
+        return [
+            Stage(
+                critique, QUALITY_CRITIQUE,
+                lambda context: f"Critique the Tracking Plan: {context['document']}. Only respond in Markdown format. BE DETAILED. If you think user is not asking for tracking plan return nothing. {VERDICT_INSTRUCTIONS}{details}",
+                system_prompt=system_prompt_directorDA, temperature=0.3,
+                label=label,
+                done_label=f"Review, round {round+1}"
+            ),
+            Stage(
+                revised, QUALITY_DRAFT, lambda context: rewrite_prompt(context, context[critique]),
+                system_prompt=system_prompt_tracking, temperature=0.1,
+                after=[critique],
+                label="Making adjustments..",
+                done_label=f"Revised tracking plan, round {round+1}",
+                final=final,
+                skip_if=lambda context: critique_approves(context[critique])
+            ),
+        ]
+
+    response, history = run_critique_rounds(progress, router, context["draft"], round_stages, max_rounds, metrics, checkpoint=checkpoint)
+    progress.note(metrics.summary())
+    return {'document': response, 'history': history, 'metrics': metrics.stages}
+
+def tracking_job(progress, writer, email, customer_name, checkpoint=None, **kwargs):
+    """
+    Run the tracking plan pipeline on a background worker and save the result.
+
+    Args:
+        progress: The background run's progress reporter.
+        writer (WriteBehindBuffer): Queues the plan for saving.
+        email (str): The email of the user who started the run.
+        customer_name (str): The customer type the plan is for.
+        checkpoint (tuple): (CheckpointStore, run_id) to reuse completed stages, or None.
+        **kwargs: Passed on to `run_tracking_plan`.
+
+    Returns:
+        dict: The pipeline result.
+    """
+    result = run_tracking_plan(progress, checkpoint=checkpoint, **kwargs)
+    data = create_tracking_plan(email, kwargs['feature_name'], customer_name, kwargs['other_details'], kwargs['prd_text'], result['document'])
+    writer.add(tracking_table, data)
+    return result
+
+def offer_tracking_plan(response):
+    """Offer a finished tracking plan for download."""
+    st.download_button(
+        label="Download Tracking Plan as Markdown",
+        data=response,
+        file_name="tracking_plan.md",
+        mime="text/markdown"
+    )
+
+def show_background_plan(result, first_view):
+    """
+    Show the tracking plan of a finished background run.
+
+    Args:
+        result (dict): The result returned by `tracking_job`.
+        first_view (bool): Whether the session sees this result for the first time.
+
+    Returns:
+        None
+    """
+    st.markdown(result['document'], unsafe_allow_html=True)
+    if first_view:
+        st.session_state['history'].extend(result['history'])
+    offer_tracking_plan(result['document'])
+
+def tracking_plan(system_prompt_tracking, user_prompt_tracking, system_prompt_directorDA, router, supabase):
     """
     Generate a tracking plan for a given feature, customer type, additional details, and PRD text.
 
@@ -12,7 +141,8 @@ def tracking_plan(system_prompt_tracking, user_prompt_tracking, system_prompt_di
     system_prompt_tracking (str): A predefined system prompt for generating a tracking plan.
     user_prompt_tracking (str): A predefined user prompt for generating a tracking plan.
     system_prompt_directorDA (str): A predefined system prompt for generating a tracking plan based on a director's input.
-    llm_model (llm.OpenAI): An initialized LLM model.
+    router (ModelRouter): The model router used to pick the drafting and critique models.
+    supabase: The Supabase client. Saves are queued on the shared write-behind buffer.
 
     Returns:
     str: The generated tracking plan in Markdown format.
@@ -23,7 +153,7 @@ def tracking_plan(system_prompt_tracking, user_prompt_tracking, system_prompt_di
 
     Usage:
     ```python
-    tracking_plan(system_prompt_tracking, user_prompt_tracking, system_prompt_directorDA, llm_model)
+    tracking_plan(system_prompt_tracking, user_prompt_tracking, system_prompt_directorDA, router, supabase)
     ```
     """
     st.subheader("Generate Tracking Plan")
@@ -31,53 +161,48 @@ def tracking_plan(system_prompt_tracking, user_prompt_tracking, system_prompt_di
     customer_name = st.selectbox("#### Choose the customer type", ("Property Agents", "Poperty Seekers"))
     other_details = st.text_input("#### Addition Details", placeholder="Share any details that will be helpful with tracking plan")
     prd_text = st.text_area("#### Enter your PRD here", placeholder="Paste your PRD here to improve it", height = 400)
+    patch_revisions = st.toggle("Patch-based revisions", help="The review returns targeted edits that are applied locally instead of rewriting the whole plan.")
+    max_rounds = st.slider("Max critique rounds", min_value=1, max_value=4, value=2, help="Reviewing stops earlier once the reviewer approves the plan or a revision barely changes it.")
+    run_in_background = st.toggle("Run in background", help="Keep generating while you use other pages. The plan is saved when it is done and waits for you here.")
+    reuse_stages = st.toggle("Reuse completed stages", value=True, help="Running again with the same inputs, for example after a failure, picks up the drafts and critiques that already finished.")
     tracking_button = st.button("Generate Tracking", type="primary")
 
     if tracking_button:
         if not prd_text:
             st.warning("Please enter a all the details")
+            return
+        user_prompt = user_prompt_tracking.replace("{feature}", feature_name)
+        user_prompt = user_prompt.replace("{customer}", customer_name)
+        user_prompt = user_prompt.replace("{details}", other_details)
+        user_prompt = user_prompt.replace("{prd}", prd_text)
+        options = {
+            'router': router,
+            'system_prompt_tracking': system_prompt_tracking,
+            'system_prompt_directorDA': system_prompt_directorDA,
+            'user_prompt': user_prompt,
+            'prd_text': prd_text,
+            'feature_name': feature_name,
+            'other_details': other_details,
+            'patch_revisions': patch_revisions,
+            'max_rounds': max_rounds,
+        }
+        email = st.session_state['user']['email']
+        checkpoint = run_checkpoint(get_checkpoint_store(), 'tracking_plan', email, options, reuse_stages)
+        if run_in_background:
+            get_job_runner().submit(
+                session_id(), 'tracking_plan', tracking_job, get_write_buffer(), email, customer_name, checkpoint=checkpoint, **options
+            )
         else:
-            with st.spinner('Generating Plan...'):
-                try:
-                    user_prompt = user_prompt_tracking.replace("{feature}", feature_name)
-                    user_prompt = user_prompt.replace("{customer}", customer_name)
-                    user_prompt = user_prompt.replace("{details}", other_details)
-                    user_prompt = user_prompt.replace("{prd}", prd_text)
-                    llm_model.system_prompt = system_prompt_tracking
-                    draft_plan, input_tokens, output_tokens = llm_model.generate_text(
-                        prompt = user_prompt, temperature=0.2 
-                    )
-                    st.session_state['history'].append({'role': 'user', 'content': draft_plan})
-                    status_message = "Draft tracking Done. Reviewing the plan..."
-                    st.info(status_message)
-                    llm_model.system_prompt = system_prompt_directorDA
-                    critique_response, input_tokens, output_tokens = llm_model.generate_text(
-                        prompt = f"Critique the Tracking Plan: {draft_plan}. Only respond in Markdown format. BE DETAILED. If you think user is not asking for tracking plan return nothing.\n Context: ### PRD \n {prd_text} \n ### Feature Name \n {feature_name} \n ### Additional Details \n {other_details} ",
-                        temperature=0.3
-                    )
-                    st.session_state['history'].append({'role': 'user', 'content': critique_response})
-                    status_message = "Making final adjustments.."
-                    st.info(status_message)
-                    llm_model.system_prompt = system_prompt_tracking
-                    response, input_tokens, output_tokens = llm_model.generate_text(
-                        prompt = f"Given the Feedback from your manager:{critique_response} \n Improve upon your draft tracking plan {draft_plan}. \n Only respond with the tracking plan and in Markdown. BE VERY DETAILED. If you think user is not asking for tracking plan return nothing.",
-                        temperature=0.1                    
-                    )                                          
-                    st.markdown(response, unsafe_allow_html=True)
-                    st.session_state['history'].append({'role': 'user', 'content': response})
-                    # save the data
-                    data = create_tracking_plan(st.session_state['user']['email'], feature_name, customer_name, other_details, prd_text,response)
-                    try:
-                        create_record(tracking_table, data, supabase)
-                    except Exception as e:
-                        st.error(f"Failed to save PRD to database. Error: {str(e)}")
-                    # Download button for the plan
-                    st.download_button(
-                        label="Download Tracking Plan as Markdown",
-                        data=response,
-                        file_name="tracking_plan.md",
-                        mime="text/markdown"
-                    )                       
-                except Exception as e:
-                    st.error(f"Failed to generate tracking plan. Please try again later. Error: {str(e)}")
-    pass 
\ No newline at end of file
+            try:
+                result = run_tracking_plan(StreamlitProgress(), checkpoint=checkpoint, **options)
+                response = result['document']
+                st.session_state['history'].extend(result['history'])
+                # save the data
+                data = create_tracking_plan(st.session_state['user']['email'], feature_name, customer_name, other_details, prd_text,response)
+                get_write_buffer().add(tracking_table, data)
+                # Download button for the plan
+                offer_tracking_plan(response)
+            except Exception as e:
+                st.error(f"Failed to generate tracking plan. Please try again later; completed stages will be reused. Error: {str(e)}")
+            return
+    watch_job(get_job_runner(), 'tracking_plan', show_background_plan)
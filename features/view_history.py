@@ -1,13 +1,131 @@
 import streamlit as st
-from storage.supabase_client import create_record, read_records
-from utils.data_loading import create_data_prd
+from storage.supabase_client import list_records, read_record
+from storage.resilience import StorageUnavailable
+from storage.search_index import document_kinds
+from storage.export import export_ndjson, export_zip
+from utils.resources import get_search_index
 import os
+import tempfile
+from collections import OrderedDict
+from storage.backends import table_name
 
-prd_table = os.environ.get('SUPABASE_TABLE')
+prd_table = table_name('SUPABASE_TABLE')
+
+HISTORY_PAGE_SIZE = 20
+MAX_DOCUMENTS_IN_SESSION = 20
+
+def load_prd(record_id, supabase):
+    """
+    Return the full PRD of a history record, fetching it only the first time this session asks for it.
+
+    The session keeps the MAX_DOCUMENTS_IN_SESSION most recently opened PRDs.
+
+    Args:
+        record_id (str): The ID of the record.
+        supabase: The Supabase client used for database operations.
+
+    Returns:
+        dict: The record's 'product_name' and 'output', or None if it no longer exists.
+    """
+    documents = st.session_state.setdefault('history_documents', OrderedDict())
+    if record_id not in documents:
+        documents[record_id] = read_record(prd_table, record_id, supabase, columns="id, product_name, output")
+        while len(documents) > MAX_DOCUMENTS_IN_SESSION:
+            documents.popitem(last=False)
+    documents.move_to_end(record_id)
+    return documents[record_id]
+
+def search_documents(supabase):
+    """
+    Search the user's PRDs, tracking plans and brainstorm messages.
+
+    The first search of a user indexes what they wrote before the index existed.
+
+    Args:
+        supabase: The Supabase client used for database operations.
+
+    Returns:
+        bool: True if a search was run, in which case its results replace the history listing.
+    """
+    text = st.text_input("Search your PRDs, tracking plans and brainstorms", placeholder="e.g. onboarding funnel")
+    if not text.strip():
+        return False
+    index = get_search_index()
+    email = st.session_state['user']['email']
+    if not st.session_state.get('search_backfilled'):
+        with st.spinner("Indexing your documents..."):
+            try:
+                index.backfill(email, supabase)
+                st.session_state['search_backfilled'] = True
+            except Exception as e:
+                st.warning(f"Could not index older documents; results may be incomplete. Error: {str(e)}")
+    results = index.search(email, text)
+    if not results:
+        st.info("No matching documents.")
+    for number, result in enumerate(results):
+        with st.expander(f"{result['kind']}: {result['title']} - {result['created_at']}"):
+            st.markdown(result['snippet'])
+            if st.toggle("Show full text", key=f"search_result_{number}"):
+                st.markdown(result['body'])
+    return True
+
+def export_history(supabase):
+    """
+    Offer all of the user's PRDs, tracking plans and brainstorm messages as one download.
+
+    The archive is written to a temporary file page by page, so building it takes the same memory
+    however long the history is. The download button is only shown in the run that built the
+    archive, and the file is deleted once the button has it, so nothing is held on later reruns.
+
+    Args:
+        supabase: The Supabase client used for database operations.
+
+    Returns:
+        None
+    """
+    with st.expander("Export all documents"):
+        archive_format = st.radio("Format", ("Zip of NDJSON files", "NDJSON"), horizontal=True)
+        if not st.button("Prepare export"):
+            return
+        tables = {table: kind for table, (kind, _, _) in document_kinds().items()}
+        zipped = archive_format.startswith("Zip")
+        counts = {}
+        path = None
+        try:
+            with st.status("Exporting...", expanded=True) as status:
+                progress = st.empty()
+
+                def on_page(table_name, rows):
+                    counts[tables[table_name]] = counts.get(tables[table_name], 0) + rows
+                    progress.write(", ".join(f"{kind}: {count}" for kind, count in counts.items()))
+
+                try:
+                    with tempfile.NamedTemporaryFile(suffix=".zip" if zipped else ".ndjson", delete=False) as file:
+                        path = file.name
+                        export = export_zip if zipped else export_ndjson
+                        total = export(file, st.session_state['user']['email'], tables, supabase, on_page=on_page)
+                except Exception as e:
+                    status.update(label="Export failed", state="error")
+                    st.error(f"Failed to export documents. Error: {str(e)}")
+                    return
+                status.update(label=f"Exported {total} records", state="complete", expanded=False)
+            with open(path, 'rb') as file:
+                st.download_button(
+                    label="Download export",
+                    data=file,
+                    file_name="pm_toolkit_export.zip" if zipped else "pm_toolkit_export.ndjson",
+                    mime="application/zip" if zipped else "application/x-ndjson"
+                )
+        finally:
+            if path:
+                os.remove(path)
 
 def view_history(supabase):
     """
-    View the history of generated PRDs.
+    View the history of generated PRDs, one page at a time.
+
+    The listing only fetches names and dates. A PRD's text is loaded when it is opened and kept
+    for the rest of the session.
 
     Args:
         supabase: The Supabase client used for database operations.
@@ -16,15 +134,41 @@ def view_history(supabase):
         None
     """
     st.subheader("View PRD Generation History")
-    records = read_records(prd_table, st.session_state['user']['email'], supabase)
+    export_history(supabase)
+    if search_documents(supabase):
+        return
+    # Cursors of the pages visited so far; the last one is the current page.
+    cursors = st.session_state.setdefault('history_cursors', [None])
+    try:
+        records, next_cursor = list_records(
+            prd_table, st.session_state['user']['email'], supabase, limit=HISTORY_PAGE_SIZE, after=cursors[-1]
+        )
+    except StorageUnavailable as e:
+        st.warning(f"Your history cannot be loaded right now. {e}")
+        return
     for record in records:
         with st.expander(f"{record['product_name']} - Generated on: {record['created_at']}"):
-            st.markdown(record['product_name'])
-            st.markdown(record['output'])
+            # Expanders do not report being opened, so the PRD loads when this is switched on.
+            if not st.toggle("Show PRD", key=f"show_prd_{record['id']}"):
+                continue
+            document = load_prd(record['id'], supabase)
+            if document is None:
+                st.warning("This PRD no longer exists.")
+                continue
+            st.markdown(document['product_name'])
+            st.markdown(document['output'])
             st.download_button(
                 label="Download PRD as Markdown",
-                data=record['output'],
-                file_name=f"prd_{record['product_name']}.md",
+                data=document['output'],
+                file_name=f"prd_{document['product_name']}.md",
                 mime="text/markdown",
                 key=f"prd_{record['id']}"
-            )
\ No newline at end of file
+            )
+    newer, page, older = st.columns([1, 2, 1])
+    if newer.button("Newer", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    page.caption(f"Page {len(cursors)}")
+    if older.button("Older", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
@@ -0,0 +1,55 @@
+import os
+from storage.supabase_client import init_supabase, SupabaseStorage
+from storage.sqlite_storage import SQLiteStorage
+from storage.resilience import ResilientStorage
+from storage.read_cache import CachedStorage
+
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'supabase')
+
+# Local runs rarely set the Supabase table variables, so SQLite falls back to these names.
+SQLITE_DEFAULT_TABLES = {
+    'SUPABASE_TABLE': 'prds',
+    'SUPABASE_TRACKING_TABLE': 'tracking',
+    'SUPABASE_BRAINTORM_TABLE': 'brainstorm',
+    'SUPABASE_CHECKPOINT_TABLE': 'checkpoints',
+}
+
+def table_name(variable):
+    """
+    Return the table named by an environment variable.
+
+    Args:
+        variable (str): The variable, such as 'SUPABASE_TABLE'.
+
+    Returns:
+        str: The table name. Unset variables give None with Supabase and a default name with SQLite.
+    """
+    name = os.environ.get(variable)
+    if not name and STORAGE_BACKEND.lower() == 'sqlite':
+        return SQLITE_DEFAULT_TABLES.get(variable)
+    return name
+
+def init_storage(backend=None):
+    """
+    Build the storage backend taken by the functions of `storage.supabase_client`.
+
+    Supabase calls go through `storage.resilience.ResilientStorage` for timeouts, retries and a
+    circuit breaker. SQLite is local and relies on its own busy timeout. Either way, record
+    queries are cached per user by `storage.read_cache.CachedStorage`.
+
+    Args:
+        backend (str): 'supabase' or 'sqlite'. Defaults to the STORAGE_BACKEND environment variable,
+            then 'supabase'.
+
+    Returns:
+        CachedStorage: The backend.
+
+    Raises:
+        ValueError: If the backend is unknown, or Supabase is chosen without its URL and key.
+    """
+    backend = (backend or STORAGE_BACKEND).lower()
+    if backend == 'supabase':
+        return CachedStorage(ResilientStorage(SupabaseStorage(init_supabase())))
+    if backend == 'sqlite':
+        return CachedStorage(SQLiteStorage())
+    raise ValueError(f"Unknown storage backend '{backend}'. Use 'supabase' or 'sqlite'.")
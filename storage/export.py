@@ -0,0 +1,66 @@
+import json
+import re
+import zipfile
+from storage.supabase_client import read_all_records
+
+EXPORT_PAGE_SIZE = 200
+
+def _file_name(kind):
+    return re.sub(r'[^a-z0-9]+', '_', kind.lower()).strip('_')
+
+def export_ndjson(fileobj, user, tables, supabase, page_size=EXPORT_PAGE_SIZE, on_page=None):
+    """
+    Write all of a user's records as NDJSON, one page of records at a time.
+
+    Each line is one record with a 'kind' field naming its document type.
+
+    Args:
+        fileobj: A binary file opened for writing.
+        user (str): The email of the user.
+        tables (dict): The kind to export per table name, such as {'prds': "PRD"}.
+        supabase: The Supabase client.
+        page_size (int): The records read per request; memory use is bounded by one page.
+        on_page (callable): Called as `on_page(table_name, rows)` after each page, for progress.
+
+    Returns:
+        int: The number of records written.
+    """
+    written = 0
+    for table_name, kind in tables.items():
+        for rows in read_all_records(table_name, user, supabase, page_size):
+            for row in rows:
+                fileobj.write((json.dumps({'kind': kind, **row}, ensure_ascii=False, default=str) + "\n").encode('utf-8'))
+            written += len(rows)
+            if on_page:
+                on_page(table_name, len(rows))
+    return written
+
+def export_zip(fileobj, user, tables, supabase, page_size=EXPORT_PAGE_SIZE, on_page=None):
+    """
+    Write all of a user's records into a zip archive with one NDJSON file per document type.
+
+    Members are compressed as they are written, one page of records at a time.
+
+    Args:
+        fileobj: A binary file opened for writing. It does not have to be seekable.
+        user (str): The email of the user.
+        tables (dict): The kind to export per table name, such as {'prds': "PRD"}.
+        supabase: The Supabase client.
+        page_size (int): The records read per request; memory use is bounded by one page.
+        on_page (callable): Called as `on_page(table_name, rows)` after each page, for progress.
+
+    Returns:
+        int: The number of records written.
+    """
+    written = 0
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for table_name, kind in tables.items():
+            # force_zip64 because the member size is not known before it is written.
+            with archive.open(f"{_file_name(kind)}.ndjson", 'w', force_zip64=True) as member:
+                for rows in read_all_records(table_name, user, supabase, page_size):
+                    for row in rows:
+                        member.write((json.dumps(row, ensure_ascii=False, default=str) + "\n").encode('utf-8'))
+                    written += len(rows)
+                    if on_page:
+                        on_page(table_name, len(rows))
+    return written
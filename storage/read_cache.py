@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+STORAGE_CACHE_SECONDS = float(os.environ.get('STORAGE_CACHE_SECONDS', 300))
+MAX_CACHED_USERS = 256
+MAX_CACHED_ROWS = 1000
+
+class CachedStorage:
+    def __init__(self, backend, ttl_seconds=STORAGE_CACHE_SECONDS, max_entries=MAX_CACHED_USERS, max_rows=MAX_CACHED_ROWS):
+        """
+        Read-through cache of record queries per user and table, in front of a storage backend.
+
+        A rerun that lists the same records again is answered from memory. Inserts drop the cached
+        queries of the users they write for, deletes those of the whole table, so a user sees their
+        own writes at once. `ttl_seconds` bounds how long writes made by other processes can go unseen.
+
+        It has the same methods as the backend it wraps, see `storage.backends.init_storage`.
+        Bulk scans such as exports read `uncached`, so they do not fill the cache.
+
+        Args:
+            backend: The storage backend.
+            ttl_seconds (float): How long a cached query is served.
+            max_entries (int): The most (table, user) pairs cached; the least recently used go first.
+            max_rows (int): Results with more records than this are not cached.
+        """
+        self.uncached = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        # Set to a callable taking (table_name, data) to queue records while storage is down.
+        self.fallback = None
+        self._entries = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Anything else the backend offers, such as the circuit breaker's status().
+        return getattr(self.uncached, name)
+
+    def select(self, table_name, user, columns="*", limit=None, after=None):
+        key = (columns, limit, tuple(after) if after else None)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((table_name, user))
+            if entry and now - entry['at'] < self.ttl_seconds and key in entry['results']:
+                self._entries.move_to_end((table_name, user))
+                self.hits += 1
+                return list(entry['results'][key])
+            self.misses += 1
+            version = self._version
+        records = self.uncached.select(table_name, user, columns, limit, after)
+        if len(records) > self.max_rows:
+            return records
+        with self._lock:
+            # A write during the query may have made its result stale.
+            if version != self._version:
+                return records
+            entry = self._entries.get((table_name, user))
+            if entry is None or now - entry['at'] >= self.ttl_seconds:
+                entry = self._entries[(table_name, user)] = {'at': now, 'results': {}}
+            entry['results'][key] = list(records)
+            self._entries.move_to_end((table_name, user))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return records
+
+    def invalidate(self, table_name, user=None):
+        """Drop the cached queries of a user's records in a table, or of every user if `user` is None."""
+        with self._lock:
+            self._version += 1
+            if user is not None:
+                self._entries.pop((table_name, user), None)
+                return
+            for key in [key for key in self._entries if key[0] == table_name]:
+                del self._entries[key]
+
+    def insert(self, table_name, rows):
+        try:
+            return self.uncached.insert(table_name, rows)
+        finally:
+            # Also after a failure: a timed-out insert may still have landed.
+            for user in {row.get('user') for row in rows}:
+                self.invalidate(table_name, user)
+
+    def get(self, table_name, record_id, columns="*"):
+        return self.uncached.get(table_name, record_id, columns)
+
+    def delete(self, table_name, record_id):
+        try:
+            return self.uncached.delete(table_name, record_id)
+        finally:
+            # The owner of the record is not known without another query.
+            self.invalidate(table_name)
+
+    def upsert_checkpoint(self, table_name, data):
+        return self.uncached.upsert_checkpoint(table_name, data)
+
+    def read_checkpoints(self, table_name, run_id):
+        return self.uncached.read_checkpoints(table_name, run_id)
+
+    def delete_checkpoints(self, table_name, run_id):
+        return self.uncached.delete_checkpoints(table_name, run_id)
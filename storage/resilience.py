@@ -0,0 +1,196 @@
+import logging
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+STORAGE_TIMEOUT_SECONDS = float(os.environ.get('STORAGE_TIMEOUT_SECONDS', 10))
+STORAGE_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 0.2
+RETRY_MAX_SECONDS = 2.0
+BREAKER_FAILURES = 5
+BREAKER_RESET_SECONDS = 30
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+logger = logging.getLogger(__name__)
+
+# Calls run here so the caller can stop waiting at the deadline; a hung call keeps its thread
+# until the HTTP client's own timeout releases it.
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="storage")
+
+class StorageUnavailable(Exception):
+    """Raised without calling storage while the circuit breaker is open."""
+
+    def __init__(self, retry_in):
+        super().__init__(f"Storage is unavailable; retrying in {math.ceil(retry_in)}s.")
+        self.retry_in = retry_in
+
+class StorageTimeout(TimeoutError):
+    """Raised when a storage call passes its deadline. The call itself may still complete."""
+
+def backoff_delay(attempt, base=RETRY_BASE_SECONDS, cap=RETRY_MAX_SECONDS):
+    """
+    Return a jittered exponential backoff delay, so clients that failed together do not retry together.
+
+    Args:
+        attempt (int): The number of failed attempts so far, from 1.
+        base (float): The delay ceiling after the first failure.
+        cap (float): The largest delay ceiling.
+
+    Returns:
+        float: A delay drawn uniformly between zero and the ceiling.
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        """
+        Stop calling a failing service for a while instead of making every caller wait on it.
+
+        The breaker opens after `failure_threshold` consecutive failures. After `reset_seconds` it
+        lets one trial call through (half open); success closes it, failure opens it again.
+
+        Args:
+            failure_threshold (int): The consecutive failures that open the breaker.
+            reset_seconds (float): How long the breaker stays open before a trial call.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self.opened_at = None
+        self.last_error = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def retry_in(self):
+        """Return the seconds until the breaker lets a trial call through, 0 if it is not open."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self):
+        """Raise StorageUnavailable if a call may not go through now."""
+        with self._lock:
+            if self.state == OPEN and not self.retry_in():
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if not self._trial:
+                    self._trial = True
+                    return
+            elif self.state == CLOSED:
+                return
+            self.rejected += 1
+            raise StorageUnavailable(self.retry_in() or self.reset_seconds)
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.warning("Storage circuit breaker closed.")
+            self.state = CLOSED
+            self.failures = 0
+            self._trial = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            self._trial = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning("Storage circuit breaker opened after %d failures: %s", self.failures, error)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        """
+        Describe the breaker for operators.
+
+        Returns:
+            dict: state, consecutive failures, calls rejected while open, seconds until the next
+            trial call and the last error.
+        """
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'retry_in': self.retry_in(),
+                'last_error': self.last_error,
+            }
+
+class ResilientStorage:
+    # Calls that are safe to repeat. An insert that timed out may still land, so inserts are
+    # not retried here; the write-behind buffer retries its batches on its own schedule.
+    IDEMPOTENT = ('select', 'get', 'delete', 'upsert_checkpoint', 'read_checkpoints', 'delete_checkpoints')
+
+    def __init__(self, backend, timeout=STORAGE_TIMEOUT_SECONDS, attempts=STORAGE_ATTEMPTS, breaker=None):
+        """
+        Wrap a storage backend with a deadline per call, jittered retries and a circuit breaker.
+
+        It has the same methods as the backend it wraps, so it is passed to the functions of
+        `storage.supabase_client` in its place. While the breaker is open every call raises
+        StorageUnavailable at once; `create_record` then queues the record on `fallback`.
+
+        Args:
+            backend: The storage backend, such as `storage.supabase_client.SupabaseStorage`.
+            timeout (float): The longest a caller waits for one attempt.
+            attempts (int): The most attempts of an idempotent call.
+            breaker (CircuitBreaker): The breaker. Defaults to a new one.
+        """
+        self.backend = backend
+        self.timeout = timeout
+        self.attempts = attempts
+        self.breaker = breaker or CircuitBreaker()
+        # Set to a callable taking (table_name, data) to queue records while storage is down.
+        self.fallback = None
+
+    def _call(self, name, *args):
+        attempts = self.attempts if name in self.IDEMPOTENT else 1
+        for attempt in range(1, attempts + 1):
+            self.breaker.allow()
+            future = _executor.submit(getattr(self.backend, name), *args)
+            try:
+                result = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                error = StorageTimeout(f"Storage call '{name}' timed out after {self.timeout:g}s.")
+            except Exception as e:
+                error = e
+            else:
+                self.breaker.record_success()
+                return result
+            self.breaker.record_failure(error)
+            if attempt == attempts:
+                raise error
+            time.sleep(backoff_delay(attempt))
+
+    def insert(self, table_name, rows):
+        return self._call('insert', table_name, rows)
+
+    def select(self, table_name, user, columns="*", limit=None, after=None):
+        return self._call('select', table_name, user, columns, limit, after)
+
+    def get(self, table_name, record_id, columns="*"):
+        return self._call('get', table_name, record_id, columns)
+
+    def delete(self, table_name, record_id):
+        return self._call('delete', table_name, record_id)
+
+    def upsert_checkpoint(self, table_name, data):
+        return self._call('upsert_checkpoint', table_name, data)
+
+    def read_checkpoints(self, table_name, run_id):
+        return self._call('read_checkpoints', table_name, run_id)
+
+    def delete_checkpoints(self, table_name, run_id):
+        return self._call('delete_checkpoints', table_name, run_id)
+
+    def status(self):
+        """Return the circuit breaker's snapshot, see `CircuitBreaker.snapshot`."""
+        return self.breaker.snapshot()
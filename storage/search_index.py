@@ -0,0 +1,193 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from storage.supabase_client import read_all_records
+from storage.backends import table_name
+
+SEARCH_INDEX_PATH = os.environ.get('SEARCH_INDEX_PATH', 'search_index.db')
+BACKFILL_PAGE_SIZE = 500
+
+def document_kinds():
+    """
+    Describe the tables that are indexed.
+
+    Returns:
+        dict: (kind, title field, body field) per configured table name. A title field of None
+        means the title is derived from the record.
+    """
+    kinds = {
+        table_name('SUPABASE_TABLE'): ("PRD", 'product_name', 'output'),
+        table_name('SUPABASE_TRACKING_TABLE'): ("Tracking plan", 'feature_name', 'output'),
+        table_name('SUPABASE_BRAINTORM_TABLE'): ("Brainstorm", None, 'message'),
+    }
+    return {table: kind for table, kind in kinds.items() if table}
+
+def document_text(kinds, table_name, row):
+    """
+    Extract what is indexed from a record.
+
+    Args:
+        kinds (dict): The indexed tables, see `document_kinds`.
+        table_name (str): The table the record belongs to.
+        row (dict): The record.
+
+    Returns:
+        tuple: A key that is the same for the written and the stored record, then
+        (user, kind, created_at, title, body). The key includes the record's id, or its
+        created_at without one, so identical messages are indexed separately.
+    """
+    kind, title_field, body_field = kinds[table_name]
+    body = row.get(body_field) or ""
+    if title_field:
+        title = row.get(title_field) or ""
+    else:
+        title = "You" if row.get('is_user') else "Assistant"
+    user = row.get('user') or ""
+    identity = str(row.get('id') or row.get('created_at') or "")
+    doc_key = hashlib.sha1("\x1f".join([table_name, user, identity, title, body]).encode('utf-8')).hexdigest()
+    created_at = row.get('created_at') or datetime.now(timezone.utc).isoformat()
+    return doc_key, (user, kind, created_at, title, body)
+
+def _query(text):
+    # Quote every term so user input cannot form FTS5 syntax; the last one matches as a prefix.
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+class SearchIndex:
+    def __init__(self, path=SEARCH_INDEX_PATH, kinds=None):
+        """
+        A local SQLite FTS5 index over the user's PRDs, tracking plans and brainstorm messages.
+
+        New records are added as they are written (see `storage.supabase_client.add_write_listener`)
+        and removed when they are deleted, and `backfill` adds what a user wrote before the index existed.
+
+        Args:
+            path (str): The SQLite database file. Defaults to SEARCH_INDEX_PATH.
+            kinds (dict): The indexed tables, see `document_kinds`.
+        """
+        self.kinds = kinds if kinds is not None else document_kinds()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5("
+                "user UNINDEXED, kind UNINDEXED, created_at UNINDEXED, title, body, tokenize='porter unicode61')"
+            )
+            # FTS5 tables have no unique constraints, so the keys of indexed records are kept here.
+            self._conn.execute("CREATE TABLE IF NOT EXISTS document_keys (doc_key TEXT PRIMARY KEY)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS backfills (user TEXT, table_name TEXT, PRIMARY KEY (user, table_name))")
+
+    def add_rows(self, table_name, rows):
+        """
+        Index written records. Records of other tables and records already indexed are skipped.
+
+        Args:
+            table_name (str): The table the records were written to.
+            rows (list of dict): The records.
+
+        Returns:
+            int: The number of records added.
+        """
+        if table_name not in self.kinds:
+            return 0
+        added = 0
+        with self._lock, self._conn:
+            for row in rows:
+                doc_key, document = document_text(self.kinds, table_name, row)
+                if self._conn.execute("INSERT OR IGNORE INTO document_keys VALUES (?)", (doc_key,)).rowcount:
+                    self._conn.execute("INSERT INTO documents VALUES (?, ?, ?, ?, ?)", document)
+                    added += 1
+        return added
+
+    def remove_rows(self, table_name, rows):
+        """
+        Drop deleted records from the index. Records of other tables are skipped.
+
+        Args:
+            table_name (str): The table the records were deleted from.
+            rows (list of dict): The records.
+
+        Returns:
+            int: The number of records removed.
+        """
+        if table_name not in self.kinds:
+            return 0
+        removed = 0
+        with self._lock, self._conn:
+            for row in rows:
+                doc_key, (user, kind, created_at, title, body) = document_text(self.kinds, table_name, row)
+                if not self._conn.execute("DELETE FROM document_keys WHERE doc_key = ?", (doc_key,)).rowcount:
+                    continue
+                # The FTS table holds no key, so the document is found by its content, preferring the copy
+                # with the same creation time. Deletes are rare enough for the scan of the unindexed columns.
+                removed += self._conn.execute(
+                    "DELETE FROM documents WHERE rowid = (SELECT rowid FROM documents "
+                    "WHERE user = ? AND kind = ? AND title = ? AND body = ? ORDER BY created_at = ? DESC LIMIT 1)",
+                    (user, kind, title, body, created_at)
+                ).rowcount
+        return removed
+
+    def search(self, user, text, kinds=None, limit=20):
+        """
+        Search a user's documents, best matches first.
+
+        Args:
+            user (str): The email of the user.
+            text (str): The search terms; all must match, the last one as a prefix.
+            kinds (list of str): Only return these kinds, such as "PRD". None returns all.
+            limit (int): The most results returned.
+
+        Returns:
+            list of dict: 'kind', 'title', 'created_at', 'snippet' and 'body' per result.
+        """
+        query = _query(text)
+        if not query:
+            return []
+        sql = (
+            "SELECT kind, title, created_at, snippet(documents, 4, '**', '**', ' ... ', 16), body "
+            "FROM documents WHERE documents MATCH ? AND user = ?"
+        )
+        params = [query, user]
+        if kinds:
+            sql += f" AND kind IN ({', '.join('?' for _ in kinds)})"
+            params += list(kinds)
+        # Title matches weigh more than body matches.
+        sql += " ORDER BY bm25(documents, 0, 0, 0, 5.0, 1.0) LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {'kind': kind, 'title': title, 'created_at': created_at, 'snippet': snippet, 'body': body}
+            for kind, title, created_at, snippet, body in rows
+        ]
+
+    def backfill(self, user, supabase, page_size=BACKFILL_PAGE_SIZE):
+        """
+        Index a user's existing records, once per table.
+
+        Args:
+            user (str): The email of the user.
+            supabase: The Supabase client.
+            page_size (int): The records read per request.
+
+        Returns:
+            int: The number of records added.
+        """
+        added = 0
+        for table_name in self.kinds:
+            with self._lock:
+                done = self._conn.execute(
+                    "SELECT 1 FROM backfills WHERE user = ? AND table_name = ?", (user, table_name)
+                ).fetchone()
+            if done:
+                continue
+            for rows in read_all_records(table_name, user, supabase, page_size):
+                added += self.add_rows(table_name, rows)
+            with self._lock, self._conn:
+                self._conn.execute("INSERT OR IGNORE INTO backfills VALUES (?, ?)", (user, table_name))
+        return added
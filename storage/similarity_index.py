@@ -0,0 +1,233 @@
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+import numpy as np
+from storage.supabase_client import read_all_records
+from storage.search_index import BACKFILL_PAGE_SIZE, document_kinds, document_text
+
+SIMILARITY_INDEX_DIR = os.environ.get('SIMILARITY_INDEX_DIR', 'similarity_index')
+VECTOR_DIM = 512
+INITIAL_CAPACITY = 1024
+SIMILAR_KINDS = ("PRD", "Tracking plan")
+
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "we our you your they their should must can may not no all any each which who what when how".split()
+)
+
+def embed(text, dim=VECTOR_DIM):
+    """
+    Turn text into a unit-length hashed bag-of-words vector.
+
+    Words and adjacent word pairs are hashed into `dim` buckets with a hashed sign, weighted by
+    1 + log(count), so no vocabulary has to be stored or fitted.
+
+    Args:
+        text (str): The text.
+        dim (int): The vector length.
+
+    Returns:
+        numpy.ndarray: A float32 vector; all zeros if the text has no words.
+    """
+    words = [word for word in re.findall(r'[a-z0-9]+', text.lower()) if word not in STOP_WORDS and len(word) > 1]
+    terms = Counter(words)
+    terms.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+    vector = np.zeros(dim, dtype=np.float32)
+    if not terms:
+        return vector
+    hashes = np.fromiter((zlib.crc32(term.encode('utf-8')) for term in terms), dtype=np.uint32, count=len(terms))
+    weights = 1.0 + np.log(np.fromiter(terms.values(), dtype=np.float32, count=len(terms)))
+    np.add.at(vector, (hashes >> 1) % dim, np.where(hashes & 1, weights, -weights))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class SimilarityIndex:
+    def __init__(self, directory=SIMILARITY_INDEX_DIR, dim=VECTOR_DIM, kinds=None):
+        """
+        Hashed document vectors in a memory-mapped matrix, for finding a user's related PRDs and tracking plans.
+
+        Vectors are appended as records are written and cleared when they are deleted, see
+        `storage.supabase_client.add_write_listener`.
+        Lookups are one matrix-vector product over the mapped file, so they need no vector database
+        and no network call. Titles and texts live in a SQLite file next to the matrix and are only
+        read for the top results.
+
+        Args:
+            directory (str): Where the matrix and metadata files live. Defaults to SIMILARITY_INDEX_DIR.
+            dim (int): The vector length. Changing it requires a new directory.
+            kinds (dict): The indexed tables, see `storage.search_index.document_kinds`. Defaults to
+                the PRD and tracking plan tables.
+        """
+        if kinds is None:
+            kinds = {table: kind for table, kind in document_kinds().items() if kind[0] in SIMILAR_KINDS}
+        self.kinds = kinds
+        self.dim = dim
+        os.makedirs(directory, exist_ok=True)
+        self._path = os.path.join(directory, f"vectors_{dim}.f32")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "documents.db"), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents (row INTEGER PRIMARY KEY, doc_key TEXT UNIQUE, "
+                "user TEXT, kind TEXT, created_at TEXT, title TEXT, body TEXT)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS backfills (user TEXT, table_name TEXT, PRIMARY KEY (user, table_name))")
+        rows = self._conn.execute("SELECT user, kind FROM documents ORDER BY row").fetchall()
+        self.count = len(rows)
+        # Owner and kind of every row as small integer codes, so filtering is a vectorized comparison.
+        self._codes = {}
+        self._users = np.array([self._code(user) for user, _ in rows], dtype=np.int32)
+        self._kinds = np.array([self._code(kind) for _, kind in rows], dtype=np.int32)
+        self._matrix = None
+        self._map(max(INITIAL_CAPACITY, self.count))
+
+    def _code(self, value):
+        return self._codes.setdefault(value, len(self._codes))
+
+    def _map(self, capacity):
+        size = capacity * self.dim * 4
+        with open(self._path, 'ab') as file:
+            if file.tell() < size:
+                file.truncate(size)
+        # Searches in flight keep the previous mapping and code arrays alive until they finish.
+        self._matrix = np.memmap(self._path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+        self._users = np.resize(self._users, capacity)
+        self._kinds = np.resize(self._kinds, capacity)
+
+    def add_rows(self, table_name, rows):
+        """
+        Append the vectors of written records. Records of other tables and records already indexed are skipped.
+
+        Args:
+            table_name (str): The table the records were written to.
+            rows (list of dict): The records.
+
+        Returns:
+            int: The number of records added.
+        """
+        if table_name not in self.kinds:
+            return 0
+        added = 0
+        with self._lock, self._conn:
+            for row in rows:
+                doc_key, (user, kind, created_at, title, body) = document_text(self.kinds, table_name, row)
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (self.count, doc_key, user, kind, created_at, title, body)
+                ).rowcount
+                if not inserted:
+                    continue
+                if self.count == self._matrix.shape[0]:
+                    self._matrix.flush()
+                    self._map(self._matrix.shape[0] * 2)
+                self._matrix[self.count] = embed(f"{title}\n{body}", self.dim)
+                self._users[self.count] = self._code(user)
+                self._kinds[self.count] = self._code(kind)
+                self.count += 1
+                added += 1
+            self._matrix.flush()
+        return added
+
+    def remove_rows(self, table_name, rows):
+        """
+        Clear the vectors of deleted records. Records of other tables are skipped.
+
+        Rows keep their place in the matrix, since row numbers are positions; a cleared row has a zero
+        vector and no owner, so no search returns it.
+
+        Args:
+            table_name (str): The table the records were deleted from.
+            rows (list of dict): The records.
+
+        Returns:
+            int: The number of records removed.
+        """
+        if table_name not in self.kinds:
+            return 0
+        removed = 0
+        with self._lock, self._conn:
+            for row in rows:
+                doc_key, _ = document_text(self.kinds, table_name, row)
+                found = self._conn.execute("SELECT row FROM documents WHERE doc_key = ?", (doc_key,)).fetchone()
+                if found is None:
+                    continue
+                # A NULL key lets the same content be indexed again if it is written again.
+                self._conn.execute(
+                    "UPDATE documents SET doc_key = NULL, user = '', title = '', body = '' WHERE row = ?", found
+                )
+                self._matrix[found[0]] = 0.0
+                self._users[found[0]] = self._code('')
+                removed += 1
+            self._matrix.flush()
+        return removed
+
+    def similar(self, user, text, k=5, kinds=None, min_score=0.1):
+        """
+        Find a user's documents most similar to `text`.
+
+        Args:
+            user (str): The email of the user.
+            text (str): What to compare against, such as a product name and description.
+            k (int): The most results returned.
+            kinds (list of str): Only consider these kinds, such as "PRD". None considers all.
+            min_score (float): The lowest cosine similarity returned.
+
+        Returns:
+            list of dict: 'kind', 'title', 'created_at', 'body' and 'score' per result, most similar first.
+        """
+        query = embed(text, self.dim)
+        with self._lock:
+            count, matrix, users, row_kinds = self.count, self._matrix, self._users, self._kinds
+            user_code = self._codes.get(user)
+            kind_codes = [self._codes[kind] for kind in kinds or () if kind in self._codes]
+        if not count or user_code is None or not query.any():
+            return []
+        scores = matrix[:count] @ query
+        mask = users[:count] == user_code
+        if kinds:
+            mask &= np.isin(row_kinds[:count], kind_codes)
+        scores = np.where(mask, scores, -1.0)
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = [int(row) for row in top if scores[row] >= min_score]
+        if not top:
+            return []
+        with self._lock:
+            documents = self._conn.execute(
+                f"SELECT row, kind, title, created_at, body FROM documents WHERE row IN ({', '.join('?' for _ in top)})", top
+            ).fetchall()
+        by_row = {row: (kind, title, created_at, body) for row, kind, title, created_at, body in documents}
+        return [
+            {'kind': by_row[row][0], 'title': by_row[row][1], 'created_at': by_row[row][2], 'body': by_row[row][3], 'score': float(scores[row])}
+            for row in top
+        ]
+
+    def backfill(self, user, supabase, page_size=BACKFILL_PAGE_SIZE):
+        """
+        Index a user's existing records, once per table.
+
+        Args:
+            user (str): The email of the user.
+            supabase: The Supabase client.
+            page_size (int): The records read per request.
+
+        Returns:
+            int: The number of records added.
+        """
+        added = 0
+        for table_name in self.kinds:
+            with self._lock:
+                done = self._conn.execute(
+                    "SELECT 1 FROM backfills WHERE user = ? AND table_name = ?", (user, table_name)
+                ).fetchone()
+            if done:
+                continue
+            for rows in read_all_records(table_name, user, supabase, page_size):
+                added += self.add_rows(table_name, rows)
+            with self._lock, self._conn:
+                self._conn.execute("INSERT OR IGNORE INTO backfills VALUES (?, ?)", (user, table_name))
+        return added
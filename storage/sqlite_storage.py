@@ -0,0 +1,105 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+SQLITE_STORAGE_PATH = os.environ.get('SQLITE_STORAGE_PATH', 'pm_toolkit.db')
+
+def _columns(columns):
+    if columns.strip() == "*":
+        return None
+    return [column.strip() for column in columns.split(",")]
+
+def _record(record_id, created_at, data, columns):
+    record = {'id': record_id, 'created_at': created_at, **json.loads(data)}
+    if columns is None:
+        return record
+    return {column: record.get(column) for column in columns}
+
+class SQLiteStorage:
+    def __init__(self, path=SQLITE_STORAGE_PATH):
+        """
+        Storage backend that keeps records in a local SQLite file, for development, tests and single-node deployments.
+
+        Records of every table share one table: the owner and creation time are columns, for the
+        newest-first keyset pages, and the rest of each record is stored as JSON. Records get an
+        integer id and a UTC `created_at`, like the Supabase tables.
+
+        Args:
+            path (str): The SQLite database file. Defaults to SQLITE_STORAGE_PATH; ':memory:' keeps nothing on disk.
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # WAL with NORMAL sync can only lose the last commits on power loss, never corrupt the file.
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS records (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "table_name TEXT NOT NULL, user TEXT, created_at TEXT NOT NULL, data TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS records_by_user ON records (table_name, user, created_at, id)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints (table_name TEXT, run_id TEXT, stage TEXT, label TEXT, text TEXT, "
+                "PRIMARY KEY (table_name, run_id, stage))"
+            )
+
+    def insert(self, table_name, rows):
+        created_at = datetime.now(timezone.utc).isoformat(timespec='microseconds')
+        stored = []
+        with self._lock, self._conn:
+            for row in rows:
+                data = {name: value for name, value in row.items() if name not in ('id', 'created_at')}
+                record_created_at = row.get('created_at') or created_at
+                record_id = self._conn.execute(
+                    "INSERT INTO records (table_name, user, created_at, data) VALUES (?, ?, ?, ?)",
+                    (table_name, row.get('user'), record_created_at, json.dumps(data, default=str))
+                ).lastrowid
+                stored.append({'id': record_id, 'created_at': record_created_at, **data})
+        return stored
+
+    def select(self, table_name, user, columns="*", limit=None, after=None):
+        sql = "SELECT id, created_at, data FROM records WHERE table_name = ? AND user = ?"
+        params = [table_name, user]
+        if after:
+            created_at, record_id = after
+            sql += " AND (created_at < ? OR (created_at = ? AND id < ?))"
+            params += [created_at, created_at, record_id]
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        selected = _columns(columns)
+        return [_record(record_id, created_at, data, selected) for record_id, created_at, data in rows]
+
+    def get(self, table_name, record_id, columns="*"):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, created_at, data FROM records WHERE table_name = ? AND id = ?", (table_name, record_id)
+            ).fetchone()
+        return _record(*row, _columns(columns)) if row else None
+
+    def delete(self, table_name, record_id):
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM records WHERE table_name = ? AND id = ?", (table_name, record_id)).rowcount > 0
+
+    def upsert_checkpoint(self, table_name, data):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                (table_name, data['run_id'], data['stage'], data['label'], data['text'])
+            )
+
+    def read_checkpoints(self, table_name, run_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage, label, text FROM checkpoints WHERE table_name = ? AND run_id = ?", (table_name, run_id)
+            ).fetchall()
+        return [{'stage': stage, 'label': label, 'text': text} for stage, label, text in rows]
+
+    def delete_checkpoints(self, table_name, run_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM checkpoints WHERE table_name = ? AND run_id = ?", (table_name, run_id))
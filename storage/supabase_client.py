@@ -1,6 +1,16 @@
+import atexit
 import os
-from supabase import create_client, Client
-import streamlit as st
+import threading
+import time
+from collections import defaultdict
+from storage.resilience import StorageUnavailable, StorageTimeout, STORAGE_TIMEOUT_SECONDS, backoff_delay
+
+WRITE_FLUSH_SECONDS = float(os.environ.get('WRITE_FLUSH_SECONDS', 2))
+WRITE_BATCH_SIZE = 50
+WRITE_MAX_ATTEMPTS = 8
+
+_write_listeners = []
+_delete_listeners = []
 
 # Initialize Supabase client
 def init_supabase():
@@ -17,58 +27,384 @@ def init_supabase():
     key = os.environ.get("SUPABASE_KEY")
     if not url or not key:
         raise ValueError("Supabase URL and key must be set as environment variables.")
-    return create_client(url, key)
+    # Imported here so the SQLite backend runs without the supabase package.
+    from supabase import create_client
+    from supabase.client import ClientOptions
+    # The HTTP timeout frees the thread of a call its caller already gave up on, see `storage.resilience`.
+    return create_client(url, key, options=ClientOptions(postgrest_client_timeout=STORAGE_TIMEOUT_SECONDS))
+
+class SupabaseStorage:
+    def __init__(self, client):
+        """
+        Storage backend that keeps records in Supabase tables.
+
+        The functions of this module take a backend as their `supabase` argument, so the same calls
+        work against `storage.sqlite_storage.SQLiteStorage`; see `storage.backends.init_storage`.
+
+        Args:
+            client (Client): The Supabase client.
+        """
+        self.client = client
+
+    def insert(self, table_name, rows):
+        return self.client.table(table_name).insert(rows).execute().data
+
+    def select(self, table_name, user, columns="*", limit=None, after=None):
+        query = self.client.table(table_name).select(columns).eq('user', user)
+        if after:
+            created_at, record_id = after
+            query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{record_id})')
+        query = query.order('created_at', desc=True).order('id', desc=True)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.execute().data
+
+    def get(self, table_name, record_id, columns="*"):
+        response = self.client.table(table_name).select(columns).eq('id', record_id).limit(1).execute()
+        return response.data[0] if response.data else None
+
+    def delete(self, table_name, record_id):
+        response = self.client.table(table_name).delete().eq('id', record_id).execute()
+        return bool(response.data)
+
+    def upsert_checkpoint(self, table_name, data):
+        self.client.table(table_name).upsert(data, on_conflict='run_id,stage').execute()
+
+    def read_checkpoints(self, table_name, run_id):
+        return self.client.table(table_name).select("stage, label, text").eq('run_id', run_id).execute().data
+
+    def delete_checkpoints(self, table_name, run_id):
+        self.client.table(table_name).delete().eq('run_id', run_id).execute()
+
+def add_write_listener(callback):
+    """
+    Call `callback(table_name, rows)` after every successful insert, for example to keep a search index up to date.
+
+    The rows are the stored records, with their id and created_at, when the backend returns them.
+
+    Listener errors are ignored, so a listener can never fail a write.
+    """
+    _write_listeners.append(callback)
+
+def add_delete_listener(callback):
+    """
+    Call `callback(table_name, rows)` with the deleted records after every successful delete, for example to drop them from a search index.
+
+    Listener errors are ignored, so a listener can never fail a delete.
+    """
+    _delete_listeners.append(callback)
+
+def _notify(listeners, table_name, rows):
+    for callback in listeners:
+        try:
+            callback(table_name, rows)
+        except Exception:
+            pass
 
-supabase: Client = init_supabase()
+def _notify_written(table_name, rows):
+    _notify(_write_listeners, table_name, rows)
 
 def create_record(table_name, data, supabase):
     """
     Create a new record in the specified table using the provided data.
 
+    While storage is unavailable the record is handed to the backend's `fallback`, if it has one,
+    which queues it for the write-behind buffer instead of failing.
+
     Args:
         table_name (str): The name of the table to insert the record into.
         data (dict): The data to be inserted as a new record.
-        supabase (SupabaseClient): The Supabase client object.
+        supabase: The storage backend, see `storage.backends.init_storage`.
 
     Returns:
         None
     """
-    response, count = supabase.table(table_name).insert(data).execute()
+    try:
+        stored = supabase.insert(table_name, [data])
+    except StorageUnavailable:
+        fallback = getattr(supabase, 'fallback', None)
+        if fallback is None:
+            raise
+        # The buffer notifies the listeners once the record is written.
+        fallback(table_name, data)
+        return
+    _notify_written(table_name, stored or [data])
 
-def read_records(table_name, email_id, supabase):
+def create_records(table_name, rows, supabase):
     """
-    Read records from the specified table based on the user's email ID.
+    Insert several records into the specified table in one request.
+
+    Args:
+        table_name (str): The name of the table to insert the records into.
+        rows (list of dict): The records to insert.
+        supabase: The storage backend, see `storage.backends.init_storage`.
+
+    Returns:
+        None
+    """
+    stored = supabase.insert(table_name, rows)
+    _notify_written(table_name, stored or rows)
+
+class WriteBehindBuffer:
+    def __init__(self, supabase, flush_seconds=WRITE_FLUSH_SECONDS, batch_size=WRITE_BATCH_SIZE, max_attempts=WRITE_MAX_ATTEMPTS):
+        """
+        Queue records and insert them in bulk from a background thread, so saving never blocks a page.
+
+        Records are flushed every `flush_seconds`, or as soon as `batch_size` are waiting. A failed
+        insert is retried with exponential backoff; rows are dropped only after `max_attempts` failed
+        inserts. While the storage circuit breaker is open, rows wait without using up attempts.
+        A batch whose insert timed out is not retried, because the insert may still land and a
+        retry would store the records twice; its rows are counted as `unconfirmed` instead.
+        Whatever is still queued is flushed when the process exits.
+
+        Args:
+            supabase: The storage backend.
+            flush_seconds (float): The longest a record waits before it is written.
+            batch_size (int): The number of waiting records that triggers a flush.
+            max_attempts (int): The most inserts tried for a batch before its rows are dropped.
+        """
+        self.supabase = supabase
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.written = 0
+        self.dropped = 0
+        self.unconfirmed = 0
+        self.last_error = None
+        self._pending = defaultdict(list)
+        self._attempts = defaultdict(int)
+        self._retry_at = 0.0
+        self.unavailable = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, table_name, data):
+        """Queue one record for `table_name`."""
+        with self._condition:
+            self._pending[table_name].append(data)
+            if self.pending() >= self.batch_size:
+                self._condition.notify()
+
+    def pending(self):
+        """Return the number of queued records."""
+        return sum(len(rows) for rows in self._pending.values())
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait(self.flush_seconds)
+                if self._closed:
+                    return
+            if time.monotonic() >= self._retry_at:
+                self.flush()
+
+    def flush(self):
+        """
+        Insert every queued record now, one bulk insert per table.
+
+        Returns:
+            bool: True if nothing is left queued.
+        """
+        with self._flush_lock:
+            with self._condition:
+                batches, self._pending = self._pending, defaultdict(list)
+            failed = False
+            wait = 0.0
+            for table_name, rows in batches.items():
+                try:
+                    create_records(table_name, rows, self.supabase)
+                except StorageUnavailable as e:
+                    failed = True
+                    wait = max(wait, e.retry_in)
+                    with self._condition:
+                        self._pending[table_name][:0] = rows
+                    continue
+                except StorageTimeout as e:
+                    self.last_error = str(e)
+                    self.unconfirmed += len(rows)
+                    # Most slow inserts do land, so the indexes get the rows as if they were written.
+                    _notify_written(table_name, rows)
+                    continue
+                except Exception as e:
+                    failed = True
+                    self.last_error = str(e)
+                    self._attempts[table_name] += 1
+                    if self._attempts[table_name] >= self.max_attempts:
+                        self.dropped += len(rows)
+                        self._attempts[table_name] = 0
+                        continue
+                    with self._condition:
+                        # Failed rows go back in front of anything queued since, keeping insert order.
+                        self._pending[table_name][:0] = rows
+                    continue
+                self.written += len(rows)
+                self._attempts[table_name] = 0
+            self.unavailable = wait > 0
+            attempts = max(self._attempts.values(), default=0)
+            if failed:
+                self._retry_at = time.monotonic() + max(wait, backoff_delay(attempts, base=1.0, cap=60))
+            else:
+                self._retry_at = 0.0
+            return not self.pending()
+
+    def close(self):
+        """Stop the background thread and write out whatever is queued, retrying a few times."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout=self.flush_seconds + 1)
+        for attempt in range(3):
+            if self.flush():
+                return
+            time.sleep(2 ** attempt)
+
+def read_records(table_name, email_id, supabase, limit=None, after=None):
+    """
+    Read records from the specified table based on the user's email ID, newest first.
 
     Args:
         table_name (str): The name of the table to read records from.
         email_id (str): The email ID of the user to filter records.
-        supabase (SupabaseClient): The Supabase client object.
+        supabase: The storage backend, see `storage.backends.init_storage`.
+        limit (int): The most records returned. None returns all of them.
+        after (tuple): The (created_at, id) of the last record of the previous page, or None for the first page.
 
     Returns:
-        None
+        list: The records.
+    """
+    return supabase.select(table_name, email_id, "*", limit, after)
+
+def list_records(table_name, email_id, supabase, columns="id, product_name, created_at", limit=20, after=None):
     """
-    response = supabase.table(table_name).select("*").eq('user', email_id).order('created_at', desc=True).execute()
+    List one page of a user's records, newest first, fetching only the given columns.
 
-    records = response.data
-    return records
+    Pages are keyset-paginated on (created_at, id), so every page costs the same however far back it is.
+
+    Args:
+        table_name (str): The name of the table to read records from.
+        email_id (str): The email ID of the user to filter records.
+        supabase: The storage backend, see `storage.backends.init_storage`.
+        columns (str): The columns to select. Must include 'id' and 'created_at'.
+        limit (int): The page size.
+        after (tuple): The (created_at, id) of the last record of the previous page, or None for the first page.
+
+    Returns:
+        tuple: The records of the page, and the cursor of the next page or None if this is the last one.
+    """
+    records = supabase.select(table_name, email_id, columns, limit + 1, after)
+    if len(records) > limit:
+        records = records[:limit]
+        return records, (records[-1]['created_at'], records[-1]['id'])
+    return records, None
+
+def read_all_records(table_name, user, supabase, page_size=500):
+    """
+    Yield every record of a user in a table, one page per request.
+
+    Args:
+        table_name (str): The table to read.
+        user (str): The email of the user.
+        supabase: The storage backend.
+        page_size (int): The records read per request.
+
+    Yields:
+        list of dict: The records of each page.
+    """
+    # Scans read around the read cache, which would only be flushed by their pages.
+    supabase = getattr(supabase, 'uncached', supabase)
+    cursor = None
+    while True:
+        rows, cursor = list_records(table_name, user, supabase, columns="*", limit=page_size, after=cursor)
+        yield rows
+        if cursor is None:
+            return
+
+def read_record(table_name, record_id, supabase, columns="*"):
+    """
+    Read a single record by its ID.
+
+    Args:
+        table_name (str): The name of the table to read the record from.
+        record_id (str): The ID of the record.
+        supabase: The storage backend, see `storage.backends.init_storage`.
+        columns (str): The columns to select.
+
+    Returns:
+        dict: The record, or None if it does not exist.
+    """
+    return supabase.get(table_name, record_id, columns)
 
 def delete_record(table_name, record_id, supabase):
     """
     Delete a record from the specified table based on the record ID.
 
+    With delete listeners registered, the record is read first so they learn what was deleted.
+
     Args:
         table_name (str): The name of the table to delete the record from.
         record_id (str): The ID of the record to be deleted.
-        supabase (SupabaseClient): The Supabase client object.
+        supabase: The storage backend, see `storage.backends.init_storage`.
+
+    Returns:
+        bool: True if the record was deleted, False if it did not exist.
+    """
+    record = supabase.get(table_name, record_id) if _delete_listeners else None
+    deleted = supabase.delete(table_name, record_id)
+    if deleted and record:
+        _notify(_delete_listeners, table_name, [record])
+    return deleted
+
+def save_checkpoint(table_name, run_id, stage, label, text, supabase):
+    """
+    Store the output of one pipeline stage, replacing an earlier checkpoint of the same stage.
+
+    Args:
+        table_name (str): The name of the checkpoint table, unique on (run_id, stage).
+        run_id (str): The id of the pipeline run.
+        stage (str): The stage key, derived from the stage's inputs.
+        label (str): The label of the stage.
+        text (str): The stage output.
+        supabase: The storage backend, see `storage.backends.init_storage`.
+
+    Returns:
+        None
+    """
+    data = {'run_id': run_id, 'stage': stage, 'label': label, 'text': text}
+    supabase.upsert_checkpoint(table_name, data)
+
+def read_checkpoints(table_name, run_id, supabase):
+    """
+    Read the stored stage outputs of a pipeline run.
+
+    Args:
+        table_name (str): The name of the checkpoint table.
+        run_id (str): The id of the pipeline run.
+        supabase: The storage backend, see `storage.backends.init_storage`.
+
+    Returns:
+        list: The checkpoints, each with 'stage', 'label' and 'text'.
+    """
+    return supabase.read_checkpoints(table_name, run_id)
+
+def delete_checkpoints(table_name, run_id, supabase):
+    """
+    Delete the checkpoints of a run.
+
+    Args:
+        table_name (str): The name of the checkpoint table.
+        run_id (str): The id of the pipeline run.
+        supabase: The storage backend, see `storage.backends.init_storage`.
 
     Returns:
         None
     """
-    response = supabase.table(table_name).delete().eq('id', record_id).execute()
-    if response['status_code'] == 200:
-        print('Record deleted successfully.')
-    else:
-        print('Failed to delete record.')
+    supabase.delete_checkpoints(table_name, run_id)
 
 def create_data_prd(user, product_name, product_description, output, is_create_new):
     """
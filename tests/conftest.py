@@ -0,0 +1,77 @@
+from contextlib import contextmanager
+import pytest
+
+
+class FakeHandle:
+    """A model handle that answers from a function of the prompt and counts its calls."""
+
+    def __init__(self, router, model_class, system_prompt=None, prefer=None):
+        self.router = router
+        self.model_class = model_class
+        self.system_prompt = system_prompt
+        self.prefer = prefer
+        self.usage = {'input_tokens': 0, 'output_tokens': 0}
+        self.last_model = ("fake", model_class)
+
+    def generate_text(self, prompt, **kwargs):
+        self.router.calls.append((self.system_prompt, prompt))
+        text = self.router.respond(self.system_prompt, prompt)
+        self.usage['input_tokens'] += 1
+        self.usage['output_tokens'] += 1
+        return text, 1, 1
+
+
+class FakeRouter:
+    def __init__(self, respond=None):
+        self.respond = respond or (lambda system_prompt, prompt: f"out:{prompt}")
+        self.calls = []
+
+    def model(self, model_class, system_prompt=None, prefer=None):
+        return FakeHandle(self, model_class, system_prompt, prefer)
+
+    def rank(self, *args, **kwargs):
+        return [("fake", "a"), ("fake", "b")]
+
+
+class FakeProgress:
+    """Records what a pipeline reports, with the methods of `utils.streaming.StreamlitProgress`."""
+
+    def __init__(self):
+        self.completed_stages = []
+        self.replayed = []
+        self.notes = []
+        self.shown = []
+
+    def stage(self, llm_model, prompt, label, done_label=None, **kwargs):
+        text, _, _ = llm_model.generate_text(prompt=prompt, **kwargs)
+        self.completed_stages.append(done_label or label)
+        return text
+
+    def final(self, llm_model, prompt, **kwargs):
+        return self.stage(llm_model, prompt, label="final", **kwargs)
+
+    @contextmanager
+    def tasks(self, label, total, done_label=None):
+        yield lambda message: None
+
+    def note(self, text):
+        self.notes.append(text)
+
+    def show(self, text):
+        self.shown.append(text)
+
+    def completed(self, label, text):
+        self.completed_stages.append(label)
+
+    def replay(self, label, text, final=False):
+        self.replayed.append(label)
+
+
+@pytest.fixture
+def router():
+    return FakeRouter()
+
+
+@pytest.fixture
+def progress():
+    return FakeProgress()
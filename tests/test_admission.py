@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from api.admission import AdmissionController, AdmissionRejected
+
+CLASSES = {
+    "interactive": {"max_queue": 2, "deadline": 1.0},
+    "batch": {"max_queue": 2, "deadline": 1.0},
+}
+
+
+def test_free_slots_admit_at_once_and_release_frees_them():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=2, classes=CLASSES)
+        assert await controller.acquire("interactive") == 0.0
+        async with controller.admit("batch"):
+            assert controller.in_flight == 2
+        controller.release()
+        return controller
+    controller = asyncio.run(scenario())
+    assert controller.in_flight == 0
+    assert controller.metrics()["classes"]["interactive"]["admitted"] == 1
+
+
+def test_unknown_priority_is_rejected():
+    async def scenario():
+        await AdmissionController(classes=CLASSES).acquire("urgent")
+    with pytest.raises(ValueError):
+        asyncio.run(scenario())
+
+
+def test_waiting_interactive_requests_go_before_batch():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, classes=CLASSES, initial_service_time=0.1)
+        await controller.acquire("interactive")
+        order = []
+
+        async def request(priority):
+            await controller.acquire(priority)
+            order.append(priority)
+            controller.release()
+        tasks = [asyncio.create_task(request("batch")), asyncio.create_task(request("interactive"))]
+        await asyncio.sleep(0)
+        controller.release()
+        await asyncio.gather(*tasks)
+        return order, controller.in_flight
+    assert asyncio.run(scenario()) == (["interactive", "batch"], 0)
+
+
+def test_full_queues_and_hopeless_deadlines_are_shed_early():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, classes=CLASSES, initial_service_time=0.1)
+        await controller.acquire("batch")
+        waiters = [asyncio.create_task(controller.acquire("batch")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected, match="queue is full"):
+            await controller.acquire("batch")
+        controller.service_time = 10.0
+        with pytest.raises(AdmissionRejected, match="exceeds") as rejected:
+            await controller.acquire("interactive")
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        return rejected.value.retry_after, controller
+    retry_after, controller = asyncio.run(scenario())
+    assert retry_after >= 1
+    assert controller.metrics()["classes"]["batch"]["queue_depth"] == 0
+
+
+def test_queued_requests_time_out_at_their_deadline():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, classes=CLASSES, initial_service_time=0.01)
+        await controller.acquire("interactive")
+        with pytest.raises(AdmissionRejected, match="waited longer"):
+            await controller.acquire("interactive", deadline=0.05)
+        return controller
+    controller = asyncio.run(scenario())
+    stats = controller.metrics()["classes"]["interactive"]
+    assert (stats["timed_out"], stats["queue_depth"], controller.in_flight) == (1, 0, 1)
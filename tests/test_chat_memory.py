@@ -0,0 +1,94 @@
+from utils.chat_memory import ConversationMemory
+
+
+class SummaryModel:
+    def __init__(self):
+        self.prompts = []
+
+    def generate_text(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return f"summary {len(self.prompts)}", 1, 1
+
+
+def conversation(turns):
+    messages = []
+    for turn in range(turns):
+        messages.append({'role': 'user', 'content': f"question {turn}"})
+        messages.append({'role': 'assistant', 'content': f"answer {turn}"})
+    return messages
+
+
+def wait(memory):
+    if memory._future is not None:
+        memory._future.result(timeout=5)
+
+
+def test_short_conversations_are_sent_verbatim():
+    memory = ConversationMemory(recent_messages=6)
+    messages = conversation(2)
+    assert memory.history(messages) == messages
+
+
+def test_unsummarized_turns_are_sent_verbatim_until_the_summary_covers_them():
+    memory = ConversationMemory(recent_messages=2)
+    messages = conversation(5)
+    assert memory.history(messages) == messages
+
+
+def test_window_starts_on_a_user_turn():
+    memory = ConversationMemory(recent_messages=5)
+    model = SummaryModel()
+    messages = conversation(5)
+    memory.refresh(model, messages)
+    wait(memory)
+    history = memory.history(messages)
+    assert history[2] == {'role': 'user', 'content': "question 3"}
+    assert len(history) == 6
+
+
+def test_character_budget_shrinks_the_window_but_keeps_the_last_exchange():
+    memory = ConversationMemory(recent_messages=10, recent_chars=10)
+    model = SummaryModel()
+    messages = conversation(4)
+    memory.refresh(model, messages)
+    wait(memory)
+    assert memory.history(messages)[2:] == messages[-2:]
+
+
+def test_older_turns_are_folded_into_the_summary():
+    memory = ConversationMemory(recent_messages=2)
+    model = SummaryModel()
+    messages = conversation(4)
+    memory.refresh(model, messages)
+    wait(memory)
+    history = memory.history(messages)
+    assert "summary 1" in history[0]['content']
+    assert history[1]['role'] == 'assistant'
+    assert history[2:] == messages[-2:]
+    assert "question 0" in model.prompts[0]
+    assert memory.covered == 6
+
+
+def test_refresh_only_summarizes_what_is_not_covered_yet():
+    memory = ConversationMemory(recent_messages=2)
+    model = SummaryModel()
+    memory.refresh(model, conversation(3))
+    wait(memory)
+    memory.history(conversation(3))
+    memory.refresh(model, conversation(4))
+    wait(memory)
+    memory.history(conversation(4))
+    assert "summary 1" in model.prompts[1]
+    assert "question 0" not in model.prompts[1]
+    assert "question 2" in model.prompts[1]
+
+
+def test_consecutive_turns_of_one_role_are_merged_and_a_dangling_user_turn_is_dropped():
+    memory = ConversationMemory()
+    messages = [
+        {'role': 'user', 'content': "a"},
+        {'role': 'user', 'content': "b"},
+        {'role': 'assistant', 'content': "c"},
+        {'role': 'user', 'content': "unanswered"},
+    ]
+    assert memory.history(messages) == [{'role': 'user', 'content': "a\n\nb"}, {'role': 'assistant', 'content': "c"}]
@@ -0,0 +1,52 @@
+from storage.sqlite_storage import SQLiteStorage
+from utils.checkpoints import CheckpointStore, make_run_id, run_checkpoint
+
+
+class DownStorage:
+    def __getattr__(self, name):
+        def call(*args):
+            raise ConnectionError("down")
+        return call
+
+
+def test_run_id_depends_on_pipeline_user_and_inputs_only():
+    run_id = make_run_id('create_prd', 'a', {'name': "x", 'sections': 3})
+    assert run_id == make_run_id('create_prd', 'a', {'sections': 3, 'name': "x"})
+    assert run_id != make_run_id('create_prd', 'b', {'name': "x", 'sections': 3})
+    assert run_id != make_run_id('create_tracking', 'a', {'name': "x", 'sections': 3})
+
+
+def test_run_checkpoint_ignores_the_router_and_discards_when_not_reusing():
+    store = CheckpointStore(table_name=None)
+    _, run_id = run_checkpoint(store, 'create_prd', 'a', {'name': "x", 'router': object()})
+    assert run_id == make_run_id('create_prd', 'a', {'name': "x"})
+    store.save(run_id, 'stage', "Stage", "text")
+    run_checkpoint(store, 'create_prd', 'a', {'name': "x", 'router': object()}, reuse=False)
+    assert store.load(run_id) == {}
+
+
+def test_checkpoints_in_storage_survive_a_new_store():
+    storage = SQLiteStorage(':memory:')
+    CheckpointStore(storage, 'checkpoints').save('run', 'stage', "Stage", "text")
+    assert CheckpointStore(storage, 'checkpoints').load('run') == {'stage': {'label': "Stage", 'text': "text"}}
+    CheckpointStore(storage, 'checkpoints').discard('run')
+    assert CheckpointStore(storage, 'checkpoints').load('run') == {}
+
+
+def test_memory_keeps_the_most_recently_used_runs():
+    store = CheckpointStore(table_name=None, max_runs=2)
+    for run_id in ('a', 'b'):
+        store.save(run_id, 'stage', "Stage", run_id)
+    store.load('a')
+    store.save('c', 'stage', "Stage", "c")
+    assert store.load('a') and store.load('c')
+    assert store.load('b') == {}
+
+
+def test_storage_failures_are_recorded_without_failing_the_run():
+    store = CheckpointStore(DownStorage(), 'checkpoints')
+    store.save('run', 'stage', "Stage", "text")
+    assert store.last_error == "down"
+    assert store.load('run') == {'stage': {'label': "Stage", 'text': "text"}}
+    store.discard('run')
+    assert store.load('run') == {}
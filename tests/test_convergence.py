@@ -0,0 +1,45 @@
+from utils.convergence import ConvergenceMonitor, critique_approves, draft_similarity, format_summary
+
+
+def test_critique_approves_needs_every_verdict_to_approve():
+    assert critique_approves("Looks good.\nVERDICT: APPROVED")
+    assert critique_approves("VERDICT: **APPROVED**\n\nVerdict: approved")
+    assert not critique_approves("VERDICT: APPROVED\nVERDICT: REVISE")
+    assert not critique_approves("No verdict at all")
+
+
+def test_draft_similarity():
+    assert draft_similarity("a b c d", "a b c d") == 1.0
+    assert draft_similarity("a b c d", "w x y z") == 0.0
+
+
+def test_monitor_stops_when_the_critique_approves():
+    monitor = ConvergenceMonitor(max_rounds=3)
+    monitor.start_round()
+    assert monitor.critique_done("VERDICT: APPROVED")
+    summary = monitor.summary()
+    assert (summary['rounds'], summary['skipped_rounds']) == (1, 2)
+    assert "no substantive issues" in summary['reason']
+
+
+def test_monitor_stops_when_drafts_converge_and_estimates_savings():
+    usage = {'input_tokens': 0, 'output_tokens': 0}
+    monitor = ConvergenceMonitor(max_rounds=4, similarity_threshold=0.9, usage_sources=[usage])
+    monitor.start_round()
+    usage['output_tokens'] += 100
+    assert not monitor.revision_done("one two three", "four five six")
+    monitor.start_round()
+    usage['output_tokens'] += 100
+    assert monitor.revision_done("one two three four five six seven eight nine ten", "one two three four five six seven eight nine ten")
+    summary = monitor.summary()
+    assert summary['skipped_rounds'] == 2
+    assert summary['tokens_saved'] == 200
+    assert "Stopped after 2 of 4" in format_summary(summary)
+
+
+def test_monitor_reports_the_round_limit():
+    monitor = ConvergenceMonitor(max_rounds=1)
+    assert monitor.is_last_round(0)
+    monitor.start_round()
+    monitor.revision_done("a", "b")
+    assert monitor.summary()['reason'] == "the round limit was reached"
@@ -0,0 +1,43 @@
+from utils.critique_panel import build_critics, merge_critiques, panel_stages
+from utils.pipeline import run_pipeline
+
+
+def test_build_critics_leaves_out_reviewers_without_a_prompt():
+    assert [critic['name'] for critic in build_critics("product")] == ["Product"]
+    assert [critic['name'] for critic in build_critics("product", "engineering", "data")] == ["Product", "Engineering", "Data"]
+
+
+def test_merge_drops_points_an_earlier_reviewer_made():
+    critique, dropped = merge_critiques([
+        {'name': "Product", 'text': "## Gaps\n- The success metrics are missing.\n- Scope is vague."},
+        {'name': "Engineering", 'text': "1. **The success metrics are missing**\n2. No rollback plan."},
+    ])
+    assert dropped == 1
+    assert critique == (
+        "### Product review\n- The success metrics are missing.\n- Scope is vague.\n\n"
+        "### Engineering review\n- No rollback plan."
+    )
+
+
+def test_paragraphs_count_as_points_and_empty_reviews_are_left_out():
+    critique, dropped = merge_critiques([
+        {'name': "Product", 'text': "First concern.\n\nSecond concern."},
+        {'name': "Data", 'text': "## Nothing to add"},
+    ])
+    assert (critique, dropped) == ("### Product review\n- First concern.\n- Second concern.", 0)
+
+
+def test_critics_spread_over_the_ranked_models(router):
+    critics = build_critics("product", "engineering", "data")
+    stages = panel_stages(router, critics, lambda context: "review", after=('draft',))
+    assert [stage.prefer for stage in stages[:-1]] == [("fake", "a"), ("fake", "b"), ("fake", "a")]
+    assert all(stage.optional and stage.after == ('draft',) for stage in stages[:-1])
+    assert list(stages[-1].after) == [stage.name for stage in stages[:-1]]
+
+
+def test_panel_runs_every_review_and_merges_them(router, progress):
+    critics = build_critics("product", "engineering")
+    context = run_pipeline(progress, router, panel_stages(router, critics, lambda context: "review"))
+    assert sorted(system_prompt for system_prompt, _ in router.calls) == ["engineering", "product"]
+    assert context['critique'].startswith("### Product review\n- out:review")
+    assert "Dropped 1 points" in progress.notes[0]
@@ -0,0 +1,53 @@
+import io
+import json
+import zipfile
+import pytest
+from storage.export import export_ndjson, export_zip
+from storage.read_cache import CachedStorage
+from storage.sqlite_storage import SQLiteStorage
+
+TABLES = {'prds': "PRD", 'tracking': "Tracking plan"}
+
+
+class Unseekable(io.RawIOBase):
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+
+@pytest.fixture
+def storage():
+    storage = CachedStorage(SQLiteStorage(':memory:'))
+    storage.insert('prds', [{'user': 'a', 'product_name': f"p{i}", 'output': "ü"} for i in range(5)])
+    storage.insert('tracking', [{'user': 'a', 'feature_name': "t"}, {'user': 'b', 'feature_name': "other"}])
+    return storage
+
+
+def test_ndjson_has_one_line_per_record_with_its_kind(storage):
+    pages = []
+    fileobj = io.BytesIO()
+    assert export_ndjson(fileobj, 'a', TABLES, storage, page_size=2, on_page=lambda table, rows: pages.append((table, rows))) == 6
+    lines = [json.loads(line) for line in fileobj.getvalue().decode('utf-8').splitlines()]
+    assert [line['kind'] for line in lines] == ["PRD"] * 5 + ["Tracking plan"]
+    assert lines[0]['output'] == "ü" and 'id' in lines[0]
+    assert pages == [('prds', 2), ('prds', 2), ('prds', 1), ('tracking', 1)]
+
+
+def test_zip_has_one_member_per_kind_and_needs_no_seeking(storage):
+    fileobj = Unseekable()
+    assert export_zip(fileobj, 'a', TABLES, storage, page_size=2) == 6
+    with zipfile.ZipFile(io.BytesIO(bytes(fileobj.data))) as archive:
+        assert archive.namelist() == ["prd.ndjson", "tracking_plan.ndjson"]
+        assert len(archive.read("prd.ndjson").splitlines()) == 5
+        assert json.loads(archive.read("tracking_plan.ndjson"))['feature_name'] == "t"
+
+
+def test_exports_do_not_fill_the_read_cache(storage):
+    export_ndjson(io.BytesIO(), 'a', TABLES, storage)
+    assert (storage.hits, storage.misses) == (0, 0)
@@ -0,0 +1,50 @@
+import pytest
+from utils.patching import PatchError, apply_edits, critique_text, parse_edits
+
+DOCUMENT = "# Goals\nGrow signups.\n\n# Metrics\nTrack weekly active users."
+
+
+def test_parse_edits_reads_the_json_object_inside_a_response():
+    critique, edits = parse_edits('Here you go: {"critique": "Tighten goals", "edits": [{"find": "a", "replace": "b"}]}')
+    assert critique == "Tighten goals"
+    assert edits == [{'find': "a", 'replace': "b"}]
+
+
+@pytest.mark.parametrize("response", [
+    "no json here",
+    '{"critique": "x"}',
+    '{"edits": [{"find": "", "replace": "x"}]}',
+    '{"edits": [{"find": "a"}]}',
+    '{"edits": [',
+])
+def test_parse_edits_rejects_malformed_responses(response):
+    with pytest.raises(PatchError):
+        parse_edits(response)
+
+
+def test_apply_edits_replaces_unique_matches_in_order():
+    revised = apply_edits(DOCUMENT, [
+        {'find': "Grow signups.", 'replace': "Grow signups by 20%."},
+        {'find': "Grow signups by 20%.", 'replace': "Grow paid signups by 20%."},
+    ])
+    assert "Grow paid signups by 20%." in revised
+
+
+def test_apply_edits_tolerates_reflowed_whitespace():
+    assert "DAU" in apply_edits(DOCUMENT, [{'find': "Track  weekly\nactive users.", 'replace': "Track DAU."}])
+
+
+@pytest.mark.parametrize("find, message", [("missing text", "matches nowhere"), ("#", "matches 2 places")])
+def test_apply_edits_rejects_ambiguous_or_missing_finds(find, message):
+    with pytest.raises(PatchError, match=message):
+        apply_edits(DOCUMENT, [{'find': find, 'replace': "x"}])
+
+
+def test_apply_edits_rejects_edits_that_remove_most_of_the_document():
+    with pytest.raises(PatchError, match="removed too much"):
+        apply_edits(DOCUMENT, [{'find': DOCUMENT, 'replace': "short"}])
+
+
+def test_critique_text_falls_back_to_the_raw_response():
+    assert critique_text('{"critique": "Fine", "edits": []}') == "Fine"
+    assert critique_text("Plain critique") == "Plain critique"
@@ -0,0 +1,97 @@
+import pytest
+from utils.checkpoints import CheckpointStore
+from utils.critique_panel import panel_stages
+from utils.pipeline import PipelineMetrics, Stage, run_pipeline
+
+
+def test_stages_run_in_dependency_order(router, progress):
+    stages = [
+        Stage('outline', 'fast', "outline"),
+        Stage('draft', 'fast', lambda context: f"draft from {context['outline']}", after=['outline']),
+    ]
+    context = run_pipeline(progress, router, stages)
+    assert context['draft'] == "out:draft from out:outline"
+
+
+def test_independent_stages_form_one_wave(router, progress):
+    stages = [
+        Stage('a', 'fast', "a"),
+        Stage('b', 'fast', "b"),
+        Stage('merge', 'fast', lambda context: context['a'] + context['b'], after=['a', 'b']),
+    ]
+    metrics = PipelineMetrics()
+    context = run_pipeline(progress, router, stages, metrics=metrics)
+    assert context['merge'] == "out:out:aout:b"
+    assert [stage['stage'] for stage in metrics.stages][-1] == 'merge'
+    assert set(progress.completed_stages) >= {'a', 'b'}
+
+
+def test_skip_if_skips_the_stage_and_its_dependents(router, progress):
+    stages = [
+        Stage('critique', 'fast', "critique"),
+        Stage('revise', 'fast', "revise", after=['critique'], skip_if=lambda context: True),
+        Stage('polish', 'fast', "polish", after=['revise']),
+    ]
+    context = run_pipeline(progress, router, stages)
+    assert 'revise' not in context and 'polish' not in context
+    assert [prompt for _, prompt in router.calls] == ["critique"]
+
+
+def test_checkpoints_replay_unchanged_stages(router, progress):
+    store = CheckpointStore(table_name=None)
+    stages = lambda: [Stage('a', 'fast', "a"), Stage('b', 'fast', "b", after=['a'])]
+    run_pipeline(progress, router, stages(), checkpoint=(store, 'run'))
+    assert len(router.calls) == 2
+    metrics = PipelineMetrics()
+    context = run_pipeline(progress, router, stages(), metrics=metrics, checkpoint=(store, 'run'))
+    assert len(router.calls) == 2
+    assert context['b'] == "out:b"
+    assert all(stage['reused'] for stage in metrics.stages)
+
+
+def test_changed_inputs_are_not_replayed(router, progress):
+    store = CheckpointStore(table_name=None)
+    run_pipeline(progress, router, [Stage('a', 'fast', "a")], checkpoint=(store, 'run'))
+    run_pipeline(progress, router, [Stage('a', 'fast', "changed")], checkpoint=(store, 'run'))
+    assert len(router.calls) == 2
+
+
+def test_unknown_dependencies_are_reported(router, progress):
+    with pytest.raises(ValueError, match="missing"):
+        run_pipeline(progress, router, [Stage('a', 'fast', "a", after=['missing'])])
+
+
+def test_failed_stage_of_a_wave_raises_unless_optional(progress):
+    from tests.conftest import FakeRouter
+
+    def respond(system_prompt, prompt):
+        if prompt == "bad":
+            raise ConnectionError("down")
+        return prompt
+
+    stages = [Stage('good', 'fast', "good"), Stage('bad', 'fast', "bad")]
+    with pytest.raises(RuntimeError, match="down"):
+        run_pipeline(progress, FakeRouter(respond), stages)
+    stages[1].optional = True
+    context = run_pipeline(progress, FakeRouter(respond), stages)
+    assert context['good'] == "good" and 'bad' not in context
+    assert any("Continuing without it" in note for note in progress.notes)
+
+
+def test_panel_merges_the_reviews_that_did_not_fail(progress):
+    from tests.conftest import FakeRouter
+
+    def respond(system_prompt, prompt):
+        if system_prompt == "engineering":
+            raise ConnectionError("down")
+        return f"- {system_prompt} point"
+
+    critics = [
+        {'name': "Product", 'system_prompt': "product"},
+        {'name': "Engineering", 'system_prompt': "engineering"},
+        {'name': "Data", 'system_prompt': "data"},
+    ]
+    router = FakeRouter(respond)
+    context = run_pipeline(progress, router, panel_stages(router, critics, lambda context: "review"))
+    assert "Product review" in context['critique'] and "Data review" in context['critique']
+    assert any("Engineering review" in note for note in progress.notes)
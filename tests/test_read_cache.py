@@ -0,0 +1,94 @@
+import threading
+from storage.read_cache import CachedStorage
+from storage.sqlite_storage import SQLiteStorage
+from storage.supabase_client import create_record, delete_record, list_records, read_records, read_all_records
+
+
+class CountingStorage:
+    def __init__(self):
+        self.backend = SQLiteStorage(':memory:')
+        self.selects = 0
+
+    def select(self, *args):
+        self.selects += 1
+        return self.backend.select(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+def make_cache(**kwargs):
+    backend = CountingStorage()
+    return backend, CachedStorage(backend, **kwargs)
+
+
+def test_repeat_queries_are_served_from_memory():
+    backend, cache = make_cache()
+    create_record('prds', {'user': 'a', 'product_name': "p"}, cache)
+    for _ in range(3):
+        list_records('prds', 'a', cache)
+    assert backend.selects == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_insert_invalidates_only_the_writing_user():
+    backend, cache = make_cache()
+    read_records('prds', 'a', cache)
+    read_records('prds', 'b', cache)
+    create_record('prds', {'user': 'a', 'product_name': "new"}, cache)
+    assert [record['product_name'] for record in read_records('prds', 'a', cache)] == ["new"]
+    read_records('prds', 'b', cache)
+    assert backend.selects == 3
+
+
+def test_delete_invalidates_the_table():
+    backend, cache = make_cache()
+    create_record('prds', {'user': 'a', 'product_name': "p"}, cache)
+    record_id = read_records('prds', 'a', cache)[0]['id']
+    delete_record('prds', record_id, cache)
+    assert read_records('prds', 'a', cache) == []
+
+
+def test_result_of_a_query_overlapping_a_write_is_not_cached():
+    backend, cache = make_cache()
+    started, release = threading.Event(), threading.Event()
+    select = backend.select
+
+    def slow_select(*args):
+        records = select(*args)
+        started.set()
+        release.wait(5)
+        return records
+
+    backend.select = slow_select
+    reader = threading.Thread(target=read_records, args=('prds', 'a', cache))
+    reader.start()
+    started.wait(5)
+    create_record('prds', {'user': 'b', 'product_name': "p"}, cache)
+    release.set()
+    reader.join()
+    backend.select = select
+    read_records('prds', 'a', cache)
+    assert cache.misses == 2
+
+
+def test_entries_expire():
+    backend, cache = make_cache(ttl_seconds=0)
+    read_records('prds', 'a', cache)
+    read_records('prds', 'a', cache)
+    assert backend.selects == 2
+
+
+def test_least_recently_used_users_are_evicted():
+    backend, cache = make_cache(max_entries=2)
+    for user in ('a', 'b', 'c'):
+        read_records('prds', user, cache)
+    read_records('prds', 'a', cache)
+    assert backend.selects == 4
+
+
+def test_scans_bypass_the_cache():
+    backend, cache = make_cache()
+    create_record('prds', {'user': 'a', 'product_name': "p"}, cache)
+    list(read_all_records('prds', 'a', cache))
+    assert cache.hits == cache.misses == 0
@@ -0,0 +1,106 @@
+import time
+import pytest
+from storage.resilience import (
+    CircuitBreaker, ResilientStorage, StorageTimeout, StorageUnavailable, CLOSED, OPEN, HALF_OPEN, backoff_delay,
+)
+from storage.sqlite_storage import SQLiteStorage
+from storage.supabase_client import WriteBehindBuffer, create_record, read_records
+
+
+class FlakyStorage:
+    def __init__(self):
+        self.backend = SQLiteStorage(':memory:')
+        self.failing = False
+        self.delay = 0.0
+        self.calls = 0
+
+    def __getattr__(self, name):
+        method = getattr(self.backend, name)
+
+        def call(*args):
+            self.calls += 1
+            time.sleep(self.delay)
+            if self.failing:
+                raise ConnectionError("down")
+            return method(*args)
+        return call
+
+
+def test_breaker_opens_after_consecutive_failures_and_closes_after_a_trial():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure(ValueError("one"))
+    assert breaker.state == CLOSED
+    breaker.record_failure(ValueError("two"))
+    assert breaker.state == OPEN
+    with pytest.raises(StorageUnavailable):
+        breaker.allow()
+    time.sleep(0.06)
+    breaker.allow()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(StorageUnavailable):
+        breaker.allow()
+    breaker.record_success()
+    assert breaker.snapshot()['state'] == CLOSED
+    assert breaker.snapshot()['rejected'] == 2
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure(ValueError("down"))
+    time.sleep(0.06)
+    breaker.allow()
+    breaker.record_failure(ValueError("still down"))
+    assert breaker.state == OPEN
+    assert breaker.retry_in() > 0
+
+
+def test_backoff_is_jittered_within_the_cap():
+    delays = [backoff_delay(10, base=1.0, cap=5) for _ in range(100)]
+    assert all(0 <= delay <= 5 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_reads_are_retried_and_open_the_breaker():
+    backend = FlakyStorage()
+    storage = ResilientStorage(backend, timeout=1, attempts=3, breaker=CircuitBreaker(failure_threshold=3))
+    backend.failing = True
+    with pytest.raises(ConnectionError):
+        read_records('prds', 'a', storage)
+    assert backend.calls == 3
+    with pytest.raises(StorageUnavailable):
+        read_records('prds', 'a', storage)
+    assert backend.calls == 3
+
+
+def test_inserts_are_not_retried_and_time_out():
+    backend = FlakyStorage()
+    storage = ResilientStorage(backend, timeout=0.05, attempts=3)
+    backend.delay = 0.2
+    with pytest.raises(StorageTimeout):
+        create_record('prds', {'user': 'a'}, storage)
+    assert backend.calls == 1
+
+
+def test_open_breaker_queues_created_records():
+    storage = ResilientStorage(FlakyStorage(), breaker=CircuitBreaker(failure_threshold=1, reset_seconds=60))
+    storage.breaker.record_failure(ValueError("down"))
+    queued = []
+    storage.fallback = lambda table_name, data: queued.append((table_name, data))
+    create_record('prds', {'user': 'a'}, storage)
+    assert queued == [('prds', {'user': 'a'})]
+
+
+def test_buffer_does_not_reinsert_a_batch_that_timed_out():
+    backend = FlakyStorage()
+    storage = ResilientStorage(backend, timeout=0.05)
+    buffer = WriteBehindBuffer(storage, flush_seconds=60)
+    try:
+        backend.delay = 0.2
+        buffer.add('prds', {'user': 'a'})
+        assert buffer.flush()
+        assert buffer.unconfirmed == 1
+        time.sleep(0.3)
+        assert len(backend.backend.select('prds', 'a')) == 1
+    finally:
+        backend.delay = 0.0
+        buffer.close()
@@ -0,0 +1,40 @@
+import os
+from api.result_cache import ResultCache
+
+
+def test_key_depends_on_content_and_every_parameter():
+    key = ResultCache.make_key("abc", provider="whisper", language="en")
+    assert key == ResultCache.make_key("abc", language="en", provider="whisper")
+    assert key != ResultCache.make_key("abd", provider="whisper", language="en")
+    assert key != ResultCache.make_key("abc", provider="whisper", language="de")
+
+
+def test_results_round_trip_and_survive_a_new_instance(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    key = ResultCache.make_key("abc", provider="groq")
+    assert cache.get(key) is None
+    cache.set(key, "transcript")
+    assert ResultCache(str(tmp_path)).get(key) == "transcript"
+
+
+def test_corrupt_entries_are_misses(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    key = ResultCache.make_key("abc")
+    cache.set(key, "transcript")
+    with open(cache._path(key), "w") as entry:
+        entry.write("{not json")
+    assert cache.get(key) is None
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=250)
+    keys = [ResultCache.make_key(str(i)) for i in range(3)]
+    for age, key in enumerate(keys):
+        cache.set(key, "x" * 50)
+        # Spread the access times, which coarse filesystem clocks may otherwise make equal.
+        os.utime(cache._path(key), (1000 + age, 1000 + age))
+    os.utime(cache._path(keys[0]), (2000, 2000))
+    cache.set(ResultCache.make_key("3"), "x" * 50)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == "x" * 50
+    assert cache._size <= 250
@@ -0,0 +1,89 @@
+import pytest
+from api.llm.router import ModelRouter, ModelStats, FAST_DRAFT, QUALITY_CRITIQUE
+
+GROQ = ("groq", "llama3-70b-8192")
+OPENAI = ("openai", "gpt-4o")
+ANTHROPIC = ("anthropic", "claude-3-5-sonnet-20240620")
+
+
+class FakeWrapper:
+    def __init__(self, text="ok", fail=False, chunks=("a", "b")):
+        self.text = text
+        self.fail = fail
+        self.chunks = chunks
+        self.calls = 0
+
+    def generate_text(self, prompt, max_tokens=4000, system_prompt=None, **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("down")
+        return self.text, 10, 20
+
+    def stream_text(self, prompt, max_tokens=4000, system_prompt=None, usage=None, **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("down")
+        yield from self.chunks
+        if usage is not None:
+            usage.update(input_tokens=10, output_tokens=len(self.chunks))
+
+
+def test_stats_report_p95_error_rate_and_leave_cancelled_calls_out_of_latency():
+    stats = ModelStats()
+    for latency in range(1, 21):
+        stats.record(float(latency), ok=True, cost=0.01)
+    stats.record(100.0, ok=True, cancelled=True)
+    stats.record(1.0, ok=False)
+    snapshot = stats.snapshot()
+    assert snapshot['calls'] == 22
+    assert snapshot['p95_latency'] == 19.0
+    assert snapshot['error_rate'] == pytest.approx(1 / 22)
+    assert snapshot['mean_cost'] == pytest.approx(0.01)
+    assert snapshot['cancelled'] == 1
+
+
+def test_cost_classes_rank_by_price_and_prefer_moves_to_the_front():
+    router = ModelRouter({OPENAI: FakeWrapper(), ANTHROPIC: FakeWrapper()})
+    assert router.rank(QUALITY_CRITIQUE) == [OPENAI, ANTHROPIC]
+    assert router.rank(QUALITY_CRITIQUE, prefer=ANTHROPIC) == [ANTHROPIC, OPENAI]
+
+
+def test_models_that_cannot_fit_the_prompt_are_left_out():
+    router = ModelRouter({GROQ: FakeWrapper(), OPENAI: FakeWrapper()})
+    assert router.rank(FAST_DRAFT, prompt="x" * 40000, max_tokens=1000) == [OPENAI]
+
+
+def test_generate_text_falls_back_and_flaky_models_drop_behind():
+    groq, openai = FakeWrapper(fail=True), FakeWrapper(text="from openai")
+    router = ModelRouter({GROQ: groq, OPENAI: openai})
+    text, _, _, key = router.generate_text(FAST_DRAFT, "hi")
+    assert (text, key) == ("from openai", OPENAI)
+    assert router.rank(FAST_DRAFT)[-1] == GROQ
+
+
+def test_unknown_class_is_rejected():
+    with pytest.raises(ValueError):
+        ModelRouter({OPENAI: FakeWrapper()}).model("nonexistent")
+
+
+def test_handle_streams_and_counts_usage_per_handle():
+    router = ModelRouter({OPENAI: FakeWrapper(), ANTHROPIC: FakeWrapper()})
+    handle, other = router.model(QUALITY_CRITIQUE), router.model(QUALITY_CRITIQUE)
+    assert "".join(handle.stream_text("hi")) == "ab"
+    assert handle.last_model == OPENAI
+    assert handle.usage == {'input_tokens': 10, 'output_tokens': 2}
+    assert other.usage == {'input_tokens': 0, 'output_tokens': 0}
+
+
+def test_stream_falls_back_only_before_the_first_chunk():
+    router = ModelRouter({OPENAI: FakeWrapper(fail=True), ANTHROPIC: FakeWrapper(chunks=("x",))})
+    assert [key for key, _ in router.stream_text(QUALITY_CRITIQUE, "hi")] == [ANTHROPIC]
+
+
+def test_stream_closed_after_text_counts_as_cancelled_not_failed():
+    router = ModelRouter({OPENAI: FakeWrapper(), ANTHROPIC: FakeWrapper()})
+    stream = router.stream_text(QUALITY_CRITIQUE, "hi")
+    next(stream)
+    stream.close()
+    snapshot = router.stats[OPENAI].snapshot()
+    assert (snapshot['calls'], snapshot['cancelled'], snapshot['error_rate']) == (1, 1, 0.0)
@@ -0,0 +1,53 @@
+import pytest
+from storage.search_index import SearchIndex
+from storage.sqlite_storage import SQLiteStorage
+
+KINDS = {
+    'prds': ("PRD", 'product_name', 'output'),
+    'brainstorm': ("Brainstorm", None, 'message'),
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SearchIndex(str(tmp_path / "search.db"), kinds=KINDS)
+
+
+@pytest.fixture
+def storage():
+    return SQLiteStorage(':memory:')
+
+
+def test_search_matches_titles_and_prefixes_per_user(index, storage):
+    index.add_rows('prds', storage.insert('prds', [
+        {'user': 'a', 'product_name': "Onboarding funnel", 'output': "Reduce drop-off in signup."},
+        {'user': 'a', 'product_name': "Billing", 'output': "Mentions onboarding once."},
+        {'user': 'b', 'product_name': "Onboarding", 'output': "Someone else's."},
+    ]))
+    results = index.search('a', "onboard")
+    assert [result['title'] for result in results] == ["Onboarding funnel", "Billing"]
+    assert results[0]['kind'] == "PRD" and results[0]['created_at']
+    assert index.search('a', '" OR user') == []
+
+
+def test_other_tables_and_repeated_rows_are_skipped(index, storage):
+    rows = storage.insert('prds', [{'user': 'a', 'product_name': "Search", 'output': "text"}])
+    assert index.add_rows('tracking', rows) == 0
+    assert index.add_rows('prds', rows) == 1
+    assert index.add_rows('prds', storage.select('prds', 'a')) == 0
+
+
+def test_identical_messages_are_indexed_and_removed_separately(index, storage):
+    rows = storage.insert('brainstorm', [{'user': 'a', 'is_user': True, 'message': "pricing ideas"}] * 2)
+    assert index.add_rows('brainstorm', rows) == 2
+    assert index.remove_rows('brainstorm', rows[:1]) == 1
+    assert [result['title'] for result in index.search('a', "pricing")] == ["You"]
+    assert index.remove_rows('brainstorm', rows[:1]) == 0
+
+
+def test_backfill_indexes_existing_records_once(index, storage):
+    storage.insert('prds', [{'user': 'a', 'product_name': f"Plan {i}", 'output': "roadmap"} for i in range(3)])
+    assert index.backfill('a', storage, page_size=2) == 3
+    storage.insert('prds', [{'user': 'a', 'product_name': "Later", 'output': "roadmap"}])
+    assert index.backfill('a', storage) == 0
+    assert len(index.search('a', "roadmap")) == 3
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from storage.similarity_index import SimilarityIndex, embed
+from storage.sqlite_storage import SQLiteStorage
+
+KINDS = {
+    'prds': ("PRD", 'product_name', 'output'),
+    'tracking': ("Tracking plan", 'feature_name', 'output'),
+}
+
+
+@pytest.fixture
+def storage():
+    return SQLiteStorage(':memory:')
+
+
+def test_embed_is_unit_length_and_ignores_stop_words():
+    vector = embed("Checkout conversion for the checkout page")
+    assert vector.shape == (512,) and vector.dtype == np.float32
+    assert np.linalg.norm(vector) == pytest.approx(1.0)
+    assert not embed("the and of").any()
+    assert embed("checkout page") @ embed("checkout page conversion") > embed("checkout page") @ embed("weekly newsletter")
+
+
+def test_similar_ranks_a_users_documents_and_filters_kinds(tmp_path, storage):
+    index = SimilarityIndex(str(tmp_path), kinds=KINDS)
+    index.add_rows('prds', storage.insert('prds', [
+        {'user': 'a', 'product_name': "Checkout redesign", 'output': "Faster checkout with saved cards."},
+        {'user': 'a', 'product_name': "Newsletter", 'output': "Weekly email digest."},
+        {'user': 'b', 'product_name': "Checkout redesign", 'output': "Faster checkout with saved cards."},
+    ]))
+    index.add_rows('tracking', storage.insert('tracking', [
+        {'user': 'a', 'feature_name': "Checkout events", 'output': "Track checkout steps."},
+    ]))
+    results = index.similar('a', "checkout saved cards")
+    assert [result['title'] for result in results] == ["Checkout redesign", "Checkout events"]
+    assert results[0]['score'] > results[1]['score']
+    assert [result['title'] for result in index.similar('a', "checkout", kinds=["Tracking plan"])] == ["Checkout events"]
+    assert index.similar('nobody', "checkout") == []
+
+
+def test_identical_records_are_removed_separately(tmp_path, storage):
+    index = SimilarityIndex(str(tmp_path), kinds=KINDS)
+    rows = storage.insert('prds', [{'user': 'a', 'product_name': "Search", 'output': "Search filters."}] * 2)
+    assert index.add_rows('prds', rows) == 2
+    assert index.remove_rows('prds', rows[:1]) == 1
+    assert len(index.similar('a', "search filters")) == 1
+    assert index.remove_rows('prds', rows) == 1
+    assert index.similar('a', "search filters") == []
+
+
+def test_vectors_survive_a_reopen_and_the_matrix_grows(tmp_path, storage):
+    index = SimilarityIndex(str(tmp_path), kinds=KINDS)
+    rows = storage.insert('prds', [{'user': 'a', 'product_name': f"Plan {i}", 'output': f"topic{i} roadmap"} for i in range(1100)])
+    assert index.add_rows('prds', rows) == 1100
+    reopened = SimilarityIndex(str(tmp_path), kinds=KINDS)
+    assert reopened.count == 1100
+    assert reopened.similar('a', "Plan 1050\ntopic1050 roadmap", k=1)[0]['title'] == "Plan 1050"
@@ -0,0 +1,61 @@
+import pytest
+from storage.sqlite_storage import SQLiteStorage
+from storage.supabase_client import (
+    create_record, create_records, read_records, list_records, read_all_records, read_record, delete_record,
+    save_checkpoint, read_checkpoints, delete_checkpoints,
+)
+
+
+@pytest.fixture
+def storage():
+    return SQLiteStorage(':memory:')
+
+
+def test_records_are_listed_newest_first_per_user(storage):
+    create_records('prds', [{'user': 'a', 'product_name': f"p{i}"} for i in range(3)], storage)
+    create_record('prds', {'user': 'b', 'product_name': "other"}, storage)
+    records = read_records('prds', 'a', storage)
+    assert [record['product_name'] for record in records] == ["p2", "p1", "p0"]
+    assert all('id' in record and 'created_at' in record for record in records)
+
+
+def test_keyset_pages_cover_every_record_once(storage):
+    create_records('prds', [{'user': 'a', 'product_name': f"p{i}"} for i in range(25)], storage)
+    seen, cursor = [], None
+    while True:
+        records, cursor = list_records('prds', 'a', storage, limit=10, after=cursor)
+        seen += [record['id'] for record in records]
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 25
+    assert sum(len(page) for page in read_all_records('prds', 'a', storage, page_size=7)) == 25
+
+
+def test_read_records_pages_with_limit_and_cursor(storage):
+    create_records('prds', [{'user': 'a', 'product_name': f"p{i}"} for i in range(5)], storage)
+    first = read_records('prds', 'a', storage, limit=2)
+    rest = read_records('prds', 'a', storage, after=(first[-1]['created_at'], first[-1]['id']))
+    assert [record['product_name'] for record in first + rest] == ["p4", "p3", "p2", "p1", "p0"]
+
+
+def test_columns_are_selected(storage):
+    create_record('prds', {'user': 'a', 'product_name': "p", 'output': "long"}, storage)
+    record = list_records('prds', 'a', storage, columns="id, product_name, created_at")[0][0]
+    assert set(record) == {'id', 'product_name', 'created_at'}
+    assert read_record('prds', record['id'], storage, columns="output") == {'output': "long"}
+
+
+def test_delete_reports_whether_a_record_was_removed(storage):
+    create_record('prds', {'user': 'a', 'product_name': "p"}, storage)
+    record_id = read_records('prds', 'a', storage)[0]['id']
+    assert delete_record('prds', record_id, storage) is True
+    assert delete_record('prds', record_id, storage) is False
+    assert read_record('prds', record_id, storage) is None
+
+
+def test_checkpoints_are_upserted_per_stage(storage):
+    save_checkpoint('checkpoints', 'run', 'stage', "Label", "first", storage)
+    save_checkpoint('checkpoints', 'run', 'stage', "Label", "second", storage)
+    assert read_checkpoints('checkpoints', 'run', storage) == [{'stage': 'stage', 'label': "Label", 'text': "second"}]
+    delete_checkpoints('checkpoints', 'run', storage)
+    assert read_checkpoints('checkpoints', 'run', storage) == []
@@ -0,0 +1,81 @@
+import time
+import pytest
+from storage.sqlite_storage import SQLiteStorage
+from storage.supabase_client import WriteBehindBuffer, read_records
+
+
+class FailingStorage:
+    def __init__(self, failures):
+        self.backend = SQLiteStorage(':memory:')
+        self.failures = failures
+        self.inserts = 0
+
+    def insert(self, table_name, rows):
+        self.inserts += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("down")
+        self.backend.insert(table_name, rows)
+
+
+@pytest.fixture
+def make_buffer():
+    buffers = []
+
+    def make(storage, **kwargs):
+        buffers.append(WriteBehindBuffer(storage, flush_seconds=60, **kwargs))
+        return buffers[-1]
+    yield make
+    for buffer in buffers:
+        buffer.close()
+
+
+def test_queued_records_are_written_in_one_insert_per_table(make_buffer):
+    storage = FailingStorage(failures=0)
+    buffer = make_buffer(storage)
+    for i in range(3):
+        buffer.add('prds', {'user': 'a', 'product_name': f"p{i}"})
+    buffer.add('tracking', {'user': 'a'})
+    assert buffer.pending() == 4
+    assert buffer.flush()
+    assert (storage.inserts, buffer.written, buffer.pending()) == (2, 4, 0)
+    assert [record['product_name'] for record in read_records('prds', 'a', storage.backend)] == ["p2", "p1", "p0"]
+
+
+def test_failed_batches_are_retried_in_insert_order(make_buffer):
+    storage = FailingStorage(failures=1)
+    buffer = make_buffer(storage)
+    buffer.add('prds', {'user': 'a', 'product_name': "first"})
+    assert not buffer.flush()
+    assert buffer.last_error == "down"
+    buffer.add('prds', {'user': 'a', 'product_name': "second"})
+    assert buffer.flush()
+    assert [record['product_name'] for record in read_records('prds', 'a', storage.backend)] == ["second", "first"]
+
+
+def test_rows_are_dropped_after_max_attempts(make_buffer):
+    storage = FailingStorage(failures=2)
+    buffer = make_buffer(storage, max_attempts=2)
+    buffer.add('prds', {'user': 'a'})
+    buffer.flush()
+    assert buffer.flush()
+    assert (buffer.dropped, buffer.written) == (1, 0)
+
+
+def test_a_full_batch_is_flushed_without_waiting(make_buffer):
+    storage = FailingStorage(failures=0)
+    buffer = make_buffer(storage, batch_size=2)
+    buffer.add('prds', {'user': 'a'})
+    buffer.add('prds', {'user': 'a'})
+    deadline = time.monotonic() + 2
+    while buffer.written < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert buffer.written == 2
+
+
+def test_close_writes_out_whatever_is_queued():
+    storage = FailingStorage(failures=0)
+    buffer = WriteBehindBuffer(storage, flush_seconds=60)
+    buffer.add('prds', {'user': 'a'})
+    buffer.close()
+    assert len(read_records('prds', 'a', storage.backend)) == 1
@@ -0,0 +1,251 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import streamlit as st
+
+PIPELINE_WORKERS = int(os.environ.get('PIPELINE_WORKERS', 4))
+POLL_SECONDS = 2
+JOB_TTL_SECONDS = 3600
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+class JobCancelled(Exception):
+    """Raised inside a pipeline when its run was cancelled from the page."""
+
+class Job:
+    def __init__(self, session_id, feature):
+        """
+        State of one background pipeline run, shared between the worker thread and the page.
+
+        Args:
+            session_id (str): The browser session that started the run.
+            feature (str): The feature the run belongs to, such as 'create_prd'.
+        """
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.feature = feature
+        self.status = QUEUED
+        self.label = "Waiting for a free worker..."
+        self.stages = []
+        self.notes = []
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def update(self, **fields):
+        """Set several fields at once."""
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    def add_stage(self, label, text):
+        """Record a finished stage and its output."""
+        with self._lock:
+            self.stages.append({'label': label, 'text': text})
+
+    def add_note(self, text):
+        """Record a short remark about the run."""
+        with self._lock:
+            self.notes.append(text)
+
+    def cancel(self):
+        """Ask the run to stop at the next stage boundary."""
+        self._cancel.set()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the run was cancelled."""
+        if self._cancel.is_set():
+            raise JobCancelled("The run was cancelled.")
+
+    def snapshot(self):
+        """Return a consistent copy of the job's progress for rendering."""
+        with self._lock:
+            return {
+                'id': self.id,
+                'status': self.status,
+                'label': self.label,
+                'stages': list(self.stages),
+                'notes': list(self.notes),
+                'result': self.result,
+                'error': self.error,
+                'elapsed': (self.finished or time.time()) - self.created,
+            }
+
+class JobRunner:
+    def __init__(self, max_workers=PIPELINE_WORKERS, ttl_seconds=JOB_TTL_SECONDS):
+        """
+        Process-wide pool that runs feature pipelines outside the Streamlit script thread.
+
+        Runs are keyed by browser session and feature, so a rerun or a page switch finds its run
+        again instead of starting over. Finished runs are kept for `ttl_seconds`.
+
+        Args:
+            max_workers (int): The number of pipelines that run at the same time.
+            ttl_seconds (float): How long finished runs are kept for pickup.
+        """
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, session_id, feature, func, *args, **kwargs):
+        """
+        Start `func(progress, *args, **kwargs)` in the background, replacing any finished run of the feature.
+
+        Returns:
+            Job: The new run, or the session's run of this feature that is still in progress.
+        """
+        with self._lock:
+            self._prune()
+            current = self._jobs.get((session_id, feature))
+            if current and current.status in ACTIVE:
+                return current
+            job = Job(session_id, feature)
+            self._jobs[(session_id, feature)] = job
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        try:
+            job.check_cancelled()
+            job.update(status=RUNNING, label="Starting...")
+            result = func(BackgroundProgress(job), *args, **kwargs)
+            job.update(status=DONE, result=result, label="Done", finished=time.time())
+        except JobCancelled:
+            job.update(status=CANCELLED, label="Cancelled", finished=time.time())
+        except Exception as e:
+            job.update(status=FAILED, error=str(e), label="Failed", finished=time.time())
+
+    def get(self, session_id, feature):
+        """Return the session's latest run of `feature`, or None."""
+        with self._lock:
+            return self._jobs.get((session_id, feature))
+
+    def dismiss(self, session_id, feature):
+        """Forget a finished run so the page returns to its form."""
+        with self._lock:
+            job = self._jobs.get((session_id, feature))
+            if job and job.status not in ACTIVE:
+                del self._jobs[(session_id, feature)]
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl_seconds
+        for key in [key for key, job in self._jobs.items() if job.finished and job.finished < cutoff]:
+            del self._jobs[key]
+
+class BackgroundProgress:
+    """
+    Runs pipeline stages without streaming and records them on a `Job`.
+
+    Has the same methods as `utils.streaming.StreamlitProgress`, so the same pipeline
+    function runs on the page or in the background.
+    """
+
+    def __init__(self, job):
+        self.job = job
+
+    def stage(self, llm_model, prompt, label, done_label=None, **kwargs):
+        self.job.check_cancelled()
+        self.job.update(label=label)
+        text, _, _ = llm_model.generate_text(prompt=prompt, **kwargs)
+        self.job.add_stage(done_label or label, text)
+        return text
+
+    def final(self, llm_model, prompt, **kwargs):
+        return self.stage(llm_model, prompt, label="Writing the final version...", done_label="Final version", **kwargs)
+
+    @contextmanager
+    def tasks(self, label, total, done_label=None):
+        self.job.check_cancelled()
+        self.job.update(label=label)
+        finished = []
+
+        def task_done(message):
+            finished.append(message)
+            self.job.update(label=f"{label} ({len(finished)} of {total} done)")
+
+        yield task_done
+        self.job.add_stage(done_label or label, "\n".join(f"- {message}" for message in finished))
+
+    def note(self, text):
+        self.job.add_note(text)
+
+    def show(self, text):
+        # The page renders the result once the run is picked up.
+        pass
+
+    def completed(self, label, text):
+        self.job.add_stage(label, text)
+
+    def replay(self, label, text, final=False):
+        self.job.add_stage(f"{label} (reused)", text)
+
+def session_id():
+    """Return a stable id for the current browser session."""
+    if 'session_id' not in st.session_state:
+        st.session_state['session_id'] = uuid.uuid4().hex
+    return st.session_state['session_id']
+
+@st.fragment(run_every=POLL_SECONDS)
+def _poll(job):
+    snapshot = job.snapshot()
+    if snapshot['status'] not in ACTIVE:
+        # Rerun the whole page so the result renders outside the fragment and polling stops.
+        st.rerun()
+    with st.status(f"{snapshot['label']} ({snapshot['elapsed']:.0f}s)", expanded=True):
+        for stage in snapshot['stages']:
+            st.write(f"Done: {stage['label']}")
+        for note in snapshot['notes']:
+            st.caption(note)
+    st.caption("This runs in the background. You can switch pages and come back for the result.")
+    if st.button("Cancel run", key=f"cancel_{snapshot['id']}"):
+        job.cancel()
+
+def watch_job(runner, feature, render_result):
+    """
+    Show the session's run of `feature`: live progress while it runs, the result once it is done.
+
+    Args:
+        runner (JobRunner): The process-wide job runner.
+        feature (str): The feature the run belongs to.
+        render_result (callable): Renders a finished run's result. Called with the result and
+            whether this is the first time the session sees it, for one-off work such as history updates.
+
+    Returns:
+        bool: True if a run is shown, in which case the page should not show a new run's output.
+    """
+    job = runner.get(session_id(), feature)
+    if job is None:
+        return False
+    if job.status in ACTIVE:
+        _poll(job)
+        return True
+    snapshot = job.snapshot()
+    for stage in snapshot['stages']:
+        with st.expander(stage['label']):
+            st.markdown(stage['text'])
+    for note in snapshot['notes']:
+        st.caption(note)
+    seen = st.session_state.setdefault('seen_jobs', set())
+    if snapshot['status'] == DONE:
+        render_result(snapshot['result'], snapshot['id'] not in seen)
+    elif snapshot['status'] == FAILED:
+        st.error(f"The background run failed. Error: {snapshot['error']}")
+    else:
+        st.info("The background run was cancelled.")
+    seen.add(snapshot['id'])
+    if st.button("Start over", key=f"dismiss_{snapshot['id']}"):
+        runner.dismiss(session_id(), feature)
+        st.rerun()
+    return True
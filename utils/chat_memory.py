@@ -0,0 +1,120 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+RECENT_MESSAGES = 6
+RECENT_CHARS = 12000
+SUMMARY_MAX_TOKENS = 500
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You keep a running summary of a product brainstorming conversation. Keep the ideas discussed, "
+    "decisions made, constraints mentioned and open questions. Drop greetings and repetition."
+)
+
+# Summaries are short calls; a couple of threads serve every session of the process.
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-memory")
+
+def _merge_roles(messages):
+    """Join consecutive messages of the same role, which providers reject or mishandle."""
+    merged = []
+    for message in messages:
+        if merged and merged[-1]['role'] == message['role']:
+            merged[-1] = {'role': message['role'], 'content': f"{merged[-1]['content']}\n\n{message['content']}"}
+        else:
+            merged.append({'role': message['role'], 'content': message['content']})
+    return merged
+
+class ConversationMemory:
+    def __init__(self, recent_messages=RECENT_MESSAGES, recent_chars=RECENT_CHARS, summary_max_tokens=SUMMARY_MAX_TOKENS):
+        """
+        Bounded multi-turn context for a chat: the latest messages verbatim and a rolling summary of the rest.
+
+        Older messages are folded into the summary on a background thread after each reply, so a turn
+        never waits for it. Each turn then sends at most the summary and the recent window, however
+        long the session gets.
+
+        Args:
+            recent_messages (int): The most recent messages sent verbatim.
+            recent_chars (int): The most characters of recent messages sent verbatim; the window shrinks to fit.
+            summary_max_tokens (int): The length limit of the summary.
+        """
+        self.recent_messages = recent_messages
+        self.recent_chars = recent_chars
+        self.summary_max_tokens = summary_max_tokens
+        self.summary = ""
+        self.covered = 0
+        self.last_error = None
+        self._future = None
+        self._lock = threading.Lock()
+
+    def _window_start(self, messages):
+        start = max(0, len(messages) - self.recent_messages)
+        # Always keep the latest exchange, even if it alone is over the character budget.
+        while start < len(messages) - 2 and sum(len(message['content']) for message in messages[start:]) > self.recent_chars:
+            start += 1
+        # Start the window on a user turn, as the providers expect.
+        while start < len(messages) and messages[start]['role'] != 'user':
+            start += 1
+        return start
+
+    def _collect(self):
+        with self._lock:
+            future = self._future
+            if future is None or not future.done():
+                return
+            self._future = None
+        try:
+            self.summary, self.covered = future.result()
+        except Exception as e:
+            # The messages stay uncovered and go into the next update.
+            self.last_error = str(e)
+
+    def history(self, messages):
+        """
+        Build the earlier turns to send along with a new prompt.
+
+        Args:
+            messages (list of dict): The conversation so far, without the new prompt.
+
+        Returns:
+            list of dict: The summary as an opening exchange, if there is one, followed by the recent messages.
+        """
+        self._collect()
+        start = self._window_start(messages)
+        history = []
+        if self.summary:
+            history.append({'role': 'user', 'content': f"Summary of our conversation so far:\n{self.summary}"})
+            history.append({'role': 'assistant', 'content': "Understood. I'll build on that."})
+        # Messages that left the window while their summary update is still running are sent verbatim.
+        history.extend(_merge_roles(messages[min(self.covered, start):]))
+        # A user turn that never got its reply would sit next to the new prompt.
+        while history and history[-1]['role'] == 'user':
+            history.pop()
+        return history
+
+    def refresh(self, llm_model, messages):
+        """
+        Fold the messages that left the recent window into the summary, in the background.
+
+        Does nothing while an earlier update is still running; the next call picks up what it left.
+
+        Args:
+            llm_model: The model handle used to write the summary.
+            messages (list of dict): The conversation so far.
+        """
+        self._collect()
+        start = self._window_start(messages)
+        with self._lock:
+            if self._future is not None or start <= self.covered:
+                return
+            batch = list(messages[self.covered:start])
+            self._future = _executor.submit(self._summarize, llm_model, self.summary, batch, start)
+
+    def _summarize(self, llm_model, summary, batch, covered):
+        transcript = "\n\n".join(f"{message['role'].capitalize()}: {message['content']}" for message in batch)
+        text, _, _ = llm_model.generate_text(
+            prompt=f"Current summary:\n{summary or '(empty)'}\n\nNew messages:\n{transcript}\n\n"
+                   f"Respond ONLY with the updated summary, in at most {self.summary_max_tokens // 2} words.",
+            max_tokens=self.summary_max_tokens,
+            temperature=0.2
+        )
+        return text.strip(), covered
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from storage.supabase_client import save_checkpoint, read_checkpoints, delete_checkpoints
+from storage.backends import table_name
+
+checkpoint_table = table_name('SUPABASE_CHECKPOINT_TABLE')
+
+MAX_RUNS_IN_MEMORY = 200
+
+def make_run_id(pipeline, user, inputs):
+    """
+    Derive a run id from everything that determines a pipeline's output.
+
+    The same user running the same pipeline on the same inputs and options gets the same id,
+    which is what lets a retry or a rerun pick up the stages that already finished.
+
+    Args:
+        pipeline (str): The pipeline name, such as 'create_prd'.
+        user (str): The email of the user.
+        inputs (dict): The pipeline inputs and options. Values must be JSON-serialisable or have a stable str().
+
+    Returns:
+        str: A hex run id.
+    """
+    payload = json.dumps({'pipeline': pipeline, 'user': user, 'inputs': inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def run_checkpoint(store, pipeline, user, options, reuse=True):
+    """
+    Prepare the checkpoint of a pipeline run.
+
+    Args:
+        store (CheckpointStore): The checkpoint store.
+        pipeline (str): The pipeline name, such as 'create_prd'.
+        user (str): The email of the user.
+        options (dict): The pipeline options; the router is left out of the run id.
+        reuse (bool): Whether stages completed by an earlier run with the same inputs are reused.
+
+    Returns:
+        tuple: (store, run_id), as taken by `utils.pipeline.run_pipeline`.
+    """
+    run_id = make_run_id(pipeline, user, {name: value for name, value in options.items() if name != 'router'})
+    if not reuse:
+        store.discard(run_id)
+    return store, run_id
+
+class CheckpointStore:
+    def __init__(self, supabase=None, table_name=checkpoint_table, max_runs=MAX_RUNS_IN_MEMORY):
+        """
+        Stage outputs per run, kept in memory and, when a checkpoint table is configured, in storage.
+
+        Memory serves retries within the process; the table lets runs resume after a restart.
+
+        Args:
+            supabase: The storage backend, or None for memory only.
+            table_name (str): The checkpoint table. Defaults to SUPABASE_CHECKPOINT_TABLE; unset means memory only.
+            max_runs (int): The most runs kept in memory; the least recently used go first.
+        """
+        self.supabase = supabase if table_name else None
+        self.table_name = table_name
+        self.max_runs = max_runs
+        self.last_error = None
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, run_id):
+        """
+        Return the checkpoints of a run.
+
+        Returns:
+            dict: {'label', 'text'} per stage key.
+        """
+        with self._lock:
+            if run_id in self._runs:
+                self._runs.move_to_end(run_id)
+                return dict(self._runs[run_id])
+        checkpoints = {}
+        if self.supabase:
+            try:
+                for row in read_checkpoints(self.table_name, run_id, self.supabase):
+                    checkpoints[row['stage']] = {'label': row['label'], 'text': row['text']}
+            except Exception as e:
+                # A storage outage should cost a rerun of the stages, not the run itself.
+                self.last_error = str(e)
+        with self._lock:
+            self._remember(run_id).update(checkpoints)
+        return checkpoints
+
+    def save(self, run_id, stage, label, text):
+        """
+        Record the output of a finished stage.
+
+        Args:
+            run_id (str): The id of the run.
+            stage (str): The stage key, which changes whenever the stage's inputs change.
+            label (str): The label of the stage.
+            text (str): The stage output.
+        """
+        with self._lock:
+            self._remember(run_id)[stage] = {'label': label, 'text': text}
+        if self.supabase:
+            try:
+                save_checkpoint(self.table_name, run_id, stage, label, text, self.supabase)
+            except Exception as e:
+                self.last_error = str(e)
+
+    def discard(self, run_id):
+        """Drop every checkpoint of a run, so the next run starts fresh."""
+        with self._lock:
+            self._runs.pop(run_id, None)
+        if self.supabase:
+            try:
+                delete_checkpoints(self.table_name, run_id, self.supabase)
+            except Exception as e:
+                self.last_error = str(e)
+
+    def _remember(self, run_id):
+        if run_id not in self._runs:
+            self._runs[run_id] = {}
+            while len(self._runs) > self.max_runs:
+                self._runs.popitem(last=False)
+        self._runs.move_to_end(run_id)
+        return self._runs[run_id]
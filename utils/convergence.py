@@ -0,0 +1,136 @@
+import re
+import time
+from difflib import SequenceMatcher
+
+VERDICT_INSTRUCTIONS = (
+    "End your critique with a final line that reads exactly 'VERDICT: APPROVED' if the document only needs "
+    "cosmetic changes, or 'VERDICT: REVISE' if it still has substantive issues."
+)
+
+def draft_similarity(previous, current):
+    """
+    Measure how much of a draft survived a revision.
+
+    Args:
+        previous (str): The draft before the revision.
+        current (str): The draft after the revision.
+
+    Returns:
+        float: Word-level similarity between 0 (nothing in common) and 1 (identical).
+    """
+    return SequenceMatcher(None, previous.split(), current.split(), autojunk=False).ratio()
+
+def critique_approves(critique):
+    """
+    Check whether a critique asked for no substantive changes.
+
+    A merged panel critique holds one verdict per reviewer, so every verdict has to approve.
+
+    Args:
+        critique (str): The critique, expected to end with the line described in VERDICT_INSTRUCTIONS.
+
+    Returns:
+        bool: True if the critique holds at least one verdict and all of them approve.
+    """
+    verdicts = re.findall(r'VERDICT:\s*\**\s*(APPROVED|REVISE)', critique, flags=re.IGNORECASE)
+    return bool(verdicts) and all(verdict.upper() == "APPROVED" for verdict in verdicts)
+
+class ConvergenceMonitor:
+    def __init__(self, max_rounds, similarity_threshold=0.95, usage_sources=None):
+        """
+        Decide when a critique loop has converged and account for the rounds it skipped.
+
+        Args:
+            max_rounds (int): The most critique rounds the loop may run.
+            similarity_threshold (float): Stop once a revision keeps at least this share of the previous draft.
+            usage_sources (list of dict): Cumulative token counters, such as `RoutedModel.usage`, covering every call of the loop.
+        """
+        self.max_rounds = max_rounds
+        self.similarity_threshold = similarity_threshold
+        self.usage_sources = usage_sources or []
+        self.rounds = 0
+        self.reason = None
+        self.similarities = []
+        self._round_seconds = []
+        self._round_tokens = []
+        self._round_start = None
+        self._tokens_at_start = 0
+
+    def _tokens(self):
+        return sum(usage.get("input_tokens", 0) + usage.get("output_tokens", 0) for usage in self.usage_sources)
+
+    def start_round(self):
+        """Mark the start of a critique round."""
+        self._round_start = time.perf_counter()
+        self._tokens_at_start = self._tokens()
+
+    def _end_round(self, reason=None):
+        self.rounds += 1
+        self._round_seconds.append(time.perf_counter() - self._round_start)
+        self._round_tokens.append(self._tokens() - self._tokens_at_start)
+        if reason:
+            self.reason = reason
+        return reason is not None
+
+    def critique_done(self, critique):
+        """
+        Check the critique of the current round.
+
+        Returns:
+            bool: True if the critique approved the draft, which ends the loop before the revision.
+        """
+        if critique_approves(critique):
+            return self._end_round("the review found no substantive issues")
+        return False
+
+    def revision_done(self, previous, current, critique=None):
+        """
+        Close the current round after its revision.
+
+        Args:
+            previous (str): The draft the round started from.
+            current (str): The revised draft.
+            critique (str): The round's critique, for loops where critique and revision are one step.
+
+        Returns:
+            bool: True if the drafts converged or the critique approved, and the loop should stop.
+        """
+        similarity = draft_similarity(previous, current)
+        self.similarities.append(similarity)
+        if critique is not None and critique_approves(critique):
+            return self._end_round("the review found no substantive issues")
+        if similarity >= self.similarity_threshold:
+            return self._end_round(f"the revision kept {similarity:.0%} of the previous draft")
+        return self._end_round()
+
+    def is_last_round(self, round):
+        """Whether `round` (zero-based) is the last one the round limit allows."""
+        return round >= self.max_rounds - 1
+
+    def summary(self):
+        """
+        Report how the loop ended and roughly what stopping early saved.
+
+        Savings are estimated from the average time and tokens of the rounds that ran.
+
+        Returns:
+            dict: Rounds run and skipped, the stop reason, seconds and tokens saved.
+        """
+        skipped = max(0, self.max_rounds - self.rounds)
+        average_seconds = sum(self._round_seconds) / len(self._round_seconds) if self._round_seconds else 0.0
+        average_tokens = sum(self._round_tokens) / len(self._round_tokens) if self._round_tokens else 0
+        return {
+            'rounds': self.rounds,
+            'max_rounds': self.max_rounds,
+            'skipped_rounds': skipped,
+            'reason': self.reason or "the round limit was reached",
+            'seconds_saved': skipped * average_seconds,
+            'tokens_saved': int(skipped * average_tokens),
+        }
+
+def format_summary(summary):
+    """Render a convergence summary as a one-line caption."""
+    text = f"Stopped after {summary['rounds']} of {summary['max_rounds']} critique rounds: {summary['reason']}."
+    if summary['skipped_rounds']:
+        text += f" Saved about {summary['seconds_saved']:.0f}s and {summary['tokens_saved']:,} tokens."
+    return text
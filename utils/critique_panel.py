@@ -0,0 +1,130 @@
+import re
+from difflib import SequenceMatcher
+from api.llm.router import QUALITY_CRITIQUE
+from utils.pipeline import Stage
+
+DUPLICATE_RATIO = 0.75
+
+def build_critics(system_prompt_director, system_prompt_engineering_critic=None, system_prompt_data_critic=None):
+    """
+    Assemble the reviewers of the critique panel.
+
+    Args:
+        system_prompt_director (str): The system prompt of the product reviewer.
+        system_prompt_engineering_critic (str): The system prompt of the engineering reviewer, if any.
+        system_prompt_data_critic (str): The system prompt of the data reviewer, if any.
+
+    Returns:
+        list of dict: Critics with 'name' and 'system_prompt' keys.
+    """
+    critics = [{'name': "Product", 'system_prompt': system_prompt_director}]
+    if system_prompt_engineering_critic:
+        critics.append({'name': "Engineering", 'system_prompt': system_prompt_engineering_critic})
+    if system_prompt_data_critic:
+        critics.append({'name': "Data", 'system_prompt': system_prompt_data_critic})
+    return critics
+
+def panel_stages(router, critics, prompt, name="critique", label="Panel reviewing...", done_label="Panel review", after=(), skip_if=None):
+    """
+    Declare the critique panel as pipeline stages: one review per critic, all running at the same time,
+    and a merge step that combines them.
+
+    Critic i prefers the i-th ranked model of the QUALITY_CRITIQUE class, so with two providers
+    configured the reviews come from both. The router still falls back if a provider fails, and a
+    reviewer that fails anyway is left out of the merged critique rather than ending the run.
+
+    Args:
+        router: The model router.
+        critics (list of dict): Critics with 'name' and 'system_prompt'.
+        prompt (callable): Builds the critique prompt from the pipeline context.
+        name (str): The name of the merged critique in the context.
+        label (str): Shown while the reviews run.
+        done_label (str): Shown once the merged critique is ready.
+        after (tuple of str): The stages the reviews depend on.
+        skip_if (callable): Skips the whole panel when true, see `Stage`.
+
+    Returns:
+        list of Stage: The review stages followed by the merge stage.
+    """
+    ranked = router.rank(QUALITY_CRITIQUE)
+    reviews = [
+        Stage(
+            f"{name}.{critic['name'].lower()}",
+            QUALITY_CRITIQUE,
+            prompt,
+            system_prompt=critic['system_prompt'],
+            after=after,
+            label=f"{label} ({critic['name']})",
+            done_label=f"{critic['name']} review",
+            prefer=ranked[index % len(ranked)] if ranked else None,
+            skip_if=skip_if,
+            optional=True,
+        )
+        for index, critic in enumerate(critics)
+    ]
+
+    def merge(progress, context, model):
+        results = [{'name': critic['name'], 'text': context[review.name]} for critic, review in zip(critics, reviews) if review.name in context]
+        missing = [critic['name'] for critic, review in zip(critics, reviews) if review.name not in context]
+        if not results:
+            raise RuntimeError("Every reviewer of the critique panel failed.")
+        if missing:
+            progress.note(f"The critique leaves out the {', '.join(missing)} review, which failed.")
+        critique, dropped = merge_critiques(results)
+        if dropped:
+            progress.note(f"Dropped {dropped} points raised by more than one reviewer.")
+        progress.completed(done_label, critique)
+        return critique
+
+    return reviews + [Stage(name, run=merge, after=[review.name for review in reviews], label=done_label)]
+
+def _points(text):
+    """Split a critique into its individual points: list items, or paragraphs when there are none."""
+    points, current = [], []
+    for line in text.splitlines():
+        if re.match(r'^\s*(?:[-*+]|\d+[.)])\s+', line):
+            if current:
+                points.append("\n".join(current))
+            current = [line.rstrip()]
+        elif re.match(r'^\s*#+\s', line) or not line.strip():
+            # Headings and blank lines close the current point; headings are dropped since the merged
+            # critique groups points by reviewer instead.
+            if current:
+                points.append("\n".join(current))
+            current = []
+        else:
+            current.append(line.rstrip())
+    if current:
+        points.append("\n".join(current))
+    return [point for point in points if point.strip()]
+
+def _normalize(point):
+    point = re.sub(r'^\s*(?:[-*+]|\d+[.)])\s+', '', point)
+    return " ".join(re.sub(r'[*_`#>]', '', point).lower().split())
+
+def merge_critiques(results, duplicate_ratio=DUPLICATE_RATIO):
+    """
+    Merge the panel's reviews into one critique, dropping points an earlier reviewer already made.
+
+    Args:
+        results (list of dict): Reviews with 'name' and 'text', in panel order.
+        duplicate_ratio (float): Similarity above which two points count as the same.
+
+    Returns:
+        tuple: The merged critique in Markdown and the number of duplicate points dropped.
+    """
+    kept, sections, dropped = [], [], 0
+    for result in results:
+        unique = []
+        for point in _points(result['text']):
+            normalized = _normalize(point)
+            if not normalized:
+                continue
+            if any(SequenceMatcher(None, normalized, seen).ratio() >= duplicate_ratio for seen in kept):
+                dropped += 1
+                continue
+            kept.append(normalized)
+            unique.append("- " + re.sub(r'^\s*(?:[-*+]|\d+[.)])\s+', '', point))
+        if unique:
+            sections.append(f"### {result['name']} review\n" + "\n".join(unique))
+    return "\n\n".join(sections), dropped
@@ -1,24 +1,38 @@
 from api.llm.openai_llm import OpenAIWrapper
 from api.llm.groq_llm import GroqWrapper
 from api.llm.anthropic_llm import AnthropicWrapper
+from api.llm.router import ModelRouter
 import os
 import openai
 import streamlit as st
 
 def build_models():
     """
-    Builds and initializes the GPT-3.5-turbo and GPT-4-turbo models.
+    Builds the model router over every provider that has an API key configured.
+
+    Features ask the router for a model class (fast draft, quality draft, quality critique)
+    instead of a specific wrapper; the router picks the cheapest or fastest model per call.
+
     Returns:
-        tuple: A tuple containing the initialized GPT-3.5-turbo and GPT-4-turbo models.
+        ModelRouter: The router over the available Claude, GPT-4o and Groq models.
     Raises:
-        ValueError: If the OPENAI_API_KEY environment variable is not set.
+        ValueError: If none of the provider API keys are set.
     """
-    gpt4_model = OpenAIWrapper(model ="gpt-4o")
-    groq_model = GroqWrapper(model = "llama3-70b-8192")
-    claude_model = AnthropicWrapper(model="claude-3-5-sonnet-20240620")
-
-
-    return claude_model, gpt4_model
+    wrappers = [
+        (("anthropic", "claude-3-5-sonnet-20240620"), AnthropicWrapper),
+        (("openai", "gpt-4o"), OpenAIWrapper),
+        (("groq", "llama3-70b-8192"), GroqWrapper),
+    ]
+    models = {}
+    for (provider, model), wrapper_class in wrappers:
+        try:
+            models[(provider, model)] = wrapper_class(model=model)
+        except ValueError:
+            # Missing API key, the router simply skips this provider.
+            continue
+    if not models:
+        raise ValueError("Set at least one of ANTHROPIC_API_KEY, OPENAI_API_KEY or GROQ_API_KEY.")
+    return ModelRouter(models)
 
 def transcribe_audio(audio_path):
     """Transcribe the downloaded audio file using OpenAI's Whisper model."""
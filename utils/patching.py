@@ -0,0 +1,100 @@
+import json
+import re
+
+EDIT_INSTRUCTIONS = (
+    "Respond ONLY with a JSON object of the form "
+    "{\"critique\": \"<your critique in Markdown>\", \"edits\": [{\"find\": \"<text copied from the document>\", \"replace\": \"<improved text>\"}]}. "
+    "Every find must be copied verbatim from the document and match exactly one place in it. Keep each find short, "
+    "a sentence or a paragraph. To add new content, use the passage it should follow as find and repeat that passage in "
+    "replace followed by the new content. Return an empty edits list if the document needs no changes."
+)
+
+class PatchError(ValueError):
+    """Raised when a critique's edits cannot be parsed or applied cleanly."""
+
+def parse_edits(text):
+    """
+    Parse a critique response holding targeted edits.
+
+    Args:
+        text (str): The model response, expected to contain the JSON object described in EDIT_INSTRUCTIONS.
+
+    Returns:
+        tuple: The critique (str) and the list of edits, each a dict with 'find' and 'replace'.
+
+    Raises:
+        PatchError: If the response holds no valid edit object.
+    """
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end <= start:
+        raise PatchError("the response holds no JSON object")
+    try:
+        payload = json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise PatchError(f"the edits are not valid JSON ({e.msg})")
+    edits = payload.get('edits') if isinstance(payload, dict) else None
+    if not isinstance(edits, list):
+        raise PatchError("the response has no edits list")
+    for number, edit in enumerate(edits, start=1):
+        if not isinstance(edit, dict) or not isinstance(edit.get('find'), str) or not isinstance(edit.get('replace'), str):
+            raise PatchError(f"edit {number} needs string 'find' and 'replace' fields")
+        if not edit['find'].strip():
+            raise PatchError(f"edit {number} has an empty 'find'")
+    return str(payload.get('critique', '')), edits
+
+def _locate(document, find):
+    count = document.count(find)
+    if count == 1:
+        start = document.index(find)
+        return start, start + len(find)
+    if count > 1:
+        return None, count
+    # Models often reflow whitespace when quoting, so retry ignoring whitespace differences.
+    pattern = r'\s+'.join(re.escape(word) for word in find.split())
+    matches = list(re.finditer(pattern, document))
+    if len(matches) == 1:
+        return matches[0].start(), matches[0].end()
+    return None, len(matches)
+
+def apply_edits(document, edits, min_length_ratio=0.5):
+    """
+    Apply targeted edits to a document, all or nothing.
+
+    Args:
+        document (str): The current draft.
+        edits (list of dict): Edits with 'find' and 'replace', applied in order.
+        min_length_ratio (float): Reject the result if it shrinks below this share of the original,
+            which usually means an edit swallowed far more text than intended.
+
+    Returns:
+        str: The revised document.
+
+    Raises:
+        PatchError: If any edit matches nowhere or in more than one place, or the result fails validation.
+    """
+    revised = document
+    for number, edit in enumerate(edits, start=1):
+        start, end = _locate(revised, edit['find'])
+        if start is None:
+            problem = "matches nowhere" if end == 0 else f"matches {end} places"
+            raise PatchError(f"edit {number} {problem} in the document")
+        revised = revised[:start] + edit['replace'] + revised[end:]
+    if len(revised.strip()) < min_length_ratio * len(document.strip()):
+        raise PatchError("the edits removed too much of the document")
+    return revised
+
+def critique_text(response):
+    """
+    Extract the human-readable critique from a patch-mode response, falling back to the raw text.
+
+    Args:
+        response (str): The model response.
+
+    Returns:
+        str: The critique to feed a full rewrite.
+    """
+    try:
+        critique, _ = parse_edits(response)
+        return critique or response
+    except PatchError:
+        return response
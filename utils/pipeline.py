@@ -0,0 +1,312 @@
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.convergence import ConvergenceMonitor, format_summary
+
+MAX_PARALLEL_STAGES = 8
+
+class Stage:
+    def __init__(self, name, model_class=None, prompt=None, system_prompt=None, temperature=None, after=(),
+                 label=None, done_label=None, final=False, prefer=None, max_tokens=4000, run=None, skip_if=None,
+                 optional=False):
+        """
+        One declared step of a pipeline.
+
+        Args:
+            name (str): Unique name within the run; the stage's output is stored under it in the context.
+            model_class (str): The model class the router picks this stage's model from.
+            prompt (str or callable): The prompt, or a function building it from the context.
+            system_prompt (str): The system prompt of this stage's model handle.
+            temperature (float): The sampling temperature. None keeps the wrapper default.
+            after (tuple of str): The stages whose output this one needs. Stages whose dependencies
+                are all done run at the same time.
+            label (str): Shown while the stage runs. Defaults to the name.
+            done_label (str): Shown once the stage is done. Defaults to the label.
+            final (bool): Whether this is the document the user reads, which renders straight into the page.
+            prefer (tuple): A (provider, model) key the router tries first, see `ModelRouter.rank`.
+            max_tokens (int): The maximum number of tokens to generate.
+            run (callable): A custom step instead of a single model call, called on the script thread as
+                `run(progress, context, model)`, where `model(model_class, system_prompt=None)` returns a
+                tracked model handle. Returns the output, or a dict of several named outputs.
+            skip_if (callable): Skip this stage, and every stage that depends on it, when `skip_if(context)` is true.
+            optional (bool): A failure of this stage is noted instead of ending the run. The stages that
+                depend on it still run, without its entry in the context.
+        """
+        if run is None and (model_class is None or prompt is None):
+            raise ValueError(f"Stage '{name}' needs a model class and a prompt, or a custom run function.")
+        self.name = name
+        self.model_class = model_class
+        self.prompt = prompt
+        self.system_prompt = system_prompt
+        self.temperature = temperature
+        self.after = tuple(after)
+        self.label = label or name
+        self.done_label = done_label or self.label
+        self.final = final
+        self.prefer = prefer
+        self.max_tokens = max_tokens
+        self.run = run
+        self.skip_if = skip_if
+        self.optional = optional
+
+    def build_prompt(self, context):
+        """Return the prompt for this run."""
+        return self.prompt(context) if callable(self.prompt) else self.prompt
+
+    def call_kwargs(self):
+        kwargs = {'max_tokens': self.max_tokens}
+        if self.temperature is not None:
+            kwargs['temperature'] = self.temperature
+        return kwargs
+
+class PipelineMetrics:
+    def __init__(self):
+        """Latency, model and token usage of every stage of a run."""
+        self.stages = []
+        self.usage = {'input_tokens': 0, 'output_tokens': 0}
+
+    def record(self, name, model, seconds, input_tokens, output_tokens, reused=False):
+        """Record a finished stage."""
+        self.stages.append({
+            'stage': name,
+            'model': f"{model[0]}/{model[1]}" if model else None,
+            'seconds': round(seconds, 2),
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'reused': reused,
+        })
+        self.usage['input_tokens'] += input_tokens
+        self.usage['output_tokens'] += output_tokens
+
+    def summary(self):
+        """Summarise the run in one line."""
+        ran = [stage for stage in self.stages if not stage['reused']]
+        reused = len(self.stages) - len(ran)
+        tokens = self.usage['input_tokens'] + self.usage['output_tokens']
+        text = f"{len(ran)} stages, {sum(stage['seconds'] for stage in ran):.0f}s of model time, {tokens:,} tokens."
+        if ran:
+            slowest = max(ran, key=lambda stage: stage['seconds'])
+            text += f" Slowest: {slowest['stage']} ({slowest['seconds']:.0f}s on {slowest['model'] or 'several models'})."
+        if reused:
+            text += f" Reused {reused} completed stages from checkpoints."
+        return text
+
+class _TrackedModels:
+    """Hands out model handles to a custom stage and adds up what they used."""
+
+    def __init__(self, router):
+        self.router = router
+        self.handles = []
+
+    def __call__(self, model_class, system_prompt=None, prefer=None):
+        handle = self.router.model(model_class, system_prompt=system_prompt, prefer=prefer)
+        self.handles.append(handle)
+        return handle
+
+    def usage(self):
+        return (
+            sum(handle.usage['input_tokens'] for handle in self.handles),
+            sum(handle.usage['output_tokens'] for handle in self.handles),
+        )
+
+    def last_model(self):
+        models = {handle.last_model for handle in self.handles if handle.last_model}
+        return models.pop() if len(models) == 1 else None
+
+def _checkpoint_key(stage, context, prompt):
+    # Content-addressed: a stage is reused only if everything it was run with is unchanged.
+    if stage.run is None:
+        inputs = [stage.name, stage.model_class, stage.system_prompt, prompt, stage.temperature, stage.max_tokens]
+    else:
+        inputs = [stage.name, [context.get(name) for name in stage.after]]
+    return hashlib.sha256(json.dumps(inputs, default=str).encode('utf-8')).hexdigest()
+
+def _outputs(stage, output):
+    return output if isinstance(output, dict) else {stage.name: output}
+
+def _display_text(stage, outputs):
+    return outputs.get(stage.name) or "\n\n".join(str(value) for value in outputs.values())
+
+def run_pipeline(progress, router, stages, context=None, metrics=None, checkpoint=None, max_workers=MAX_PARALLEL_STAGES):
+    """
+    Run declared stages in dependency order.
+
+    Stages whose dependencies are done form a wave. A wave of one model stage streams to the page
+    through `progress`; larger waves run their model calls concurrently on worker threads. Custom
+    stages always run on the script thread. With a checkpoint, stages whose inputs are unchanged
+    since an earlier run are replayed instead of called again.
+
+    Args:
+        progress: Where stages are reported, see `utils.streaming.StreamlitProgress`.
+        router: The model router.
+        stages (list of Stage): The stages to run.
+        context (dict): Outputs already available, such as the draft of an earlier step.
+        metrics (PipelineMetrics): Collects per-stage latency and tokens. A new one is used if omitted.
+        checkpoint (tuple): (CheckpointStore, run_id), or None to run without checkpoints.
+        max_workers (int): The most model calls of a wave that run at the same time.
+
+    Returns:
+        dict: The context with the output of every stage that ran. Skipped and failed optional stages have no entry.
+
+    Raises:
+        ValueError: If stage names repeat or a stage depends on one that does not exist.
+        RuntimeError: If a concurrent stage that is not optional fails; stages that finished are still checkpointed.
+    """
+    context = dict(context or {})
+    metrics = metrics if metrics is not None else PipelineMetrics()
+    store, run_id = checkpoint or (None, None)
+    saved = store.load(run_id) if store else {}
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("Stage names must be unique within a pipeline.")
+    skipped, failed = set(), set()
+    pending = list(stages)
+
+    def fail(stage, error):
+        if not stage.optional:
+            raise error
+        failed.add(stage.name)
+        progress.note(f"{error}. Continuing without it.")
+
+    def reuse(stage, key):
+        outputs = json.loads(saved[key]['text'])
+        progress.replay(stage.done_label, _display_text(stage, outputs), final=stage.final)
+        metrics.record(stage.name, None, 0.0, 0, 0, reused=True)
+        context.update(outputs)
+
+    def finish(stage, key, outputs):
+        context.update(outputs)
+        if store:
+            store.save(run_id, key, stage.done_label, json.dumps(outputs))
+
+    def run_inline(stage, prompt, key):
+        try:
+            run_stage(stage, prompt, key)
+        except Exception as e:
+            if not stage.optional:
+                raise
+            fail(stage, RuntimeError(f"Stage '{stage.label}' failed: {e}"))
+
+    def run_stage(stage, prompt, key):
+        start = time.perf_counter()
+        if stage.run is not None:
+            models = _TrackedModels(router)
+            outputs = _outputs(stage, stage.run(progress, context, models))
+            input_tokens, output_tokens = models.usage()
+            model = models.last_model()
+        else:
+            handle = router.model(stage.model_class, system_prompt=stage.system_prompt, prefer=stage.prefer)
+            if stage.final:
+                text = progress.final(handle, prompt=prompt, **stage.call_kwargs())
+            else:
+                text = progress.stage(handle, prompt=prompt, label=stage.label, done_label=stage.done_label, **stage.call_kwargs())
+            outputs = {stage.name: text}
+            input_tokens, output_tokens = handle.usage['input_tokens'], handle.usage['output_tokens']
+            model = handle.last_model
+        metrics.record(stage.name, model, time.perf_counter() - start, input_tokens, output_tokens)
+        finish(stage, key, outputs)
+
+    def call(stage, prompt):
+        handle = router.model(stage.model_class, system_prompt=stage.system_prompt, prefer=stage.prefer)
+        start = time.perf_counter()
+        text, input_tokens, output_tokens = handle.generate_text(prompt=prompt, **stage.call_kwargs())
+        return text, input_tokens, output_tokens, handle.last_model, time.perf_counter() - start
+
+    def run_concurrently(wave):
+        results, errors = {}, []
+        with progress.tasks(f"Running {len(wave)} stages in parallel...", len(wave), done_label=f"{len(wave)} stages done") as task_done:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(wave)))) as executor:
+                futures = {executor.submit(call, stage, prompt): (stage, key) for stage, prompt, key in wave}
+                for future in as_completed(futures):
+                    stage, key = futures[future]
+                    try:
+                        results[stage.name] = future.result()
+                    except Exception as e:
+                        errors.append((stage, RuntimeError(f"Stage '{stage.label}' failed: {e}")))
+                        continue
+                    text, input_tokens, output_tokens, model, seconds = results[stage.name]
+                    metrics.record(stage.name, model, seconds, input_tokens, output_tokens)
+                    finish(stage, key, {stage.name: text})
+                    task_done(f"Done: {stage.done_label}")
+        for stage, _, _ in wave:
+            if stage.name in results:
+                text = results[stage.name][0]
+                if stage.final:
+                    progress.show(text)
+                else:
+                    progress.completed(stage.done_label, text)
+        for stage, error in errors:
+            fail(stage, error)
+
+    while pending:
+        ready = [stage for stage in pending if all(name in context or name in skipped or name in failed for name in stage.after)]
+        if not ready:
+            missing = sorted({name for stage in pending for name in stage.after if name not in names and name not in context})
+            raise ValueError(f"Stages depend on unknown stages: {', '.join(missing) or 'a dependency cycle'}.")
+        pending = [stage for stage in pending if stage not in ready]
+        wave = []
+        for stage in ready:
+            if any(name in skipped for name in stage.after) or (stage.skip_if and stage.skip_if(context)):
+                skipped.add(stage.name)
+                continue
+            prompt = stage.build_prompt(context) if stage.run is None else None
+            key = _checkpoint_key(stage, context, prompt)
+            if key in saved:
+                reuse(stage, key)
+            elif stage.run is not None:
+                run_inline(stage, prompt, key)
+            else:
+                wave.append((stage, prompt, key))
+        if len(wave) == 1:
+            run_inline(*wave[0])
+        elif wave:
+            run_concurrently(wave)
+    return context
+
+def run_critique_rounds(progress, router, document, round_stages, max_rounds, metrics, checkpoint=None):
+    """
+    Critique and revise a document round after round until the critique approves it, the drafts
+    converge or the round limit is reached.
+
+    Every round is its own pipeline run with the current draft in the context as 'document'.
+
+    Args:
+        progress: Where stages are reported.
+        router: The model router.
+        document (str): The first draft.
+        round_stages (callable): `round_stages(round, final, critique, revised)` returns the stages of a
+            zero-based round. They must store the critique under `critique` and the new draft under
+            `revised`, and skip the revision when the critique approves.
+        max_rounds (int): The most critique rounds to run.
+        metrics (PipelineMetrics): Collects the stages of every round; also the token source of the convergence summary.
+        checkpoint (tuple): (CheckpointStore, run_id), or None.
+
+    Returns:
+        tuple: The final document and the history entries of the rounds.
+    """
+    monitor = ConvergenceMonitor(max_rounds, usage_sources=[metrics.usage])
+    history, shown = [], False
+    for round in range(max_rounds):
+        monitor.start_round()
+        final = monitor.is_last_round(round)
+        critique, revised = f"round{round+1}.critique", f"round{round+1}.revised"
+        history.append({'role': 'user', 'content': document})
+        context = run_pipeline(
+            progress, router, round_stages(round, final, critique, revised),
+            context={'document': document}, metrics=metrics, checkpoint=checkpoint
+        )
+        history.append({'role': 'user', 'content': context[critique]})
+        if revised not in context:
+            monitor.critique_done(context[critique])
+            break
+        previous, document = document, context[revised]
+        shown = final
+        if monitor.revision_done(previous, document, context[critique]):
+            break
+    if not shown:
+        # The loop stopped early, so the latest draft has only been shown in a collapsed stage.
+        progress.show(document)
+    progress.note(format_summary(monitor.summary()))
+    history.append({'role': 'user', 'content': document})
+    return document, history
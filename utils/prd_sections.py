@@ -0,0 +1,128 @@
+import json
+import re
+from api.llm.router import QUALITY_DRAFT, QUALITY_CRITIQUE
+from utils.pipeline import Stage
+
+MAX_SECTIONS = 8
+
+def outline_prompt(product_name, product_description):
+    """
+    Build the prompt asking for a short PRD outline.
+
+    Args:
+        product_name (str): The name of the product.
+        product_description (str): The description of the product.
+
+    Returns:
+        str: The outline prompt.
+    """
+    return (
+        f"Plan a PRD for a product named {product_name} with the following description: {product_description}. "
+        f"List at most {MAX_SECTIONS} sections the PRD needs. Respond ONLY with a JSON array where each item is "
+        "{\"title\": \"<section title>\", \"brief\": \"<one sentence on what the section covers>\"}. "
+        "If you think user is not asking for PRD return []."
+    )
+
+def parse_outline(text):
+    """
+    Parse an outline response into sections.
+
+    Accepts the requested JSON array and falls back to Markdown headings or list items
+    when the model answers in prose.
+
+    Args:
+        text (str): The model's outline response.
+
+    Returns:
+        list of dict: Sections with 'title' and 'brief' keys, at most MAX_SECTIONS.
+    """
+    start, end = text.find('['), text.rfind(']')
+    if start != -1 and end > start:
+        try:
+            items = json.loads(text[start:end + 1])
+            sections = [
+                {'title': str(item['title']).strip(), 'brief': str(item.get('brief', '')).strip()}
+                for item in items if isinstance(item, dict) and item.get('title')
+            ]
+            return sections[:MAX_SECTIONS]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            pass
+    sections = []
+    for line in text.splitlines():
+        match = re.match(r'^\s*(?:#+|[-*]|\d+[.)])\s+(.*)$', line)
+        if match and match.group(1).strip():
+            title, _, brief = match.group(1).strip().strip('*').partition(':')
+            sections.append({'title': title.strip(), 'brief': brief.strip()})
+    return sections[:MAX_SECTIONS]
+
+def format_outline(sections):
+    """Render the outline as a Markdown list for use inside prompts."""
+    return "\n".join(f"- {section['title']}: {section['brief']}" for section in sections)
+
+def section_stages(sections, product_name, product_description, system_prompt_prd, system_prompt_director):
+    """
+    Declare the draft, critique and revise stages of every PRD section.
+
+    Sections do not depend on each other, so the pipeline engine drafts all of them at the same time,
+    then critiques all of them, then revises all of them.
+
+    Args:
+        sections (list of dict): The outline, with 'title' and 'brief' per section.
+        product_name (str): The name of the product.
+        product_description (str): The description of the product.
+        system_prompt_prd (str): The system prompt for writing PRDs.
+        system_prompt_director (str): The system prompt for critiquing PRDs.
+
+    Returns:
+        list of Stage: The stages; section i's final text is stored as 'section{i}.revised'.
+    """
+    outline = format_outline(sections)
+    stages = []
+    for index, section in enumerate(sections):
+        title, prefix = section['title'], f"section{index}"
+        stages += [
+            Stage(
+                f"{prefix}.draft", QUALITY_DRAFT,
+                f"You are writing one section of a PRD for a product named {product_name} with the following description: {product_description}. \n The full PRD outline is: \n{outline} \n Write ONLY the section '{title}' ({section['brief']}). Start with the heading '## {title}'. Do not cover topics that belong to other sections. Only respond with the section in Markdown format. BE DETAILED.",
+                system_prompt=system_prompt_prd,
+                label=f"Drafting '{title}'",
+                done_label=f"Draft: {title}",
+            ),
+            Stage(
+                f"{prefix}.critique", QUALITY_CRITIQUE,
+                lambda context, prefix=prefix, title=title: f"Critique the section '{title}' of a PRD: {context[prefix + '.draft']}. The PRD is for a product named {product_name} \n Product description: {product_description} \n Full outline: \n{outline} \n Only critique this section and only respond in Markdown format. BE DETAILED.",
+                system_prompt=system_prompt_director,
+                after=[f"{prefix}.draft"],
+                label=f"Reviewing '{title}'",
+                done_label=f"Review: {title}",
+            ),
+            Stage(
+                f"{prefix}.revised", QUALITY_DRAFT,
+                lambda context, prefix=prefix, title=title: f"Given the Feedback from your manager:{context[prefix + '.critique']} \n Improve upon your draft section {context[prefix + '.draft']}. \n Keep the heading '## {title}'. Only respond with the section in Markdown format. BE VERY DETAILED.",
+                system_prompt=system_prompt_prd,
+                after=[f"{prefix}.critique"],
+                label=f"Revising '{title}'",
+                done_label=f"Revised: {title}",
+            ),
+        ]
+    return stages
+
+def merge_sections(product_name, sections, context):
+    """
+    Merge finished sections into one PRD in outline order.
+
+    Args:
+        product_name (str): The name of the product.
+        sections (list of dict): The outline.
+        context (dict): The pipeline context holding every 'section{i}.revised'.
+
+    Returns:
+        str: The merged PRD in Markdown.
+    """
+    parts = [f"# {product_name} - Product Requirements Document"]
+    for index, section in enumerate(sections):
+        text = context[f"section{index}.revised"].strip()
+        if not text.startswith('#'):
+            text = f"## {section['title']}\n\n{text}"
+        parts.append(text)
+    return "\n\n".join(parts)
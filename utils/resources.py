@@ -0,0 +1,151 @@
+import os
+import threading
+import streamlit as st
+from storage.supabase_client import init_supabase, WriteBehindBuffer, add_write_listener, add_delete_listener
+from storage.backends import init_storage
+from storage.search_index import SearchIndex
+from storage.similarity_index import SimilarityIndex
+from utils.data_loading import load_prompts
+from utils.models import build_models
+from utils.background import JobRunner
+from utils.checkpoints import CheckpointStore
+
+PROMPTS_PATH = 'prompts.json'
+
+_prompts_lock = threading.Lock()
+_prompts_cache = {'mtime': None, 'prompts': {}}
+
+def get_prompts():
+    """
+    Return the prompts from prompts.json, re-reading the file only when its modification time changes.
+
+    The parsed prompts are shared by every session in the process, so a Streamlit rerun costs a
+    single stat() call instead of reading and parsing the file.
+
+    Returns:
+        dict: A dictionary containing the loaded prompts.
+    """
+    try:
+        mtime = os.path.getmtime(PROMPTS_PATH)
+    except OSError:
+        # Let load_prompts report the missing file.
+        return load_prompts()
+    with _prompts_lock:
+        if _prompts_cache['mtime'] != mtime:
+            prompts = load_prompts()
+            if prompts:
+                _prompts_cache['mtime'] = mtime
+                _prompts_cache['prompts'] = prompts
+        return _prompts_cache['prompts']
+
+@st.cache_resource
+def get_model_router():
+    """
+    Return the process-wide model router.
+
+    The SDK clients and their connection pools, along with the router's latency and cost statistics,
+    are built once and shared by every session. Sessions get their own handles from `router.model()`,
+    so system prompts are never shared between users.
+
+    Returns:
+        ModelRouter: The shared model router.
+    """
+    return build_models()
+
+@st.cache_resource
+def get_supabase_client():
+    """
+    Return the process-wide storage backend used for table reads and writes.
+
+    This is Supabase unless STORAGE_BACKEND is 'sqlite', see `storage.backends.init_storage`.
+
+    Returns:
+        CachedStorage: The shared storage backend.
+    """
+    return init_storage()
+
+@st.cache_resource
+def get_write_buffer():
+    """
+    Return the process-wide write-behind buffer for generated records and chat messages.
+
+    Pages queue their inserts here and move on; a background thread writes them in bulk.
+    It is also where `create_record` queues records while storage is unavailable.
+
+    Returns:
+        WriteBehindBuffer: The shared write buffer.
+    """
+    storage = get_supabase_client()
+    buffer = WriteBehindBuffer(storage)
+    if hasattr(storage, 'fallback'):
+        storage.fallback = buffer.add
+    return buffer
+
+@st.cache_resource
+def get_search_index():
+    """
+    Return the process-wide full-text index over generated documents.
+
+    It is kept up to date from every insert into and delete from the indexed tables.
+
+    Returns:
+        SearchIndex: The shared search index.
+    """
+    index = SearchIndex()
+    add_write_listener(index.add_rows)
+    add_delete_listener(index.remove_rows)
+    return index
+
+@st.cache_resource
+def get_similarity_index():
+    """
+    Return the process-wide similarity index over PRDs and tracking plans.
+
+    It is kept up to date from every insert into and delete from the indexed tables.
+
+    Returns:
+        SimilarityIndex: The shared similarity index.
+    """
+    index = SimilarityIndex()
+    add_write_listener(index.add_rows)
+    add_delete_listener(index.remove_rows)
+    return index
+
+@st.cache_resource
+def get_job_runner():
+    """
+    Return the process-wide pool that runs feature pipelines in the background.
+
+    Runs outlive the script run that started them, so reruns and page switches do not
+    throw away work in progress.
+
+    Returns:
+        JobRunner: The shared job runner.
+    """
+    return JobRunner()
+
+@st.cache_resource
+def get_checkpoint_store():
+    """
+    Return the process-wide store of pipeline stage checkpoints.
+
+    Checkpoints live in memory and, when SUPABASE_CHECKPOINT_TABLE is set, in that table as well.
+
+    Returns:
+        CheckpointStore: The shared checkpoint store.
+    """
+    return CheckpointStore(get_supabase_client())
+
+def get_auth_client():
+    """
+    Return this session's Supabase client for sign-in, sign-up and sign-out.
+
+    Auth calls store the user's session on the client, so each browser session keeps its own
+    client instead of sharing the pooled one. It is built once per session, not on every rerun.
+
+    Returns:
+        Client: The session's Supabase auth client.
+    """
+    if 'supabase_auth_client' not in st.session_state:
+        st.session_state['supabase_auth_client'] = init_supabase()
+    return st.session_state['supabase_auth_client']
@@ -0,0 +1,190 @@
+import streamlit as st
+from contextlib import contextmanager
+from utils.patching import EDIT_INSTRUCTIONS, PatchError, parse_edits, apply_edits, critique_text
+from utils.pipeline import Stage
+
+def stream_stage(llm_model, prompt, label, done_label=None, **kwargs):
+    """
+    Stream an intermediate completion (a draft or a critique) into a collapsible status box.
+
+    Tokens render as they arrive, so the first words show up about a second after the call starts.
+    The box collapses once the stage is done so the page stays readable.
+
+    Args:
+        llm_model: A model handle with a `stream_text` method.
+        prompt (str): The prompt to send.
+        label (str): The label shown while the stage runs.
+        done_label (str): The label shown once the stage is done. Defaults to `label`.
+        **kwargs: Passed on to `stream_text` (temperature, max_tokens, ...).
+
+    Returns:
+        str: The full completion.
+    """
+    with st.status(label, expanded=True) as status:
+        text = st.write_stream(llm_model.stream_text(prompt=prompt, **kwargs))
+        status.update(label=done_label or label, state="complete", expanded=False)
+    return text
+
+def stream_final(llm_model, prompt, **kwargs):
+    """
+    Stream a final completion straight into the page.
+
+    Args:
+        llm_model: A model handle with a `stream_text` method.
+        prompt (str): The prompt to send.
+        **kwargs: Passed on to `stream_text` (temperature, max_tokens, ...).
+
+    Returns:
+        str: The full completion.
+    """
+    return st.write_stream(llm_model.stream_text(prompt=prompt, **kwargs))
+
+def critique_and_patch(critique_model, revise_model, document, critique_prompt, rewrite_prompt, label, final=False, critique_temperature=None, rewrite_temperature=None, progress=None):
+    """
+    Run a critique that returns targeted edits and apply them locally, falling back to a full rewrite.
+
+    Output tokens then grow with what changed rather than with the length of the document.
+    If the edits cannot be parsed or applied cleanly, the critique is fed to a normal full rewrite.
+
+    Args:
+        critique_model: The model handle used for the critique.
+        revise_model: The model handle used for the fallback rewrite.
+        document (str): The current draft.
+        critique_prompt (str): The critique prompt; the edit format instructions are appended to it.
+        rewrite_prompt (callable): Builds the full rewrite prompt from the critique text.
+        label (str): The label shown while the critique runs.
+        final (bool): Whether this is the last revision, which renders straight into the page.
+        critique_temperature (float): Temperature for the critique call.
+        rewrite_temperature (float): Temperature for the fallback rewrite.
+        progress: Where stages are reported. Defaults to the page (`StreamlitProgress`).
+
+    Returns:
+        tuple: The revised document and the critique text.
+    """
+    progress = progress or StreamlitProgress()
+    critique_kwargs = {} if critique_temperature is None else {'temperature': critique_temperature}
+    rewrite_kwargs = {} if rewrite_temperature is None else {'temperature': rewrite_temperature}
+    response = progress.stage(
+        critique_model,
+        prompt=f"{critique_prompt}\n\n{EDIT_INSTRUCTIONS}",
+        label=label,
+        done_label=f"{label} (targeted edits)",
+        **critique_kwargs
+    )
+    try:
+        critique, edits = parse_edits(response)
+        revised = apply_edits(document, edits)
+    except PatchError as e:
+        critique = critique_text(response)
+        progress.note(f"Targeted edits could not be applied ({e}). Rewriting the full document instead.")
+        if final:
+            return progress.final(revise_model, prompt=rewrite_prompt(critique), **rewrite_kwargs), critique
+        revised = progress.stage(
+            revise_model,
+            prompt=rewrite_prompt(critique),
+            label="Making adjustments..",
+            done_label="Revised draft",
+            **rewrite_kwargs
+        )
+        return revised, critique
+    progress.note(f"Applied {len(edits)} targeted edits locally.")
+    if final:
+        progress.show(revised)
+    return revised, critique
+
+def patch_stage(name, critique, critique_prompt, rewrite_prompt, critique_class, revise_class, system_prompt_critique, system_prompt_revise,
+                label, done_label, final=False, critique_temperature=None, rewrite_temperature=None):
+    """
+    Declare a critique with targeted edits as one custom pipeline stage, see `critique_and_patch`.
+
+    Args:
+        name (str): The name the revised document is stored under.
+        critique (str): The name the critique is stored under.
+        critique_prompt (callable): Builds the critique prompt from the context.
+        rewrite_prompt (callable): Builds the fallback rewrite prompt from the context and the critique.
+        critique_class (str): The model class of the critique.
+        revise_class (str): The model class of the fallback rewrite.
+        system_prompt_critique (str): The system prompt of the critique.
+        system_prompt_revise (str): The system prompt of the fallback rewrite.
+        label (str): Shown while the critique runs.
+        done_label (str): Shown once the stage is done.
+        final (bool): Whether this is the last revision, which renders straight into the page.
+        critique_temperature (float): Temperature for the critique call.
+        rewrite_temperature (float): Temperature for the fallback rewrite.
+
+    Returns:
+        Stage: The stage. It reads the current draft from 'document'.
+    """
+    def patch(progress, context, model):
+        revised, critique_response = critique_and_patch(
+            model(critique_class, system_prompt=system_prompt_critique),
+            model(revise_class, system_prompt=system_prompt_revise),
+            context['document'],
+            critique_prompt=critique_prompt(context),
+            rewrite_prompt=lambda critique_response: rewrite_prompt(context, critique_response),
+            label=label,
+            final=final,
+            critique_temperature=critique_temperature,
+            rewrite_temperature=rewrite_temperature,
+            progress=progress
+        )
+        return {name: revised, critique: critique_response}
+
+    return Stage(name, run=patch, after=['document'], label=label, done_label=done_label, final=final)
+
+class StreamlitProgress:
+    """
+    Reports pipeline stages on the page as they run, streaming every completion.
+
+    Pipelines written against this interface also run in the background with
+    `utils.background.BackgroundProgress`, which has the same methods.
+    """
+
+    def stage(self, llm_model, prompt, label, done_label=None, **kwargs):
+        """Run an intermediate stage, see `stream_stage`."""
+        return stream_stage(llm_model, prompt, label, done_label=done_label, **kwargs)
+
+    def final(self, llm_model, prompt, **kwargs):
+        """Run the final stage, see `stream_final`."""
+        return stream_final(llm_model, prompt, **kwargs)
+
+    @contextmanager
+    def tasks(self, label, total, done_label=None):
+        """
+        Track a group of concurrent tasks.
+
+        Yields:
+            callable: Call it with a short message each time a task finishes.
+        """
+        with st.status(label, expanded=True) as status:
+            bar = st.progress(0.0)
+            finished = []
+
+            def task_done(message):
+                finished.append(message)
+                st.write(message)
+                bar.progress(len(finished) / total)
+
+            yield task_done
+            status.update(label=done_label or label, state="complete", expanded=False)
+
+    def note(self, text):
+        """Show a short remark about the run."""
+        st.caption(text)
+
+    def show(self, text):
+        """Show a finished document that was not streamed to the page."""
+        st.markdown(text, unsafe_allow_html=True)
+
+    def completed(self, label, text):
+        """Show the output of a stage that ran off the page, alongside others."""
+        with st.status(label, state="complete", expanded=False):
+            st.markdown(text)
+
+    def replay(self, label, text, final=False):
+        """Show the checkpointed output of a stage that did not have to run again."""
+        if final:
+            st.markdown(text, unsafe_allow_html=True)
+            return
+        with st.status(f"{label} (reused)", state="complete", expanded=False):
+            st.markdown(text)